@@ -28,9 +28,7 @@ import csv
 import os
 import sys
 
-# Imports for Gemini
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import google.generativeai as genai
+# Gemini (google.generativeai) is imported inside the functions that call it, it is slow to import and most requests never get here
 
 # --------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 #																					Creating dictionary mappings
@@ -351,13 +349,25 @@ except IndexError:
 	pass
 print(team_code_mapping)
 
-player_code_mapping = {}						# We'll pass this directly to the LLM
-file_path = r"/home/purge/Desktop/MLBxG-extension/src/backend/API_querying/razzball.csv"					# using abs paths
+# The player codes are read from razzball.csv when they are first needed instead of at import, main.py gets them through
+# services.get('player_codes') so that they are read once per process
+player_codes_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'razzball.csv')
 
-with open(file_path, mode='r', encoding='utf-8') as fp:
-	csv_reader = csv.DictReader(fp)
-	for row in csv_reader:
-		player_code_mapping[row['Name'].lower()] = row['MLBAMID']
+def load_player_code_mapping(file_path=player_codes_path):
+	player_code_mapping = {}						# We'll pass this directly to the LLM
+
+	with open(file_path, mode='r', encoding='utf-8') as fp:
+		csv_reader = csv.DictReader(fp)
+		for row in csv_reader:
+			player_code_mapping[row['Name'].lower()] = row['MLBAMID']
+
+	return player_code_mapping
+
+def __getattr__(name):
+	# `from API_querying.query import player_code_mapping` still works (panel.py and the older backends), it reads the csv at that point
+	if name == 'player_code_mapping':
+		return load_player_code_mapping()
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 #																				The Extraction model
@@ -455,6 +465,9 @@ def figure_out_code(team_code_mapping, player_code_mapping, user_prompt):
 
 	chrome_extension_id = str(os.getenv("chrome_extension_id")).strip()
 
+	import google.generativeai as genai
+	from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
 	genai.configure(api_key=API_KEY)
 
 	model = genai.GenerativeModel('gemini-pro')
@@ -1050,6 +1063,9 @@ def pretty_print(raw_information, user_input):
 
 	chrome_extension_id = str(os.getenv("chrome_extension_id")).strip()
 
+	import google.generativeai as genai
+	from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
 	genai.configure(api_key=API_KEY)
 
 	model_ = genai.GenerativeModel('gemini-pro')
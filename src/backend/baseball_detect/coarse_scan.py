@@ -0,0 +1,108 @@
+"""
+Coarse pass for long videos.
+
+/classics-text/ downloads whole YouTube videos (easily 20+ minutes), and calculate_speed_ball used to run both models on every single frame of them.
+Most of that time is spent on replays, close ups of the crowd, the dugout and so on, where there is no pitch to measure.
+
+So long videos are processed in two passes:
+
+1. Coarse: every `stride`-th frame is run through the phc_detector at a low resolution. A pitch is only possible while the pitcher and the catcher
+   are both on screen (the center field view), so the samples where both are detected mark the candidate pitch windows.
+2. Fine: the candidate windows (with some padding on both sides) are decoded again at full resolution and every frame in them goes through the
+   usual locator / ball tracker chain, through FrameSource(..., windows=windows). Everything outside the windows is skipped or seeked over.
+
+With this the dense pass scales with the number of pitches in the video and not with its length.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from baseball_detect.frame_source import FrameSource
+
+# Same class IDs as PitcherCatcherLocator, 1-pitcher and 2-catcher
+PITCHER_CLASS_ID = 1
+CATCHER_CLASS_ID = 2
+
+
+def merge_windows(candidates: List[int], padding: int, last_frame: int) -> List[Tuple[int, int]]:
+    '''
+    Turns the candidate frame numbers into sorted, non overlapping (start, end) windows (both inclusive), each candidate padded by `padding` frames.
+
+    last_frame is the last valid frame number, or a negative number if the length of the video is not known.
+    '''
+    windows: List[List[int]] = []
+    for frame_number in sorted(candidates):
+        start = max(0, frame_number - padding)
+        end = frame_number + padding
+        if last_frame >= 0:
+            end = min(end, last_frame)
+
+        if windows and start <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+
+    return [tuple(window) for window in windows]
+
+
+def find_pitch_windows(
+    video_path,
+    phc_model,
+    stride: int = 15,
+    imgsz: int = 320,
+    padding_seconds: float = 2.0,
+    min_confidence: float = 0.25,
+    batch_size: int = 8
+) -> Tuple[List[Tuple[int, int]], Dict]:
+    '''
+    Coarse scan of the video for the parts that show the pitcher and the catcher together.
+
+    Args:
+        video_path: Path or VideoInput, anything FrameSource accepts.
+        phc_model: The phc_detector YOLO model.
+        stride: Only every stride-th frame is run through the model (15 is two samples a second at 30 FPS, a pitch takes a few seconds from the set).
+        imgsz: Inference size for the coarse pass, the players are big enough to be found at a low resolution.
+        padding_seconds: Time added before and after every candidate sample, so the windows cover the whole windup and the ball's flight.
+        min_confidence: Minimum confidence of the pitcher and catcher boxes.
+        batch_size: Number of sampled frames sent to the model in a single predict call.
+
+    Returns:
+        windows (List[Tuple[int, int]]): Inclusive (start_frame, end_frame) ranges to run the dense pass on. Empty when nothing was found.
+        stats (Dict): The number of sampled frames, the number of candidate samples and the number of frames covered by the windows.
+    '''
+    source = FrameSource(video_path, stride=stride)
+    candidates: List[int] = []
+    sampled = 0
+
+    def run(batch: List[Tuple[int, np.ndarray]]) -> None:
+        results = phc_model.predict([frame for _, frame in batch], imgsz=imgsz, conf=min_confidence, verbose=False)
+        for (frame_number, _), r in zip(batch, results):
+            class_ids = set(int(c) for c in r.boxes.cls.cpu().numpy())
+            if PITCHER_CLASS_ID in class_ids and CATCHER_CLASS_ID in class_ids:
+                candidates.append(frame_number)
+
+    batch: List[Tuple[int, np.ndarray]] = []
+    for frame_number, _, frame in source.frames():
+        batch.append((frame_number, frame))
+        sampled += 1
+        if len(batch) == batch_size:
+            run(batch)
+            batch = []
+    if batch:
+        run(batch)
+
+    # Padding of at least one stride, so that neighbouring candidates always end up in the same window
+    padding = max(stride, int(round(padding_seconds * source.fps)))
+    windows = merge_windows(candidates, padding, source.frame_count - 1)
+
+    stats = {
+        "sampled_frames": sampled,
+        "candidate_samples": len(candidates),
+        "window_frames": sum(end - start + 1 for start, end in windows),
+        "total_frames": source.frame_count,
+    }
+    print(f"Coarse scan: {len(candidates)} of {sampled} sampled frames show the pitcher and the catcher, "
+          f"{len(windows)} windows covering {stats['window_frames']} of {source.frame_count} frames")
+
+    return windows, stats
@@ -0,0 +1,314 @@
+"""
+Columnar storage of the ball detections, and the post-processing of BaseballTracker on top of it.
+
+BaseballTracker used to keep every detection as a BallDetection dataclass holding a (1, 4) box array, and _interpolate_gaps,
+_find_continuous_sequences and _calculate_speeds walked those in python loops, computing the box centers again pair by pair. An hour long
+classics video produces tens of thousands of detections, so the post-processing alone took seconds. Now the detections are kept as one
+array per field (struct of arrays) and all of it is vectorized:
+
+    frame           int64       frame number
+    timestamp       float64     seconds
+    xyxy            (N, 4)      box in full frame coordinates (x1, y1, x2, y2 are views of its columns)
+    confidence      float64
+    class_value     float64
+    track_id        int64       -1 when the model didn't track
+    interpolated    bool        filled in by interpolate_gaps()
+
+The results are the same as with the loops. A DetectionTable still behaves like a list of BallDetection (len, indexing, iteration), so the
+code that reads results['sequences'] or results['all_detections'] works unchanged. Only the detections that are actually looked at are
+turned into BallDetection objects.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from baseball_detect.trajectory import FT_PER_SEC_TO_MPH, fit_trajectories
+
+
+@dataclass
+class BallDetection:
+    frame_number: int
+    timestamp: float  # in seconds
+    box_coords: np.ndarray  # XYXY coordinates
+    confidence: float
+    class_value: float
+    track_id: int = None
+    interpolated: bool = False  # New field to mark interpolated detections
+
+
+class DetectionTable:
+    """
+    Detections as one array per field, in frame order. Slicing gives a table that shares the arrays.
+
+    Attributes:
+        frame (np.ndarray): Frame numbers.
+        timestamp (np.ndarray): Timestamps in seconds.
+        xyxy (np.ndarray): (N, 4) boxes.
+        confidence (np.ndarray): Confidences.
+        class_value (np.ndarray): Classes.
+        track_id (np.ndarray): Track IDs, -1 for none.
+        interpolated (np.ndarray): True for the detections made up by interpolate_gaps().
+    """
+
+    def __init__(
+        self,
+        frame: np.ndarray,
+        timestamp: np.ndarray,
+        xyxy: np.ndarray,
+        confidence: np.ndarray,
+        class_value: np.ndarray,
+        track_id: Optional[np.ndarray] = None,
+        interpolated: Optional[np.ndarray] = None
+    ):
+        self.frame = np.asarray(frame, dtype=np.int64)
+        self.timestamp = np.asarray(timestamp, dtype=np.float64)
+        self.xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float64)
+        self.class_value = np.asarray(class_value, dtype=np.float64)
+        self.track_id = np.full(len(self.frame), -1, dtype=np.int64) if track_id is None else np.asarray(track_id, dtype=np.int64)
+        self.interpolated = np.zeros(len(self.frame), dtype=bool) if interpolated is None else np.asarray(interpolated, dtype=bool)
+
+    @classmethod
+    def empty(cls) -> 'DetectionTable':
+        return cls(np.empty(0), np.empty(0), np.empty((0, 4)), np.empty(0), np.empty(0))
+
+    @classmethod
+    def concatenate(cls, tables: List['DetectionTable']) -> 'DetectionTable':
+        if not tables:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(table, field) for table in tables]) for field in cls._fields))
+
+    _fields = ('frame', 'timestamp', 'xyxy', 'confidence', 'class_value', 'track_id', 'interpolated')
+
+    def _take(self, index) -> 'DetectionTable':
+        # The columns already have the right types, skip the conversions of __init__
+        table = DetectionTable.__new__(DetectionTable)
+        for field in self._fields:
+            setattr(table, field, getattr(self, field)[index])
+        return table
+
+    # The list of BallDetection interface
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Union[BallDetection, 'DetectionTable']:
+        if isinstance(index, (int, np.integer)):
+            return self.detection(int(index))
+        return self._take(index)
+
+    def __iter__(self) -> Iterator[BallDetection]:
+        return (self.detection(i) for i in range(len(self)))
+
+    def detection(self, i: int) -> BallDetection:
+        track_id = int(self.track_id[i])
+        return BallDetection(
+            frame_number=int(self.frame[i]),
+            timestamp=float(self.timestamp[i]),
+            box_coords=self.xyxy[i:i + 1].copy(),
+            confidence=float(self.confidence[i]),
+            class_value=float(self.class_value[i]),
+            track_id=track_id if track_id >= 0 else None,
+            interpolated=bool(self.interpolated[i])
+        )
+
+    @property
+    def x1(self) -> np.ndarray:
+        return self.xyxy[:, 0]
+
+    @property
+    def y1(self) -> np.ndarray:
+        return self.xyxy[:, 1]
+
+    @property
+    def x2(self) -> np.ndarray:
+        return self.xyxy[:, 2]
+
+    @property
+    def y2(self) -> np.ndarray:
+        return self.xyxy[:, 3]
+
+    def centers(self) -> np.ndarray:
+        '''(N, 2) box centers.'''
+        return (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+
+    # Post-processing
+
+    def last_per_frame(self) -> 'DetectionTable':
+        '''
+        One detection per frame, in frame order. When the model found several balls in a frame the last one is kept, like the dict keyed
+        by frame number this replaces did.
+        '''
+        if len(self) == 0:
+            return self
+        order = np.argsort(self.frame, kind='stable')
+        frame = self.frame[order]
+        last = np.append(frame[1:] != frame[:-1], True)
+        return self._take(order[last])
+
+    def interpolate_gaps(self, max_gap: int, max_displacement: float, fps: float) -> 'DetectionTable':
+        '''
+        Fills gaps of up to max_gap frames between two detections linearly, as long as the ball didn't move more than max_displacement pixels
+        per frame across the gap. Needs one detection per frame in frame order (last_per_frame()). The filled in detections get the average
+        confidence of the two, the class and track of the first, a timestamp of frame / fps and interpolated set.
+        '''
+        if len(self) < 2:
+            return self
+
+        gap = np.diff(self.frame)
+        centers = self.centers()
+        displacement = np.hypot(*(centers[1:] - centers[:-1]).T)
+        fill = np.flatnonzero((gap > 1) & (gap <= max_gap) & (displacement <= max_displacement * gap))
+        if len(fill) == 0:
+            return self
+
+        # One row per missing frame: which gap it is in, and how many frames after the start of that gap
+        missing = gap[fill] - 1
+        prev = np.repeat(fill, missing)
+        step = np.arange(missing.sum()) - np.repeat(np.cumsum(missing) - missing, missing) + 1
+        fraction = step / np.repeat(gap[fill], missing)
+
+        frame = self.frame[prev] + step
+        xyxy = self.xyxy[prev] + (self.xyxy[prev + 1] - self.xyxy[prev]) * fraction[:, None]
+        filled = DetectionTable(
+            frame=frame,
+            timestamp=frame / fps,
+            xyxy=xyxy,
+            confidence=(self.confidence[prev] + self.confidence[prev + 1]) / 2,
+            class_value=self.class_value[prev],
+            track_id=self.track_id[prev],
+            interpolated=np.ones(len(frame), dtype=bool)
+        )
+
+        merged = DetectionTable.concatenate([self, filled])
+        return merged._take(np.argsort(merged.frame, kind='stable'))
+
+    def split_sequences(self, max_displacement: float, min_length: int) -> List[Tuple[int, int]]:
+        '''
+        (start, end) index ranges (end exclusive) of the runs of detections in consecutive frames that move at most max_displacement pixels
+        from one frame to the next. Runs shorter than min_length are dropped.
+        '''
+        if len(self) == 0:
+            return []
+
+        centers = self.centers()
+        displacement = np.hypot(*(centers[1:] - centers[:-1]).T)
+        breaks = np.flatnonzero((np.diff(self.frame) != 1) | (displacement > max_displacement)) + 1
+
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [len(self)]))
+        keep = ends - starts >= min_length
+        return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+    def sequence_speeds(
+        self,
+        ranges: List[Tuple[int, int]],
+        scale_factor: float,
+        pitch_distance_range: Tuple[float, float]
+    ) -> List[Dict]:
+        '''
+        Speed estimate of every sequence in ranges (from split_sequences()), all of them computed at once. The displacements are the sums of
+        the absolute frame to frame movements in feet (pixels / scale_factor, which is pixels per foot), the speeds are pitch_distance_range over the sequence duration.
+        The release speeds and the fit residuals come from the drag and gravity trajectory fit of all the sequences (trajectory.py).
+        '''
+        if not ranges:
+            return []
+
+        starts, ends = np.array(ranges).T
+        last = ends - 1
+
+        # Running sums, the total over a sequence is the difference of the running sum at its ends
+        step = np.abs(np.diff(self.centers(), axis=0)) / scale_factor
+        moved = np.vstack(([0.0, 0.0], np.cumsum(step, axis=0)))
+        horizontal = moved[last, 0] - moved[starts, 0]
+        vertical = moved[last, 1] - moved[starts, 1]
+
+        interpolated = np.concatenate(([0], np.cumsum(self.interpolated)))
+        confidence = np.concatenate(([0.0], np.cumsum(self.confidence)))
+
+        duration = self.timestamp[last] - self.timestamp[starts]
+        with np.errstate(divide='ignore'):
+            min_speed = pitch_distance_range[0] / duration  # ft/s
+            max_speed = pitch_distance_range[1] / duration  # ft/s
+
+        columns = {
+            "sequence_length": ends - starts,
+            "interpolated_frames": interpolated[ends] - interpolated[starts],
+            "time_duration": duration,
+            "horizontal_displacement_ft": horizontal,
+            "vertical_displacement_ft": vertical,
+            "observed_displacement_ft": np.hypot(horizontal, vertical),
+            "min_speed_ft_per_sec": min_speed,
+            "max_speed_ft_per_sec": max_speed,
+            "min_speed_mph": min_speed * FT_PER_SEC_TO_MPH,
+            "max_speed_mph": max_speed * FT_PER_SEC_TO_MPH,
+            "start_frame": self.frame[starts],
+            "end_frame": self.frame[last],
+            "average_confidence": (confidence[ends] - confidence[starts]) / (ends - starts),
+            **fit_trajectories(self.timestamp, self.centers(), ranges, scale_factor)
+        }
+        rows = zip(*(value.tolist() for value in columns.values()))
+        return [dict(zip(columns, row)) for row in rows]
+
+
+class DetectionBuffer:
+    """
+    Collects the detections of one frame at a time and turns them into a DetectionTable.
+
+    The columns are preallocated arrays that double in size when they are full, so adding a frame is a few slice assignments and no
+    objects are created per detection.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._columns = {
+            'frame': np.empty(capacity, dtype=np.int64),
+            'timestamp': np.empty(capacity, dtype=np.float64),
+            'xyxy': np.empty((capacity, 4), dtype=np.float64),
+            'confidence': np.empty(capacity, dtype=np.float64),
+            'class_value': np.empty(capacity, dtype=np.float64),
+            'track_id': np.empty(capacity, dtype=np.int64),
+        }
+
+    def _reserve(self, count: int) -> None:
+        capacity = len(self._columns['frame'])
+        if self._size + count <= capacity:
+            return
+        capacity = max(2 * capacity, self._size + count)
+        for field, column in self._columns.items():
+            grown = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[field] = grown
+
+    def add(
+        self,
+        frame_number: int,
+        timestamp: float,
+        xyxy: np.ndarray,
+        confidence: np.ndarray,
+        class_value: np.ndarray,
+        track_id: Optional[np.ndarray] = None
+    ) -> None:
+        '''Adds the boxes found in one frame.'''
+        count = len(confidence)
+        if count == 0:
+            return
+        self._reserve(count)
+
+        rows = slice(self._size, self._size + count)
+        self._columns['frame'][rows] = frame_number
+        self._columns['timestamp'][rows] = timestamp
+        self._columns['xyxy'][rows] = xyxy
+        self._columns['confidence'][rows] = confidence
+        self._columns['class_value'][rows] = class_value
+        self._columns['track_id'][rows] = -1 if track_id is None else track_id
+        self._size += count
+
+    def table(self) -> DetectionTable:
+        '''All the detections so far, in the order they were added. The table shares the buffer's arrays.'''
+        return DetectionTable(**{field: column[:self._size] for field, column in self._columns.items()})
+
+    def __len__(self) -> int:
+        return self._size
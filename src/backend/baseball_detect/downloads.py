@@ -0,0 +1,225 @@
+"""
+Downloads for the model weights and datasets that LoadTools fetches.
+
+LoadTools used to stream 1 KiB chunks straight into the final .pt path. If the download died half way, the truncated file was still there on
+the next start and load_model's os.path.exists check happily handed it to YOLO. Now:
+
+- Everything is written to `<dest>.part` and only renamed to dest once it is complete and verified, so dest existing means it is complete.
+- An interrupted download is resumed from the .part file with an HTTP Range request (and retried a few times) instead of starting over.
+- The size is checked against Content-Length / Content-Range and the SHA-256 is checked against, in this order, the checksum passed in,
+  a pinned `<dest>.sha256` file, or the checksum header of the server. After a successful download the digest is written to `<dest>.sha256`.
+- A lock file makes sure that two processes (gunicorn workers starting together) don't download the same file twice, the second one waits
+  and then finds the file in place. The lock file is removed again when the download is done.
+- Chunks are 1 MiB.
+
+Nothing in here knows about BallDataLab, it works against any HTTP server that supports Range requests (python -m http.server doesn't,
+the download then just starts over).
+"""
+
+import base64
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import requests
+from tqdm import tqdm
+
+try:
+    import fcntl
+except ImportError:             # Windows, only the in-process lock is used there
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024
+RETRIES = 3
+
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+class DownloadError(IOError):
+    pass
+
+
+class _IncompleteDownload(DownloadError):
+    '''The transfer stopped early or doesn't match the remote file, it is worth another (resumed) attempt.'''
+
+
+def checksum_path(dest: str) -> str:
+    return f"{dest}.sha256"
+
+
+def read_checksum(dest: str) -> Optional[str]:
+    '''The SHA-256 pinned or recorded next to dest, None if there is none.'''
+    try:
+        with open(checksum_path(dest)) as fp:
+            return fp.read().split()[0].lower()
+    except (FileNotFoundError, IndexError):
+        return None
+
+
+def file_sha256(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _header_checksum(response: requests.Response) -> Optional[str]:
+    '''SHA-256 advertised by the server, if it sends one (X-Checksum-Sha256, or the Digest / Repr-Digest headers).'''
+    value = response.headers.get('X-Checksum-Sha256')
+    if value:
+        return value.strip().lower()
+
+    for header in ('Repr-Digest', 'Digest'):
+        for part in response.headers.get(header, '').split(','):
+            algorithm, _, encoded = part.strip().partition('=')
+            if algorithm.lower() == 'sha-256' and encoded:
+                return base64.b64decode(encoded.strip(':')).hex()
+    return None
+
+
+def _total_size(response: requests.Response, offset: int) -> Optional[int]:
+    content_range = response.headers.get('Content-Range')              # bytes 100-199/200
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+
+    length = response.headers.get('Content-Length')
+    if length is None:
+        return None
+    return int(length) + (offset if response.status_code == 206 else 0)
+
+
+@contextmanager
+def download_lock(dest: str) -> Iterator[None]:
+    '''Held while dest is being downloaded, both across threads and (where fcntl exists) across processes.'''
+    key = os.path.abspath(dest)
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(key, threading.Lock())
+
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+
+        lock_path = f"{dest}.lock"
+        while True:
+            lock_file = open(lock_path, 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # The holder before us removes the file before unlocking it. If that happened while we were waiting, we hold the lock of a file
+            # that is gone and a newer process could lock a new one at the same path, so start over with the file that is there now.
+            try:
+                current = os.stat(lock_path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and os.path.samestat(current, os.fstat(lock_file.fileno())):
+                break
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+        try:
+            yield
+        finally:
+            os.remove(lock_path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+
+def _fetch(session: requests.Session, url: str, part: str, chunk_size: int, description: str) -> Optional[str]:
+    '''
+    Appends the rest of url to the .part file, resuming from its current size. Returns the checksum the server advertised (if any).
+
+    Raises DownloadError for HTTP errors and _IncompleteDownload for a size that doesn't match what the server announced.
+    '''
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {'Range': f"bytes={offset}-"} if offset else {}
+
+    with session.get(url, stream=True, headers=headers, timeout=(10, 60)) as response:
+        if response.status_code == 416 and offset:
+            # We already have everything (or the .part is bigger than the file), let the size check decide
+            total = _total_size(response, 0)
+            if total == offset:
+                return _header_checksum(response)
+            os.remove(part)
+            raise _IncompleteDownload(f"Partial download of {url} doesn't match the remote file, starting over")
+
+        if response.status_code not in (200, 206):
+            raise DownloadError(f"Download failed. STATUS: {response.status_code}")
+
+        if response.status_code == 200 and offset:
+            print(f"Server ignored the range request, downloading {description} from the start")
+            offset = 0
+
+        total = _total_size(response, offset)
+        progress_bar = tqdm(total=total, initial=offset, unit='iB', unit_scale=True, desc=f"Downloading {description}")
+        with open(part, 'ab' if offset else 'wb') as fp:
+            for data in response.iter_content(chunk_size=chunk_size):
+                progress_bar.update(fp.write(data))
+        progress_bar.close()
+
+        size = os.path.getsize(part)
+        if total is not None and size > total:
+            os.remove(part)                 # Resuming this can't work, start over on the next attempt
+        if total is not None and size != total:
+            raise _IncompleteDownload(f"Downloaded {size} of {total} bytes from {url}")
+
+        return _header_checksum(response)
+
+
+def download(
+    url: str,
+    dest: str,
+    session: Optional[requests.Session] = None,
+    sha256: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    retries: int = RETRIES
+) -> str:
+    '''
+    Downloads url to dest atomically, resuming and retrying interrupted transfers and verifying the result. Returns dest.
+
+    Args:
+        url (str): What to download.
+        dest (str): Final path, it only appears once the download is complete and verified.
+        session (requests.Session): Session to use, a new one by default.
+        sha256 (str): Expected SHA-256 (hex). If not given, a pinned <dest>.sha256 file or the server's checksum header is used when available.
+        chunk_size (int): Bytes read from the response at a time.
+        retries (int): How many times an interrupted download is resumed before giving up.
+
+    Raises:
+        DownloadError: The download failed, or the file doesn't match the expected checksum (the .part file is deleted in that case).
+    '''
+    session = session or requests.Session()
+    part = f"{dest}.part"
+    description = os.path.basename(dest)
+
+    with download_lock(dest):
+        if os.path.exists(dest):            # Someone else finished it while we were waiting for the lock
+            return dest
+
+        attempt = 0
+        while True:
+            try:
+                advertised = _fetch(session, url, part, chunk_size, description)
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, _IncompleteDownload) as e:
+                attempt += 1
+                if attempt > retries:
+                    raise DownloadError(f"Could not download {url}: {e}") from e
+                print(f"Download of {description} interrupted ({e}), resuming (attempt {attempt} of {retries})")
+                time.sleep(min(2 ** attempt, 10))
+
+        expected = (sha256 or read_checksum(dest) or advertised or '').lower() or None
+        actual = file_sha256(part, chunk_size)
+        if expected is not None and actual != expected:
+            os.remove(part)
+            raise DownloadError(f"Checksum mismatch for {url}: expected {expected}, got {actual}")
+
+        os.replace(part, dest)
+        with open(checksum_path(dest), 'w') as fp:
+            fp.write(f"{actual}  {description}\n")
+
+    return dest
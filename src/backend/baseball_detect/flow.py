@@ -32,202 +32,23 @@ Taking camera angle into account!
 
 from ultralytics import YOLO
 
-import requests
-import os
-from tqdm import tqdm
-import zipfile
-import io
-from typing import Optional, Union, List, Tuple, Dict
-import shutil
-
-import cv2
+from typing import Optional, List, Tuple, Dict, Iterator
+
 import numpy as np
-from dataclasses import dataclass
 from collections import defaultdict
 
-class LoadTools:
-    """
-    Class dedicated to downloading / loading models and datasets from either the BallDataLab API or specified text files.
-    
-    Attributes:
-        session (requests.Session): Session object for making requests.
-        chunk_size (int): Size of chunks to use when downloading files.
-        BDL_MODEL_API (str): Base URL for the BallDataLab model API.
-        BDL_DATASET_API (str): Base URL for the BallDataLab dataset API.
-    
-    Methods:
-        load_model(model_alias: str, model_type: str = 'YOLO', use_bdl_api: Optional[bool] = True) -> str:
-            Loads a given baseball computer vision model into the repository.
-        load_dataset(dataset_alias: str, use_bdl_api: Optional[bool] = True) -> str:
-            Loads a zipped dataset and extracts it to a folder.
-        _download_files(url: str, dest: Union[str, os.PathLike], is_dataset: bool = False) -> None:
-            Protected method to handle model and dataset downloads.
-        _get_url(alias: str, txt_path: str, use_bdl_api: bool, api_endpoint: str) -> str:
-            Protected method to obtain the download URL from the BDL API or a text file.
-    """
-
-    def __init__(self):
-        self.session = requests.Session()
-        self.chunk_size = 1024
-        self.BDL_MODEL_API = "https://balldatalab.com/api/models/"
-        self.BDL_DATASET_API = "https://balldatalab.com/api/datasets/"
-        self.yolo_model_aliases = {
-            'phc_detector': './baseball_detect/ball_tracking/pitcher_hitter_catcher_detector_v4.txt',
-            'bat_tracking': './baseball_detect/bat_tracking/bat_tracking.txt',
-            'ball_tracking': './baseball_detect/ball_tracking/ball_tracking.txt',
-            'glove_tracking': 'models/YOLO/glove_tracking/model_weights/glove_tracking.txt',
-            'ball_trackingv4': './baseball_detect/ball_tracking/ball_trackingv4.txt'
-        }
-        self.florence_model_aliases = {              # No need (maybe)
-            'ball_tracking': 'models/FLORENCE2/ball_tracking/model_weights/florence_ball_tracking.txt',
-            'florence_ball_tracking': 'models/FLORENCE2/ball_tracking/model_weights/florence_ball_tracking.txt'
-        }
-        self.dataset_aliases = {                    # Don't have to worry about this
-            'okd_nokd': 'datasets/yolo/OKD_NOKD.txt',
-            'baseball_rubber_home_glove': 'datasets/yolo/baseball_rubber_home_glove.txt',
-            'baseball_rubber_home': 'datasets/yolo/baseball_rubber_home.txt',
-            'broadcast_10k_frames': 'datasets/raw_photos/broadcast_10k_frames.txt',
-            'broadcast_15k_frames': 'datasets/raw_photos/broadcast_15k_frames.txt',
-            'baseball_rubber_home_COCO': 'datasets/COCO/baseball_rubber_home_COCO.txt',
-            'baseball_rubber_home_glove_COCO': 'datasets/COCO/baseball_rubber_home_glove_COCO.txt',
-            'baseball': 'datasets/yolo/baseball.txt'
-        }
-
-    def _download_files(self, url: str, dest: Union[str, os.PathLike], is_folder: bool = False, is_labeled: bool = False) -> None:
-        response = self.session.get(url, stream=True)
-        if response.status_code == 200:
-            total_size = int(response.headers.get('content-length', 0))
-            progress_bar = tqdm(total=total_size, unit='iB', unit_scale=True, desc=f"Downloading {os.path.basename(dest)}")
-            
-            if is_folder: 
-                content = io.BytesIO()
-                for data in response.iter_content(chunk_size=self.chunk_size):
-                    size = content.write(data)
-                    progress_bar.update(size)
-                
-                progress_bar.close()
-
-                with zipfile.ZipFile(content) as zip_ref:
-                    for file in zip_ref.namelist():
-                        if not file.startswith('__MACOSX') and not file.startswith('._'):
-                            if is_labeled:
-                                zip_ref.extract(file, dest)
-                            else:
-                                if '/' in file:
-                                    filename = file.split('/')[-1]
-                                    if filename:
-                                        with zip_ref.open(file) as source, open(os.path.join(dest, filename), 'wb') as target:
-                                            shutil.copyfileobj(source, target)
-                                else:
-                                    zip_ref.extract(file, dest)
-                
-                if not is_labeled:
-                    for root, dirs, files in os.walk(dest, topdown=False):
-                        for dir in dirs:
-                            dir_path = os.path.join(root, dir)
-                            if not os.listdir(dir_path):
-                                os.rmdir(dir_path)
-                
-                print(f"Dataset downloaded and extracted to {dest}")
-            else:
-                with open(dest, 'wb') as file:
-                    for data in response.iter_content(chunk_size=self.chunk_size):
-                        size = file.write(data)
-                        progress_bar.update(size)
-                
-                progress_bar.close()
-                print(f"Model downloaded to {dest}")
-        else:
-            print(f"Download failed. STATUS: {response.status_code}")
-
-    def _get_url(self, alias: str, txt_path: str, use_bdl_api: bool, api_endpoint: str) -> str:
-        if use_bdl_api:
-            return f"{api_endpoint}{alias}"
-        else:
-            with open(txt_path, 'r') as file:
-                return file.read().strip()
-
-    def load_model(self, model_alias: str, model_type: str = 'YOLO', use_bdl_api: Optional[bool] = True, model_txt_path: Optional[str] = None) -> str:
-        '''
-        Loads a given baseball computer vision model into the repository.
-
-        Args:
-            model_alias (str): Alias of the model to load.
-            model_type (str): The type of the model to utilize. Defaults to YOLO.
-            use_bdl_api (Optional[bool]): Whether to use the BallDataLab API.
-            model_txt_path (Optional[str]): Path to .txt file containing download link to model weights. 
-                                            Only used if use_bdl_api is specified as False.
-
-        Returns:
-            model_weights_path (str):  Path to where the model weights are saved within the repo.
-        '''
-        if model_type == 'YOLO':
-            model_txt_path = self.yolo_model_aliases.get(model_alias) if use_bdl_api else model_txt_path
-        elif model_type == 'FLORENCE2':
-            model_txt_path = self.florence_model_aliases.get(model_alias) if use_bdl_api else model_txt_path
-        else:
-            raise ValueError(f"Invalid model type: {model_type}")
-        
-        if not model_txt_path:
-            raise ValueError(f"Invalid alias: {model_alias}")
-
-        base_dir = os.path.dirname(model_txt_path)
-        base_name = os.path.splitext(os.path.basename(model_txt_path))[0]
+from baseball_detect.frame_source import FrameSource
+from baseball_detect.load_tools import LoadTools             # Used to live here, backup_main.py and the benchmarks still import it from flow
+from baseball_detect.pipeline import Pipeline, Stage, batched
+from baseball_detect.detections import BallDetection, DetectionBuffer, DetectionTable     # BallDetection used to live here
+from baseball_detect.kalman import BallKalman
 
-        if model_type == 'YOLO':
-            model_weights_path = f"{base_dir}/{base_name}.pt"
-        else:
-            model_weights_path = f"{base_dir}/{base_name}"
-            os.makedirs(model_weights_path, exist_ok=True)
+# LoadTools and BallDetection are only re-exported, for the code that still imports them from here
+__all__ = [
+    'BaseballTracker', 'PitcherCatcherLocator', 'PitchCorridorGate', 'pitch_corridor', 'calculate_pitcher_and_catcher',
+    'LoadTools', 'BallDetection'
+]
 
-        if os.path.exists(model_weights_path):
-            print(f"Model found at {model_weights_path}")
-            return model_weights_path
-
-        url = self._get_url(model_alias, model_txt_path, use_bdl_api, self.BDL_MODEL_API)
-        self._download_files(url, model_weights_path, is_folder=(model_type=='FLORENCE2'))
-        
-        return model_weights_path
-
-    def load_dataset(self, dataset_alias: str, use_bdl_api: Optional[bool] = True, file_txt_path: Optional[str] = None) -> str:
-        '''
-        Loads a zipped dataset and extracts it to a folder.
-
-        Args:
-            dataset_alias (str): Alias of the dataset to load that corresponds to a dataset folder to download
-            use_bdl_api (Optional[bool]): Whether to use the BallDataLab API. Defaults to True.
-            file_txt_path (Optional[str]): Path to .txt file containing download link to zip file containing dataset. 
-                                           Only used if use_bdl_api is specified as False.
-
-        Returns:
-            dir_name (str): Path to the folder containing the dataset.
-        '''
-        txt_path = self.dataset_aliases.get(dataset_alias) if use_bdl_api else file_txt_path
-        if not txt_path:
-            raise ValueError(f"Invalid alias or missing path: {dataset_alias}")
-
-        base = os.path.splitext(os.path.basename(txt_path))[0]
-        dir_name = "unlabeled_" + base if 'raw_photos' in base or 'frames' in base or 'frames' in dataset_alias else base
-
-        if os.path.exists(dir_name):
-            print(f"Dataset found at {dir_name}")
-            return dir_name
-
-        url = self._get_url(dataset_alias, txt_path, use_bdl_api, self.BDL_DATASET_API)
-        os.makedirs(dir_name, exist_ok=True)
-        self._download_files(url, dir_name, is_folder=True)
-
-        return dir_name
-
-@dataclass
-class BallDetection:
-    frame_number: int
-    timestamp: float  # in seconds
-    box_coords: np.ndarray  # XYXY coordinates
-    confidence: float
-    class_value: float
-    track_id: int = None
-    interpolated: bool = False  # New field to mark interpolated detections
 
 class BaseballTracker:
     def __init__(
@@ -237,357 +58,563 @@ class BaseballTracker:
         max_displacement: float = 100,  # max pixels between frames
         min_sequence_length: int = 7,
         pitch_distance_range: Tuple[float, float] = (50, 70),  # feet
-        max_interpolation_gap: int = 2  # maximum frames to interpolate
+        max_interpolation_gap: int = 2,  # maximum frames to interpolate
+        batch_size: int = 1,  # frames sent to the model in a single predict call
+        roi: Optional[Tuple[int, int, int, int]] = None,  # (x1, y1, x2, y2) region of the frame to run the model on, see pitch_corridor()
+        tracking: bool = False,  # once the ball is found, only look for it in a crop around where the Kalman filter predicts it (see kalman.py)
+        search_size: int = 192  # pixels, smallest side of that crop
     ):
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+
         self.model = model
         self.min_confidence = min_confidence
         self.max_displacement = max_displacement
         self.min_sequence_length = min_sequence_length
         self.pitch_distance_range = pitch_distance_range
         self.max_interpolation_gap = max_interpolation_gap
+        self.batch_size = batch_size
+        self.roi = roi
+        self.tracking = tracking
+        self.search_size = search_size
         
-    def _get_box_center(self, box_coords: np.ndarray) -> Tuple[float, float]:
-        """Calculate center coordinates from XYXY box coordinates."""
-        x1, y1, x2, y2 = box_coords[0]
-        return ((x1 + x2) / 2, (y1 + y2) / 2)
-    
-    def _interpolate_detection(
-        self, 
-        prev_detection: BallDetection, 
-        next_detection: BallDetection, 
-        frame_number: int,
-        fps: float
-    ) -> BallDetection:
-        """Create an interpolated detection between two valid detections."""
-        # Calculate the fraction of the way between prev and next detection
-        total_frames = next_detection.frame_number - prev_detection.frame_number
-        frames_from_prev = frame_number - prev_detection.frame_number
-        fraction = frames_from_prev / total_frames
-        
-        # Interpolate box coordinates
-        prev_coords = prev_detection.box_coords[0]
-        next_coords = next_detection.box_coords[0]
-        interpolated_coords = prev_coords + (next_coords - prev_coords) * fraction
+    def start(self, fps: float, frame_count: int) -> None:
+        """Reset the per-video state. Called by the FrameSource before the first frame."""
+        self.fps = fps
+        self.frame_count = frame_count
+        self._detections = DetectionBuffer()
+        self._pending_frames: List[Tuple[int, float, np.ndarray]] = []
+
+        # Tracking mode: the live track (None while searching the whole frame), the frame it was last predicted for, the frames in a row
+        # it wasn't found, and the ball of the last full frame detection (a track starts from two consecutive ones)
+        self._track: Optional[BallKalman] = None
+        self._track_frame = 0
+        self._misses = 0
+        self._last_ball: Optional[Tuple[int, np.ndarray]] = None
+        self.tracking_stats = {"full_frames": 0, "crop_frames": 0, "tracks": 0}
+
+        # Streaming (poll / stream): the detections that can still change what comes next (the open sequence), the last frame whose
+        # detections are stored, and the last frame that was handed out
+        self._tail = DetectionTable.empty()
+        self._processed_through = -1
+        self._emitted_through = -1
+
+    def set_frame_count(self, frame_count: int) -> None:
+        """Called by the FrameSource at the end when the container didn't know its length (webm buffers)."""
+        self.frame_count = frame_count
+
+    @property
+    def all_detections(self) -> DetectionTable:
+        """Every detection stored so far (before interpolation), as a table that can also be used like a list of BallDetection."""
+        return self._detections.table()
+
+    def process_frame(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
+        """
+        Queue a decoded frame for the ball model. 
         
-        # Create interpolated detection
-        return BallDetection(
-            frame_number=frame_number,
-            timestamp=frame_number / fps,
-            box_coords=np.array([interpolated_coords]),
-            confidence=(prev_detection.confidence + next_detection.confidence) / 2,
-            class_value=prev_detection.class_value,
-            track_id=prev_detection.track_id,
-            interpolated=True
-        )
-    
-    def _organize_detections_by_frame(
-        self, 
-        detections: List[BallDetection]
-    ) -> Dict[int, BallDetection]:
-        """Organize detections into a dictionary keyed by frame number."""
-        return {d.frame_number: d for d in detections}
-    
-    def process_video(self, video_path: str, scale_factor: float) -> Dict:
-        """Process video and return ball tracking data and speed estimates."""
-        cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        # Store all detections
-        all_detections: List[BallDetection] = []
+        Frames are gathered until batch_size of them are pending and then run through the model together, so that the
+        python / preprocess / dispatch overhead is paid once per batch instead of once per frame.
+
+        In tracking mode the frames are not batched while a ball is being tracked, each one is searched (on its own) in the crop
+        around the predicted ball position, which needs the result of the frame before.
+        """
+        if self._track is not None:
+            self._detect_tracked(frame_number, timestamp, frame)
+            return
+
+        self._pending_frames.append((frame_number, timestamp, frame))
+        if len(self._pending_frames) >= self.batch_size:
+            self._flush_pending_frames()
+
+    def _flush_pending_frames(self) -> None:
+        """Run the model on all the pending frames in one call and store the detections."""
+        if not self._pending_frames:
+            return
+
+        self._track_batch(self._detect_batch(self._pending_frames))
+        self._pending_frames = []
+
+    def _detect_batch(self, batch: List[Tuple[int, float, np.ndarray]]) -> List[Tuple[int, float, object, Tuple[int, int]]]:
+        """
+        Runs the ball model on a batch of (frame_number, timestamp, frame).
         
-        # Process each frame
-        frame_number = 0
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:
-                break
-                
-            timestamp = frame_number / fps
-            
-            # Get detections for current frame
-            results = self.model.predict(frame, verbose=False)
+        Returns (frame_number, timestamp, result, offset) for each frame, where offset is the (x, y) of the crop's top left corner
+        in the full frame. It is (0, 0) unless an ROI is set.
+        """
+        offset = (0, 0)
+        frames = [frame for _, _, frame in batch]
+
+        if self.roi is not None:
+            # Only the pitch corridor goes to the model. The crop is smaller than the frame so it also gets upscaled to the model's
+            # input size, which helps the small ball.
+            x1, y1, x2, y2 = self.roi
+            frames = [frame[y1:y2, x1:x2] for frame in frames]
+            offset = (x1, y1)
+
+        # A single frame is passed as is (same call as before), a batch goes in as a list and we get one result per frame back, in order
+        results = self.model.predict(frames[0] if len(frames) == 1 else frames, verbose=False)
+
+        return [(frame_number, timestamp, r, offset) for (frame_number, timestamp, _), r in zip(batch, results)]
+
+    def _track_batch(self, detected: List[Tuple[int, float, object, Tuple[int, int]]]) -> None:
+        """Bookkeeping for the output of _detect_batch, needs to be called in frame order."""
+        for frame_number, timestamp, r, offset in detected:
             print(f"detecting for frame {frame_number}")
-            # Process each detection
-            for r in results:
-                for box in r.boxes.cpu().numpy():
-                    confidence = float(box.conf)
-                    if confidence >= self.min_confidence:
-                        detection = BallDetection(
-                            frame_number=frame_number,
-                            timestamp=timestamp,
-                            box_coords=box.xyxy,
-                            confidence=confidence,
-                            class_value=float(box.cls),
-                            track_id=int(box.id) if box.id is not None else None
-                        )
-                        all_detections.append(detection)
-            
-            frame_number += 1
-            
-        cap.release()
-        
-        # Organize detections by frame number
-        detections_by_frame = self._organize_detections_by_frame(all_detections)
-        
-        # Find and interpolate gaps
-        interpolated_detections = self._interpolate_gaps(detections_by_frame, frame_count, fps)
-        
-        # Combine original and interpolated detections
-        all_detections = sorted(
-            interpolated_detections.values(),
-            key=lambda x: x.frame_number
+            xyxy, confidence = self._store_detections(r, frame_number, timestamp, offset)
+            self._processed_through = frame_number
+            if self.tracking:
+                self.tracking_stats["full_frames"] += 1
+                self._follow(frame_number, xyxy, confidence)
+
+    def _store_detections(self, result, frame_number: int, timestamp: float, offset: Tuple[int, int] = (0, 0)) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Add the boxes in a single frame's result to the detection table (in full frame coordinates).
+
+        Returns the boxes that were added and their confidences.
+        """
+        boxes = result.boxes.cpu().numpy()
+        keep = boxes.conf >= self.min_confidence
+        shift = np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+        if not keep.any():
+            return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32)
+
+        self._detections.add(
+            frame_number=frame_number,
+            timestamp=timestamp,
+            xyxy=boxes.xyxy[keep] + shift,
+            confidence=boxes.conf[keep],
+            class_value=boxes.cls[keep],
+            track_id=boxes.id[keep] if boxes.id is not None else None
         )
+        return boxes.xyxy[keep] + shift, boxes.conf[keep]
+
+    def _search_window(self, center: np.ndarray, frame_shape: Tuple[int, ...]) -> Optional[Tuple[int, int, int, int, int]]:
+        """
+        The crop (x1, y1, x2, y2) around the predicted ball center and the imgsz to run it at, None if the prediction left the frame.
+
+        The crop is search_size pixels plus 3 standard deviations of the prediction on each side, rounded up to the model's stride of 32,
+        and shifted to lie inside the frame. It is run at its own size, so the ball is at the same (or a higher) resolution as in the full frame.
+        """
+        height, width = frame_shape[:2]
+        x, y = center
+        if not (0 <= x < width and 0 <= y < height):
+            return None
+
+        size = int(np.ceil((self.search_size + 6 * self._track.position_std) / 32) * 32)
+        crop_width, crop_height = min(size, width), min(size, height)
+        x1 = int(np.clip(x - crop_width / 2, 0, width - crop_width))
+        y1 = int(np.clip(y - crop_height / 2, 0, height - crop_height))
+        return x1, y1, x1 + crop_width, y1 + crop_height, size
+
+    def _predict_track(self, frame_number: int) -> Optional[np.ndarray]:
+        """Moves the live track to frame_number. Returns the predicted ball center, None (and drops the track) if it is too far ahead."""
+        frames = frame_number - self._track_frame
+        if frames > self.max_interpolation_gap + 1:             # Frames were skipped (windows, motion prefilter), the track is stale
+            self._track = None
+            return None
+
+        self._track_frame = frame_number
+        return self._track.predict(frames)
+
+    def _follow(self, frame_number: int, xyxy: np.ndarray, confidence: np.ndarray) -> None:
+        """
+        Feeds the balls found in a frame to the tracker: corrects the live track with the one closest to the prediction, or starts a new
+        track when the ball was found in two consecutive frames.
+        """
+        centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+
+        if self._track is not None:
+            predicted = self._predict_track(frame_number)
+            if predicted is not None:
+                self._correct_track(predicted, centers)
+                return
+
+        # Searching: the most confident ball of this frame, close enough to the one of the frame before, starts a track
+        ball = centers[int(np.argmax(confidence))] if len(centers) else None
+        previous = self._last_ball
+        self._last_ball = (frame_number, ball) if ball is not None else None
+        if ball is None or previous is None or previous[0] != frame_number - 1:
+            return
+        if np.hypot(*(ball - previous[1])) <= self.max_displacement:
+            self._track = BallKalman(ball, velocity=ball - previous[1])
+            self._track_frame = frame_number
+            self._misses = 0
+            self.tracking_stats["tracks"] += 1
+
+    def _correct_track(self, predicted: np.ndarray, centers: np.ndarray) -> None:
+        """Corrects the live track with the detection closest to the prediction, or counts a miss. Too many misses in a row end the track."""
+        distances = np.hypot(*(centers - predicted).T) if len(centers) else np.empty(0)
+        if len(distances) and distances.min() <= self.max_displacement:
+            self._track.update(centers[int(np.argmin(distances))])
+            self._misses = 0
+            return
+
+        self._misses += 1
+        if self._misses > self.max_interpolation_gap:       # Past the gaps that can be interpolated, the sequence is over anyway
+            self._track = None
+            self._last_ball = None
+
+    def _detect_tracked(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
+        """Tracking mode: runs the ball model only on the crop around the predicted ball, or goes back to full frames if the track is lost."""
+        predicted = self._predict_track(frame_number)
+        window = self._search_window(predicted, frame.shape) if predicted is not None else None
+        if window is None:
+            self._track = None
+            self._last_ball = None
+            self.process_frame(frame_number, timestamp, frame)          # Full frame search again
+            return
+
+        x1, y1, x2, y2, imgsz = window
+        print(f"detecting for frame {frame_number} in {(x1, y1, x2, y2)}")
+        result = self.model.predict(frame[y1:y2, x1:x2], imgsz=imgsz, verbose=False)[0]
+        xyxy, _ = self._store_detections(result, frame_number, timestamp, offset=(x1, y1))
+        self._processed_through = frame_number
+
+        self.tracking_stats["crop_frames"] += 1
+        self._correct_track(predicted, (xyxy[:, :2] + xyxy[:, 2:]) / 2)
+
+    def finish(self, scale_factor: float) -> Dict:
+        """
+        Post-process the detections collected so far and return ball tracking data and speed estimates.
+
+        The scale factor is only needed here, which is why the pitcher/catcher calibration can run on the same frames in parallel.
+        """
+        # Whatever is left over from the last (partial) batch
+        self._flush_pending_frames()
+
+        fps = self.fps
+        frame_count = self.frame_count
+
+        # One detection per frame, with the gaps interpolated (see detections.py, all of this is vectorized)
+        all_detections = self._interpolate_gaps(self.all_detections.last_per_frame(), fps)
         
-        # Find continuous sequences
-        sequences = self._find_continuous_sequences(all_detections)
+        # Find continuous sequences, as (start, end) rows of the table
+        ranges = self._find_continuous_sequences(all_detections)
+        sequences = [all_detections[start:end] for start, end in ranges]
         
         # Calculate speeds for valid sequences
-        speed_estimates = self._calculate_speeds(sequences, fps, scale_factor)
+        speed_estimates = self._calculate_speeds(all_detections, ranges, scale_factor)
         
-        return {
+        results = {
             "total_frames": frame_count,
             "fps": fps,
             "sequences": sequences,
             "speed_estimates": speed_estimates,
             "all_detections": all_detections
         }
+        if self.tracking:
+            print(f"Tracking: {self.tracking_stats['crop_frames']} frames searched in crops, {self.tracking_stats['full_frames']} full frames, "
+                  f"{self.tracking_stats['tracks']} tracks")
+            results["tracking_stats"] = dict(self.tracking_stats)
+        return results
+
+    def poll(self, scale_factor: float, final: bool = False) -> List[Tuple[str, object]]:
+        """
+        Streaming alternative to finish(): hands out everything that became final since the last poll, and forgets it.
+
+        Returns a list of (kind, value) events in frame order:
+            ("detection", BallDetection)    a detection (interpolated ones included) that won't change anymore
+            ("sequence", DetectionTable)    a sequence of at least min_sequence_length detections that can't be extended anymore
+            ("speed", Dict)                 the speed estimate of that sequence, same keys as in finish()
+
+        Only the open sequence (the one the next frames may still extend or interpolate into) is kept between polls, so the memory stays
+        flat however long the video is. The events are the same as what finish() would return for the same frames. With final=True the
+        last (partial) batch is flushed and the open sequence is closed, call it once after the last frame.
+        """
+        if final:
+            self._flush_pending_frames()
+
+        # The new detections, joined to the open sequence so that gaps across the poll are interpolated as usual
+        new = self._detections.table().last_per_frame()
+        self._detections = DetectionBuffer()
+        tail = DetectionTable.concatenate([self._tail, new]).interpolate_gaps(self.max_interpolation_gap, self.max_displacement, self.fps)
+
+        events: List[Tuple[str, object]] = []
+        ranges = tail.split_sequences(self.max_displacement, 1)
+        if not ranges:
+            self._tail = tail
+            return events
+
+        # Every run but the last one was broken by the detection after it. The last one is closed when even an interpolated detection
+        # can't follow it anymore.
+        last_start, last_end = ranges[-1]
+        open_start = last_start
+        if final or self._processed_through >= tail.frame[last_end - 1] + self.max_interpolation_gap:
+            open_start = len(tail)
+
+        fresh = np.flatnonzero(tail.frame > self._emitted_through)
+        for start, end in ranges:
+            events += [("detection", tail[int(i)]) for i in fresh if start <= i < end]
+            if start < open_start and end - start >= self.min_sequence_length:
+                events.append(("sequence", tail[start:end]))
+                events += [("speed", speed) for speed in tail.sequence_speeds([(start, end)], scale_factor, self.pitch_distance_range)]
+
+        if len(tail):
+            self._emitted_through = max(self._emitted_through, int(tail.frame[-1]))
+        self._tail = tail[open_start:]
+        return events
+
+    def stream(self, video_path: str, scale_factor: float) -> Iterator[Tuple[str, object]]:
+        """
+        Generator version of process_video: yields the (kind, value) events of poll() while the video is being processed, so the first
+        pitch can be acted on before the video is over. Nothing about the whole video is kept, see poll().
+        """
+        source = FrameSource(video_path)
+        started = False
+
+        for frame_number, timestamp, frame in source.frames():
+            if not started:                         # fps is only known after the capture is opened
+                self.start(source.fps, source.frame_count)
+                started = True
+            self.process_frame(frame_number, timestamp, frame)
+            yield from self.poll(scale_factor)
+
+        if not started:
+            self.start(source.fps, source.frame_count)
+        self.set_frame_count(source.frame_count)
+        yield from self.poll(scale_factor, final=True)
+
+    def process_video(self, video_path: str, scale_factor: float, pipelined: bool = False, queue_size: int = 8) -> Dict:
+        """
+        Process video and return ball tracking data and speed estimates.
+
+        With pipelined=True the decoding, the detection and the bookkeeping run as separate stages (see pipeline.py) so that
+        the next batch is already decoded while the model works on the current one. The stage utilisation is then printed
+        and returned under "pipeline_stats".
+        """
+        if not pipelined:
+            FrameSource(video_path).broadcast([self])
+            return self.finish(scale_factor)
+
+        if self.tracking:
+            raise ValueError("Tracking mode needs the result of each frame before the next one is detected, it can't be pipelined")
+
+        source = FrameSource(video_path)
+        pipeline = Pipeline(
+            source=batched(source.frames(), self.batch_size),
+            stages=[
+                Stage('detect', self._detect_batch),
+                Stage('track', self._track_batch, ordered=True)
+            ],
+            queue_size=queue_size
+        )
+
+        self.start(0.0, 0)                  # fps and frame count are only known once the source thread opens the video
+        for _ in pipeline.run():
+            pass
+        self.fps = source.fps
+        self.frame_count = source.frame_count
+
+        pipeline.print_report()
+        results = self.finish(scale_factor)
+        results["pipeline_stats"] = pipeline.utilisation()
+        return results
     
-    def _interpolate_gaps(              # This is for taking the average and all
-        self, 
-        detections_by_frame: Dict[int, BallDetection],
-        frame_count: int,
-        fps: float
-    ) -> Dict[int, BallDetection]:
-        """Interpolate gaps in detection sequences."""
-        interpolated_detections = detections_by_frame.copy()
-        
-        # Sort frame numbers
-        frame_numbers = sorted(detections_by_frame.keys())
-        
-        if not frame_numbers:
-            return interpolated_detections
-            
-        # Iterate through frames to find gaps
-        for i in range(len(frame_numbers) - 1):
-            current_frame = frame_numbers[i]
-            next_frame = frame_numbers[i + 1]
-            frame_gap = next_frame - current_frame
-            
-            # If there's a gap that's within our interpolation limit
-            if 1 < frame_gap <= self.max_interpolation_gap:
-                prev_detection = detections_by_frame[current_frame]
-                next_detection = detections_by_frame[next_frame]
-                
-                # Check if the displacement between detections is reasonable
-                prev_center = self._get_box_center(prev_detection.box_coords)
-                next_center = self._get_box_center(next_detection.box_coords)
-                displacement = np.sqrt(
-                    (next_center[0] - prev_center[0])**2 + 
-                    (next_center[1] - prev_center[1])**2
-                )
-                
-                # Only interpolate if the total displacement is reasonable
-                if displacement <= self.max_displacement * frame_gap:
-                    # Interpolate for each missing frame
-                    for missing_frame in range(current_frame + 1, next_frame):
-                        interpolated_detection = self._interpolate_detection(
-                            prev_detection,
-                            next_detection,
-                            missing_frame,
-                            fps
-                        )
-                        interpolated_detections[missing_frame] = interpolated_detection
-        
-        return interpolated_detections
-    
-    def _find_continuous_sequences(
-        self, 
-        detections: List[BallDetection]
-    ) -> List[List[BallDetection]]:
-        """Find continuous sequences of ball detections."""
-        sequences = []
-        current_sequence = []
-        
-        for detection in detections:
-            if not current_sequence:
-                current_sequence.append(detection)
-                continue
-                
-            last_detection = current_sequence[-1]
-            
-            # Get centers for displacement calculation
-            current_center = self._get_box_center(detection.box_coords)
-            last_center = self._get_box_center(last_detection.box_coords)
-            
-            # Calculate displacement
-            dx = current_center[0] - last_center[0]
-            dy = current_center[1] - last_center[1]
-            displacement = np.sqrt(dx*dx + dy*dy)
-            
-            # Check if frames are consecutive and displacement is reasonable
-            if (detection.frame_number == last_detection.frame_number + 1 and 
-                displacement <= self.max_displacement):
-                current_sequence.append(detection)
-            else:
-                if len(current_sequence) >= self.min_sequence_length:
-                    sequences.append(current_sequence)
-                current_sequence = [detection]
-        
-        # Add last sequence if valid
-        if len(current_sequence) >= self.min_sequence_length:
-            sequences.append(current_sequence)
-            
-        return sequences
-    
+    def _interpolate_gaps(self, detections: DetectionTable, fps: float) -> DetectionTable:
+        """Interpolate gaps of up to max_interpolation_gap frames in the detections (one per frame, in frame order)."""
+        return detections.interpolate_gaps(self.max_interpolation_gap, self.max_displacement, fps)
+
+    def _find_continuous_sequences(self, detections: DetectionTable) -> List[Tuple[int, int]]:
+        """Find continuous sequences of ball detections, returns their (start, end) rows in detections."""
+        return detections.split_sequences(self.max_displacement, self.min_sequence_length)
+
     def _calculate_speeds(              # used scaling factor here, needs to be found using the catcher and the pitcher
         self, 
-        sequences: List[List[BallDetection]], 
-        fps: float, 
-        scale_factor: float  # Conversion factor: pixels to feet
+        detections: DetectionTable,
+        ranges: List[Tuple[int, int]],
+        scale_factor: float  # Pixels per foot, from the pitcher and the catcher
     ) -> List[Dict]:
-        """Calculate speed estimates for each valid sequence, accounting for parabolic motion."""
-        speed_estimates = []
-
-        for sequence in sequences:
-            # Calculate time duration of the sequence
-            time_duration = sequence[-1].timestamp - sequence[0].timestamp
-
-            # Initialize total horizontal and vertical displacement
-            total_horizontal_displacement = 0.0
-            total_vertical_displacement = 0.0
-
-            # Loop through consecutive detections to calculate displacements
-            for i in range(len(sequence) - 1):
-                print('looping here!')
-                current_center = self._get_box_center(sequence[i].box_coords)
-                next_center = self._get_box_center(sequence[i + 1].box_coords)
-
-                # Calculate pixel displacements
-                dx = next_center[0] - current_center[0]  # Horizontal displacement
-                dy = next_center[1] - current_center[1]  # Vertical displacement
-
-                # Convert to real-world units using scale_factor
-                total_horizontal_displacement += abs(dx) * scale_factor
-                total_vertical_displacement += abs(dy) * scale_factor
-                print('used scale factor')
-
-            # Calculate observed pixel displacement in real-world distance
-            observed_displacement = np.sqrt(
-                total_horizontal_displacement**2 + total_vertical_displacement**2
-            )
-
-            # Calculate minimum and maximum speeds using pitch distance range
-            min_speed = self.pitch_distance_range[0] / time_duration  # ft/s
-            max_speed = self.pitch_distance_range[1] / time_duration  # ft/s
-
-            # Convert to mph
-            min_speed_mph = min_speed * 0.681818  # Convert ft/s to mph
-            max_speed_mph = max_speed * 0.681818  # Convert ft/s to mph
-
-            # Count interpolated frames
-            interpolated_frames = sum(1 for d in sequence if d.interpolated)
-
-            # Append results
-            speed_estimates.append({
-                "sequence_length": len(sequence),
-                "interpolated_frames": interpolated_frames,
-                "time_duration": time_duration,
-                "horizontal_displacement_ft": total_horizontal_displacement,
-                "vertical_displacement_ft": total_vertical_displacement,
-                "observed_displacement_ft": observed_displacement,
-                "min_speed_ft_per_sec": min_speed,
-                "max_speed_ft_per_sec": max_speed,
-                "min_speed_mph": min_speed_mph,
-                "max_speed_mph": max_speed_mph,
-                "start_frame": sequence[0].frame_number,
-                "end_frame": sequence[-1].frame_number,
-                "average_confidence": np.mean([d.confidence for d in sequence])
-            })
-
-        return speed_estimates
+        """Calculate speed estimates for each valid sequence, all of them at once."""
+        return detections.sequence_speeds(ranges, scale_factor, self.pitch_distance_range)
 
 
-def calculate_pitcher_and_catcher(SOURCE_VIDEO_PATH):
-    print('here')
-    load_tools = LoadTools()
-    model_weights2 = load_tools.load_model(model_alias="phc_detector")
-    model2 = YOLO(model_weights2)
+class PitcherCatcherLocator:
+    """
+    Frame consumer that runs the phc_detector on every frame and averages the pitcher and catcher positions.
 
-    player_positions = defaultdict(list)
-    player_positions_normalized = defaultdict(list)
+    This is the same logic that calculate_pitcher_and_catcher used to run over `model2.predict(source=...)`, but it takes
+    already decoded frames so that it can share a single decode with the BaseballTracker (see frame_source.py).
+    """
 
     # These are the class IDs for detection as defined by the model itself. 1-pitcher, 2-catcher. Not that it matters, cause we reference it by name. 
     # Found these using another testing code.
     PITCHER_CLASS_ID = 1
     CATCHER_CLASS_ID = 2
 
-    # Run prediction on the source video and calculate positions
-    results = model2.predict(source=SOURCE_VIDEO_PATH, save=False)
+    def __init__(self, model: YOLO):
+        self.model = model
+        self.player_positions = defaultdict(list)
+        self.player_positions_normalized = defaultdict(list)
+
+    def start(self, fps: float, frame_count: int) -> None:
+        self.player_positions = defaultdict(list)
+        self.player_positions_normalized = defaultdict(list)
 
-    # Process each frame
-    for frame_idx, r in enumerate(results):
+    def process_frame(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
         frame_boxes = {
             'pitcher': None,
             'catcher': None
         }
-        
-        # Get frame dimensions
-        if hasattr(r, 'orig_img'):
-            frame_height, frame_width = r.orig_img.shape[:2]
-        else:
-            print('using these!')
-            # If we can't get original image dimensions, you'll need to specify them. This is the default size for many screens. optionally we can use tkinter or something and find it dynamically
-            frame_width = 1920
-            frame_height = 1080
-        
-        # Process detections in current frame
-        for box in r.boxes:
-            class_id = int(box.cls[0])
-            box_data = box.xywh.numpy()[0]  # Convert to numpy, get first (and only) box
-            
-            # Store both absolute and normalized coordinates
-            center_absolute = (box_data[0], box_data[1])  # x, y coordinates
-            center_normalized = (box_data[0] / frame_width, box_data[1] / frame_height)  # normalized coordinates
-            
-            if class_id == PITCHER_CLASS_ID:
-                frame_boxes['pitcher'] = (center_absolute, center_normalized)
-            elif class_id == CATCHER_CLASS_ID:
-                frame_boxes['catcher'] = (center_absolute, center_normalized)
+
+        # Get frame dimensions, we have the decoded frame itself so no need to guess them anymore
+        frame_height, frame_width = frame.shape[:2]
+
+        for r in self.model.predict(frame, verbose=False):
+            # Process detections in current frame
+            for box in r.boxes:
+                class_id = int(box.cls[0])
+                box_data = box.xywh.cpu().numpy()[0]  # Convert to numpy, get first (and only) box
+                
+                # Store both absolute and normalized coordinates
+                center_absolute = (box_data[0], box_data[1])  # x, y coordinates
+                center_normalized = (box_data[0] / frame_width, box_data[1] / frame_height)  # normalized coordinates
+                
+                if class_id == self.PITCHER_CLASS_ID:
+                    frame_boxes['pitcher'] = (center_absolute, center_normalized)
+                elif class_id == self.CATCHER_CLASS_ID:
+                    frame_boxes['catcher'] = (center_absolute, center_normalized)
         
         for player_type, centers in frame_boxes.items():
             if centers is not None:
                 center_absolute, center_normalized = centers
-                player_positions[player_type].append(center_absolute)
-                player_positions_normalized[player_type].append(center_normalized)
-
-    average_positions = {}
-    average_positions_normalized = {}
-
-    for player_type, positions in player_positions.items():
-        if positions:
-            # Calculate absolute average
-            positions_array = np.array(positions)
-            average_positions[player_type] = np.mean(positions_array, axis=0)
-            
-            # Calculate normalized average
-            positions_array_norm = np.array(player_positions_normalized[player_type])
-            average_positions_normalized[player_type] = np.mean(positions_array_norm, axis=0)
-
-    # print("\nAbsolute Coordinates (in pixels):")
-    # for player_type, avg_pos in average_positions.items():
-    #     print(f"Average {player_type} position: x={avg_pos[0]:.2f}, y={avg_pos[1]:.2f}")
-
-    # x2, y2 is the pitcher and x1, y1 is the catcher
-    x1 = float(average_positions.get('catcher')[0])
-    y1 = float(average_positions.get('catcher')[1])
-
-    x2 = float(average_positions.get('pitcher')[0])
-    y2 = float(average_positions.get('pitcher')[1])
-
-    print('coordinates found')
+                self.player_positions[player_type].append(center_absolute)
+                self.player_positions_normalized[player_type].append(center_normalized)
+
+    def calibrated_frames(self) -> int:
+        """Number of frames in which the pitcher and the catcher have both been seen at least once so far (the smaller of the two counts)."""
+        return min(len(self.player_positions['pitcher']), len(self.player_positions['catcher']))
+
+    def coordinates(self) -> Tuple[float, float, float, float]:
+        """
+        Returns the averaged coordinates as (x1, y1, x2, y2) where x1, y1 is the catcher and x2, y2 is the pitcher.
+        """
+        average_positions = {}
+        average_positions_normalized = {}
+
+        for player_type, positions in self.player_positions.items():
+            if positions:
+                # Calculate absolute average
+                positions_array = np.array(positions)
+                average_positions[player_type] = np.mean(positions_array, axis=0)
+                
+                # Calculate normalized average
+                positions_array_norm = np.array(self.player_positions_normalized[player_type])
+                average_positions_normalized[player_type] = np.mean(positions_array_norm, axis=0)
+
+        # x2, y2 is the pitcher and x1, y1 is the catcher
+        x1 = float(average_positions.get('catcher')[0])
+        y1 = float(average_positions.get('catcher')[1])
+
+        x2 = float(average_positions.get('pitcher')[0])
+        y2 = float(average_positions.get('pitcher')[1])
+
+        print('coordinates found')
+        return (x1, y1, x2, y2)
+
+
+def pitch_corridor(
+    coordinates: Tuple[float, float, float, float],
+    frame_shape: Tuple[int, ...],
+    margin: float = 0.25,
+    min_margin: int = 40
+) -> Tuple[int, int, int, int]:
+    """
+    Region of the frame that the pitched ball can be in.
+
+    Args:
+        coordinates: (x1, y1, x2, y2) as returned by PitcherCatcherLocator.coordinates(), catcher first and then pitcher.
+        frame_shape: Shape of the frames (height, width, ...).
+        margin: Extra space around the pitcher-catcher box as a fraction of the pitcher-catcher distance. The centers are
+                body centers and the ball is released above the pitcher's head, so this shouldn't be too tight.
+        min_margin: Margin in pixels that is always added, for when the pitcher and catcher are almost on top of each other.
+
+    Returns:
+        (x1, y1, x2, y2) integer crop clipped to the frame.
+    """
+    cx, cy, px, py = coordinates
+    frame_height, frame_width = frame_shape[:2]
+
+    distance = float(np.sqrt((px - cx)**2 + (py - cy)**2))
+    pad = max(min_margin, margin * distance)
+
+    x1 = int(max(0, np.floor(min(cx, px) - pad)))
+    y1 = int(max(0, np.floor(min(cy, py) - pad)))
+    x2 = int(min(frame_width, np.ceil(max(cx, px) + pad)))
+    y2 = int(min(frame_height, np.ceil(max(cy, py) + pad)))
+
     return (x1, y1, x2, y2)
 
+
+class PitchCorridorGate:
+    """
+    Frame consumer that puts a BaseballTracker into ROI mode as soon as the pitcher and catcher are known.
+
+    It has to be registered right after the PitcherCatcherLocator in FrameSource.broadcast (so that the locator has seen the frame first).
+    The first frames are held back until the locator has calibration_frames frames with both the pitcher and the catcher, then the
+    tracker's roi is set to the pitch corridor and the held back frames are sent to it. If the calibration doesn't happen within
+    max_buffered frames we give up and the tracker runs on full frames like before.
+    """
+
+    def __init__(self, tracker: 'BaseballTracker', locator: 'PitcherCatcherLocator', margin: float = 0.25, calibration_frames: int = 15, max_buffered: int = 60):
+        self.tracker = tracker
+        self.locator = locator
+        self.margin = margin
+        self.calibration_frames = calibration_frames
+        self.max_buffered = max_buffered
+
+    def start(self, fps: float, frame_count: int) -> None:
+        self.tracker.start(fps, frame_count)
+        self.tracker.roi = None
+        self.buffer: List[Tuple[int, float, np.ndarray]] = []
+        self.gave_up = False
+
+    def set_frame_count(self, frame_count: int) -> None:
+        self.tracker.set_frame_count(frame_count)
+
+    def _release_buffer(self) -> None:
+        for item in self.buffer:
+            self.tracker.process_frame(*item)
+        self.buffer = []
+
+    def process_frame(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
+        if self.tracker.roi is not None or self.gave_up:
+            self.tracker.process_frame(frame_number, timestamp, frame)
+            return
+
+        self.buffer.append((frame_number, timestamp, frame))
+
+        if self.locator.calibrated_frames() >= self.calibration_frames:
+            self.tracker.roi = pitch_corridor(self.locator.coordinates(), frame.shape, self.margin)
+            print(f"Restricting ball detection to the pitch corridor {self.tracker.roi}")
+            self._release_buffer()
+        elif len(self.buffer) >= self.max_buffered:
+            print('Pitcher and catcher not found, running the ball model on full frames')
+            self.gave_up = True
+            self._release_buffer()
+
+    def finish(self, scale_factor: float) -> Dict:
+        # Short clips can end before the calibration is done, use whatever we have at that point
+        if self.buffer:
+            if self.locator.calibrated_frames() > 0:
+                self.tracker.roi = pitch_corridor(self.locator.coordinates(), self.buffer[0][2].shape, self.margin)
+            self._release_buffer()
+        return self.tracker.finish(scale_factor)
+
+
+def calculate_pitcher_and_catcher(SOURCE_VIDEO_PATH):
+    """
+    Standalone version that decodes the video just for the calibration. 
+    
+    When the ball speed is also needed, use PitcherCatcherLocator with a FrameSource instead so that the video is decoded only once.
+    """
+    from baseball_detect.registry import model_registry           # registry.py imports this module
+
+    with model_registry.borrow('phc_detector') as model2:
+        locator = PitcherCatcherLocator(model2)
+        FrameSource(SOURCE_VIDEO_PATH).broadcast([locator])
+
+    return locator.coordinates()
+
 # Example usage
 # if __name__ == "__main__":
 #     SOURCE_VIDEO_PATH = "./input/baseball_3.mp4"
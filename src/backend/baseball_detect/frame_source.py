@@ -0,0 +1,230 @@
+"""
+Shared decoding stage for every video path.
+
+Earlier `calculate_speed_ball` decoded the same file twice: once inside `calculate_pitcher_and_catcher` (through `model2.predict(source=...)`)
+and once more inside `BaseballTracker.process_video` (through its own `cv2.VideoCapture` loop). Decoding is a big chunk of the per-clip latency,
+so now we decode exactly once here and hand every frame to all the consumers that need it.
+
+A consumer is any object that has these methods:
+
+    start(fps, frame_count)                         -> called once before the first frame
+    process_frame(frame_number, timestamp, frame)   -> called for every decoded frame (in order)
+
+Consumers can also have a set_frame_count(frame_count) method. It is called after the last frame when the container didn't know how many frames
+it has (the webm buffers recorded by the extension don't have a duration), with the number of frames that were actually decoded.
+
+The consumers must not modify the frame in place, because the same array is shared between all of them.
+
+The webm buffer from the extension is read directly (OpenCV's ffmpeg backend decodes VP8/VP9 just fine), there is no need to re-encode it to mp4 first.
+If a container can't be opened, we remux it with a stream copy (no re-encoding, so it only takes a moment) and read that instead.
+"""
+
+import os
+import shutil
+import subprocess
+
+import cv2
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from baseball_detect.ingest import VideoInput
+
+# The extension's rolling buffer stores frames at 30 FPS, used when the container doesn't report a usable frame rate
+FALLBACK_FPS = 30.0
+MAX_VALID_FPS = 240.0           # MediaRecorder webm files sometimes report the timebase (1000) as the frame rate
+SEEK_THRESHOLD_FRAMES = 300     # Gaps longer than this (10 seconds at 30 FPS) are seeked over instead of decoded
+
+
+def _ffmpeg_executable() -> str:
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        return ffmpeg
+
+    # moviepy ships its own ffmpeg through imageio_ffmpeg
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def remux(input_path: str, output_path: str) -> str:
+    '''
+    Copies the streams of input_path into a new container without re-encoding them. Returns the output path.
+    
+    The output should be a .mkv, that accepts any codec (webm's VP8/VP9 included).
+    '''
+    subprocess.run(
+        [_ffmpeg_executable(), '-y', '-loglevel', 'error', '-i', input_path, '-map', '0:v:0', '-c', 'copy', output_path],
+        check=True
+    )
+    return output_path
+
+
+class FrameSource:
+    """
+    Decodes a video a single time and fans out each frame to the registered consumers.
+
+    Attributes:
+        video_path (Union[str, VideoInput]): Path to the video that needs to be decoded, or a VideoInput for videos that came with a request.
+        fallback_fps (float): Frame rate to use when the container doesn't report a usable one.
+        fps (float): Frame rate of the video.
+        frame_count (int): Number of frames reported by the container (or decoded, if the container doesn't know).
+        windows (Optional[List[Tuple[int, int]]]): Only frames inside these inclusive (start, end) frame ranges are yielded. None means all of them.
+        stride (int): Only every stride-th frame is yielded (counted from the start of the video).
+    """
+
+    def __init__(
+        self,
+        video_path: Union[str, VideoInput],
+        fallback_fps: float = FALLBACK_FPS,
+        windows: Optional[List[Tuple[int, int]]] = None,
+        stride: int = 1
+    ):
+        if stride < 1:
+            raise ValueError(f"stride must be at least 1, got {stride}")
+
+        self.video_path = video_path
+        self.fallback_fps = fallback_fps
+        self.windows = sorted(windows) if windows is not None else None
+        self.stride = stride
+        self.fps = 0.0
+        self.frame_count = 0
+        self.frame_count_known = False
+        self._remuxed_path: Optional[str] = None
+
+    def _open(self) -> cv2.VideoCapture:
+        if isinstance(self.video_path, VideoInput):
+            cap = self.video_path.open_capture()
+            if cap.isOpened():
+                return cap
+            path = self.video_path.spool()
+        else:
+            cap = cv2.VideoCapture(self.video_path)
+            if cap.isOpened():
+                return cap
+            path = self.video_path
+
+        # Broken or unusual container, try a stream copy into mkv before giving up
+        remuxed_path = os.path.splitext(path)[0] + '_remuxed.mkv'
+        try:
+            remux(path, remuxed_path)
+        except (subprocess.CalledProcessError, OSError, ImportError) as e:
+            raise ValueError(f"Unable to open video: {self.video_path} ({e})")
+        self._remuxed_path = remuxed_path
+
+        cap = cv2.VideoCapture(remuxed_path)
+        if not cap.isOpened():
+            raise ValueError(f"Unable to open video: {self.video_path}")
+        return cap
+
+    def frames(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        '''
+        Generator that decodes the video and yields (frame_number, timestamp, frame) for every frame (only the ones inside the windows and on
+        the stride, if those are set). The frame numbers and timestamps are always relative to the start of the video.
+
+        fps and frame_count are filled in as soon as the capture is opened, so they are valid once the first frame is yielded.
+        If the container doesn't know its frame count, frame_count is 0 until the video has been decoded completely.
+        '''
+        cap = self._open()
+
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        if not 0 < self.fps <= MAX_VALID_FPS:
+            print(f"Container reports {self.fps} FPS, using {self.fallback_fps} instead")
+            self.fps = self.fallback_fps
+
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_count_known = self.frame_count > 0
+        if not self.frame_count_known:
+            self.frame_count = 0
+
+        window_index = 0
+        frame_number = 0
+        try:
+            while True:
+                if self.windows is not None:
+                    if window_index == len(self.windows):
+                        break
+                    start, end = self.windows[window_index]
+                    if frame_number > end:
+                        window_index += 1
+                        continue
+                    if frame_number < start:
+                        frame_number = self._skip(cap, frame_number, start)
+                        if frame_number is None:
+                            break
+                        continue
+
+                if frame_number % self.stride:
+                    # grab() still decodes, but skips the conversion to a BGR array
+                    if not cap.grab():
+                        break
+                    frame_number += 1
+                    continue
+
+                success, frame = cap.read()
+                if not success:
+                    break
+
+                yield frame_number, frame_number / self.fps, frame
+                frame_number += 1
+        finally:
+            cap.release()
+            if self._remuxed_path is not None:
+                os.remove(self._remuxed_path)
+                self._remuxed_path = None
+
+        if not self.frame_count_known:
+            # With windows this is only where we stopped (the end of the last window), the video can be longer
+            self.frame_count = frame_number
+
+    def _skip(self, cap: cv2.VideoCapture, frame_number: int, target: int) -> Optional[int]:
+        '''
+        Moves the capture from frame_number to target without converting the frames in between.
+
+        Long gaps are seeked over (ffmpeg jumps to the previous keyframe and decodes from there), short ones are grabbed frame by frame.
+        Returns the frame number the capture is at now, or None if the video ended.
+        '''
+        if target - frame_number > SEEK_THRESHOLD_FRAMES:
+            if cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+                if frame_number < position <= target:       # Only trust the seek if it landed where it should
+                    return position
+
+        while frame_number < target:
+            if not cap.grab():
+                return None
+            frame_number += 1
+        return frame_number
+
+    def broadcast(self, consumers: List) -> int:
+        '''
+        Decode the video once and send every frame to each consumer in the given order.
+
+        Args:
+            consumers (List): Objects implementing start() and process_frame() as described at the top of this file.
+
+        Returns:
+            frames_decoded (int): The number of frames that were actually decoded.
+        '''
+        frames_decoded = 0
+        started = False
+
+        for frame_number, timestamp, frame in self.frames():
+            if not started:                         # fps is only known after the capture is opened
+                for consumer in consumers:
+                    consumer.start(self.fps, self.frame_count)
+                started = True
+
+            for consumer in consumers:
+                consumer.process_frame(frame_number, timestamp, frame)
+            frames_decoded += 1
+
+        if not started:                             # empty video, still let the consumers initialise their state
+            for consumer in consumers:
+                consumer.start(self.fps, self.frame_count)
+
+        if not self.frame_count_known:
+            for consumer in consumers:
+                if hasattr(consumer, 'set_frame_count'):
+                    consumer.set_frame_count(self.frame_count)
+
+        return frames_decoded
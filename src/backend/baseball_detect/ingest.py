@@ -0,0 +1,131 @@
+"""
+Ingest layer for videos that come in with a request.
+
+Before this, /classics-video/ saved the upload into uploads/videos and re-opened it through a hardcoded absolute path, and /process_input wrote the
+buffer into ./input_files. Two requests at the same time would overwrite each other's files.
+
+Now the request body is wrapped in a VideoInput and that is what gets passed to the trackers (FrameSource accepts a VideoInput wherever it
+accepts a path):
+
+- With OpenCV >= 4.11 the video is decoded straight from memory (cv2.VideoCapture on a BytesIO).
+- Otherwise it is spooled into a temp file that belongs to this request only, on tmpfs (/dev/shm) when the machine has it, and deleted on close().
+
+    with VideoInput.from_upload(request.files['video']) as video:
+        output = calculate_speed_ball(video)
+"""
+
+import io
+import os
+import tempfile
+from typing import BinaryIO, List, Optional, Union
+
+import cv2
+
+# tmpfs when we have it, so spooling never touches the disk
+SPOOL_DIR = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+
+_stream_decoding_supported: Optional[bool] = None          # Found out the first time we try it
+
+
+def _open_from_memory(stream: io.BytesIO) -> Optional[cv2.VideoCapture]:
+    '''
+    Returns a capture that reads directly from the stream, or None if this OpenCV build can't do that.
+    
+    OpenCV doesn't keep a reference to the stream, the caller has to keep it alive until the capture is released (it segfaults otherwise).
+    '''
+    global _stream_decoding_supported
+
+    if _stream_decoding_supported is False:
+        return None
+
+    try:
+        cap = cv2.VideoCapture(stream, cv2.CAP_FFMPEG, [])
+    except (cv2.error, TypeError):
+        # Older OpenCV, VideoCapture only takes a filename or a device index
+        _stream_decoding_supported = False
+        return None
+
+    _stream_decoding_supported = True
+    return cap
+
+
+class VideoInput:
+    """
+    A video that came in with a request: raw bytes, a file-like object (such as werkzeug's FileStorage) or a path on disk.
+
+    Attributes:
+        data (bytes): The video itself, None when it was given as a path.
+        suffix (str): Extension of the container (with the dot), the temp file gets it so that ffmpeg can guess the format.
+        name (str): Used in the log messages.
+    """
+
+    def __init__(self, data: Union[bytes, BinaryIO, str, os.PathLike], suffix: str = '.mp4', name: Optional[str] = None):
+        self._path: Optional[str] = None
+        self._spooled_path: Optional[str] = None
+        self._streams: List[io.BytesIO] = []            # Every stream handed to OpenCV, they must outlive the captures
+        self.data: Optional[bytes] = None
+        self.suffix = suffix
+
+        if isinstance(data, (str, os.PathLike)):
+            self._path = os.fspath(data)
+            self.suffix = os.path.splitext(self._path)[1] or suffix
+        elif isinstance(data, (bytes, bytearray)):
+            self.data = bytes(data)
+        else:
+            # Request streams are capped by MAX_CONTENT_LENGTH, so reading them into memory is fine
+            self.data = data.read()
+
+        self.name = name or self._path or f"<in-memory {self.suffix} video, {len(self.data)} bytes>"
+
+    @classmethod
+    def from_upload(cls, file_storage) -> 'VideoInput':
+        '''Wraps an uploaded werkzeug FileStorage without saving it anywhere.'''
+        filename = file_storage.filename or ''
+        suffix = os.path.splitext(filename)[1].lower() or '.mp4'
+        return cls(file_storage.stream, suffix=suffix, name=filename or None)
+
+    def open_capture(self) -> cv2.VideoCapture:
+        '''A new capture positioned at the first frame. Can be called more than once (every call decodes from the start).'''
+        if self._path is not None:
+            return cv2.VideoCapture(self._path)
+
+        stream = io.BytesIO(self.data)
+        cap = _open_from_memory(stream)
+        if cap is not None and cap.isOpened():
+            self._streams.append(stream)
+            return cap
+        if cap is not None:
+            cap.release()               # Release it while the stream is still alive
+
+        return cv2.VideoCapture(self.spool())
+
+    def spool(self) -> str:
+        '''Path to the video on disk, writing it to a per-request temp file (on tmpfs if possible) the first time.'''
+        if self._path is not None:
+            return self._path
+
+        if self._spooled_path is None:
+            fd, self._spooled_path = tempfile.mkstemp(suffix=self.suffix, prefix='duxmlb_', dir=SPOOL_DIR)
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(self.data)
+
+        return self._spooled_path
+
+    def close(self) -> None:
+        '''Deletes the spooled file. Every capture from open_capture() must have been released before this.'''
+        self._streams = []
+        if self._spooled_path is not None:
+            try:
+                os.remove(self._spooled_path)
+            except FileNotFoundError:
+                pass
+            self._spooled_path = None
+
+    def __enter__(self) -> 'VideoInput':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,73 @@
+"""
+Constant velocity Kalman filter on the ball center, for BaseballTracker's tracking mode.
+
+Once the ball has been found in two consecutive frames its position in the next frame is very predictable (a pitch is nearly a straight line
+on screen at 30+ fps). So instead of running the ball model on the whole frame (or the whole pitch corridor), the tracker predicts where the
+ball will be and only runs the model on a small crop around that, see BaseballTracker(tracking=True) in flow.py.
+
+The state is (x, y, vx, vy) in pixels and pixels per frame. Gravity, drag and the perspective bend the path a little, that is left to the
+process noise (an acceleration in pixels per frame squared).
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+class BallKalman:
+    """
+    Constant velocity Kalman filter in image coordinates.
+
+    Attributes:
+        state (np.ndarray): (x, y, vx, vy).
+        covariance (np.ndarray): 4x4 covariance of the state.
+    """
+
+    def __init__(
+        self,
+        position: Tuple[float, float],
+        velocity: Tuple[float, float] = (0.0, 0.0),
+        acceleration_noise: float = 4.0,        # px / frame^2
+        measurement_noise: float = 3.0,         # px, how far a box center is off the real ball center
+        velocity_std: float = 10.0              # px / frame, uncertainty of the starting velocity
+    ):
+        self.state = np.array([position[0], position[1], velocity[0], velocity[1]], dtype=np.float64)
+        self.covariance = np.diag([measurement_noise**2, measurement_noise**2, velocity_std**2, velocity_std**2])
+        self.acceleration_noise = acceleration_noise
+        self.measurement_noise = measurement_noise
+
+        self._measure = np.array([[1.0, 0, 0, 0], [0, 1.0, 0, 0]])
+
+    def predict(self, frames: int = 1) -> np.ndarray:
+        '''Moves the state `frames` frames ahead and returns the predicted (x, y).'''
+        transition = np.eye(4)
+        transition[0, 2] = transition[1, 3] = frames
+
+        # Piecewise constant acceleration between the frames
+        dt = float(frames)
+        q = self.acceleration_noise**2 * np.array([[dt**4 / 4, dt**3 / 2], [dt**3 / 2, dt**2]])
+        noise = np.zeros((4, 4))
+        noise[np.ix_([0, 2], [0, 2])] = q
+        noise[np.ix_([1, 3], [1, 3])] = q
+
+        self.state = transition @ self.state
+        self.covariance = transition @ self.covariance @ transition.T + noise
+        return self.state[:2].copy()
+
+    def update(self, position: Tuple[float, float]) -> None:
+        '''Corrects the (predicted) state with a measured ball center.'''
+        innovation = np.asarray(position, dtype=np.float64) - self.state[:2]
+        innovation_covariance = self._measure @ self.covariance @ self._measure.T + np.eye(2) * self.measurement_noise**2
+        gain = self.covariance @ self._measure.T @ np.linalg.inv(innovation_covariance)
+
+        self.state = self.state + gain @ innovation
+        self.covariance = (np.eye(4) - gain @ self._measure) @ self.covariance
+
+    @property
+    def position(self) -> np.ndarray:
+        return self.state[:2].copy()
+
+    @property
+    def position_std(self) -> float:
+        '''Standard deviation of the position along its most uncertain axis, in pixels.'''
+        return float(np.sqrt(np.max(np.linalg.eigvalsh(self.covariance[:2, :2]))))
@@ -0,0 +1,236 @@
+"""
+LoadTools, the one copy of it.
+
+It started out as a copy of the BallDataLab loader and got pasted into every script that needed a model (flow.py, tracking_bats.py, the
+statcast models and the experiments in test/), each resolving the weights relative to its own working directory. All of them import this one
+now, and the YOLO weights are resolved through the shared model store (see model_store.py).
+"""
+
+import copy
+import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+import requests
+
+from baseball_detect.downloads import CHUNK_SIZE, checksum_path, download, read_checksum
+from baseball_detect.model_store import ModelStore, model_store
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Other places the old LoadTools copies saved weights in, these are adopted into the store instead of downloading again
+LEGACY_WEIGHT_DIRS = ['ball_tracking', 'baseball_detect/ball_tracking', 'baseball_detect/bat_tracking', '../big_weights']
+
+
+class LoadTools:
+    """
+    Class dedicated to downloading / loading models and datasets from either the BallDataLab API or specified text files.
+    
+    Attributes:
+        store (ModelStore): Where the YOLO weights are kept, the shared model_store by default.
+        session (requests.Session): Session object for making requests.
+        chunk_size (int): Size of chunks to use when downloading files.
+        yolo_model_checksums (Dict[str, str]): Expected SHA-256 of the weights of an alias. A checksum can also be pinned in a .sha256 file next
+                                               to the alias' .txt (pitcher_hitter_catcher_detector_v4.sha256 for the phc_detector). Without
+                                               one, legacy weights are only adopted if they pass the integrity check in ModelStore.fetch.
+        BDL_MODEL_API (str): Base URL for the BallDataLab model API.
+        BDL_DATASET_API (str): Base URL for the BallDataLab dataset API.
+    
+    Methods:
+        load_model(model_alias: str, model_type: str = 'YOLO', use_bdl_api: Optional[bool] = True) -> str:
+            Loads a given baseball computer vision model into the repository.
+        prefetch(model_aliases: List[str], max_workers: int = 4) -> Dict[str, str]:
+            Downloads several models in parallel.
+        load_dataset(dataset_alias: str, use_bdl_api: Optional[bool] = True) -> str:
+            Loads a zipped dataset and extracts it to a folder.
+        _download_files(url: str, dest: Union[str, os.PathLike], is_dataset: bool = False) -> None:
+            Protected method to handle model and dataset downloads (atomic, resumable and checksummed, see downloads.py).
+        _get_url(alias: str, txt_path: str, use_bdl_api: bool, api_endpoint: str) -> str:
+            Protected method to obtain the download URL from the BDL API or a text file.
+    """
+
+    def __init__(self, store: Optional[ModelStore] = None):
+        self.store = store or model_store
+        self.session = requests.Session()
+        self.chunk_size = CHUNK_SIZE
+        self.BDL_MODEL_API = "https://balldatalab.com/api/models/"
+        self.BDL_DATASET_API = "https://balldatalab.com/api/datasets/"
+        self.yolo_model_aliases = {
+            'phc_detector': './baseball_detect/ball_tracking/pitcher_hitter_catcher_detector_v4.txt',
+            'bat_tracking': './baseball_detect/bat_tracking/bat_tracking.txt',
+            'ball_tracking': './baseball_detect/ball_tracking/ball_tracking.txt',
+            'glove_tracking': 'models/YOLO/glove_tracking/model_weights/glove_tracking.txt',
+            'ball_trackingv4': './baseball_detect/ball_tracking/ball_trackingv4.txt'
+        }
+        self.yolo_model_checksums: Dict[str, str] = {}
+        self.florence_model_aliases = {              # No need (maybe)
+            'ball_tracking': 'models/FLORENCE2/ball_tracking/model_weights/florence_ball_tracking.txt',
+            'florence_ball_tracking': 'models/FLORENCE2/ball_tracking/model_weights/florence_ball_tracking.txt'
+        }
+        self.dataset_aliases = {                    # Don't have to worry about this
+            'okd_nokd': 'datasets/yolo/OKD_NOKD.txt',
+            'baseball_rubber_home_glove': 'datasets/yolo/baseball_rubber_home_glove.txt',
+            'baseball_rubber_home': 'datasets/yolo/baseball_rubber_home.txt',
+            'broadcast_10k_frames': 'datasets/raw_photos/broadcast_10k_frames.txt',
+            'broadcast_15k_frames': 'datasets/raw_photos/broadcast_15k_frames.txt',
+            'baseball_rubber_home_COCO': 'datasets/COCO/baseball_rubber_home_COCO.txt',
+            'baseball_rubber_home_glove_COCO': 'datasets/COCO/baseball_rubber_home_glove_COCO.txt',
+            'baseball': 'datasets/yolo/baseball.txt'
+        }
+
+    def _download_files(self, url: str, dest: Union[str, os.PathLike], is_folder: bool = False, is_labeled: bool = False) -> None:
+        # The download itself is atomic, resumable and checksummed, see downloads.py
+        if not is_folder:
+            download(url, dest, session=self.session, chunk_size=self.chunk_size)
+            print(f"Model downloaded to {dest}")
+            return
+
+        archive = download(url, f"{dest}.zip", session=self.session, chunk_size=self.chunk_size)
+
+        # Extract next to dest and rename at the end, so that a half extracted dataset never looks like a complete one
+        staging = f"{dest}.extracting"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        with zipfile.ZipFile(archive) as zip_ref:
+            for file in zip_ref.namelist():
+                if not file.startswith('__MACOSX') and not file.startswith('._'):
+                    if is_labeled:
+                        zip_ref.extract(file, staging)
+                    else:
+                        if '/' in file:
+                            filename = file.split('/')[-1]
+                            if filename:
+                                with zip_ref.open(file) as source, open(os.path.join(staging, filename), 'wb') as target:
+                                    shutil.copyfileobj(source, target)
+                        else:
+                            zip_ref.extract(file, staging)
+
+        if not is_labeled:
+            for root, dirs, files in os.walk(staging, topdown=False):
+                for dir in dirs:
+                    dir_path = os.path.join(root, dir)
+                    if not os.listdir(dir_path):
+                        os.rmdir(dir_path)
+
+        if os.path.isdir(dest):
+            shutil.rmtree(dest)
+        os.replace(staging, dest)
+
+        os.remove(archive)
+        os.remove(checksum_path(archive))
+        print(f"Dataset downloaded and extracted to {dest}")
+
+    def _legacy_weight_paths(self, base_dir: str, base_name: str) -> List[str]:
+        '''Where the older copies of LoadTools saved these weights. Always relative to src/backend, never to the working directory.'''
+        directories = [base_dir] + LEGACY_WEIGHT_DIRS
+        paths = [os.path.normpath(os.path.join(BACKEND_DIR, directory, f"{base_name}.pt")) for directory in directories]
+        return list(dict.fromkeys(paths))
+
+    def _get_url(self, alias: str, txt_path: str, use_bdl_api: bool, api_endpoint: str) -> str:
+        if use_bdl_api:
+            return f"{api_endpoint}{alias}"
+        else:
+            with open(txt_path, 'r') as file:
+                return file.read().strip()
+
+    def load_model(self, model_alias: str, model_type: str = 'YOLO', use_bdl_api: Optional[bool] = True, model_txt_path: Optional[str] = None) -> str:
+        '''
+        Loads a given baseball computer vision model into the repository.
+
+        Args:
+            model_alias (str): Alias of the model to load.
+            model_type (str): The type of the model to utilize. Defaults to YOLO.
+            use_bdl_api (Optional[bool]): Whether to use the BallDataLab API.
+            model_txt_path (Optional[str]): Path to .txt file containing download link to model weights. 
+                                            Only used if use_bdl_api is specified as False.
+
+        Returns:
+            model_weights_path (str):  Path to where the model weights are saved (in the model store for YOLO models).
+        '''
+        if model_type == 'YOLO':
+            model_txt_path = self.yolo_model_aliases.get(model_alias) if use_bdl_api else model_txt_path
+        elif model_type == 'FLORENCE2':
+            model_txt_path = self.florence_model_aliases.get(model_alias) if use_bdl_api else model_txt_path
+        else:
+            raise ValueError(f"Invalid model type: {model_type}")
+        
+        if not model_txt_path:
+            raise ValueError(f"Invalid alias: {model_alias}")
+
+        base_dir = os.path.dirname(model_txt_path)
+        base_name = os.path.splitext(os.path.basename(model_txt_path))[0]
+
+        if model_type == 'YOLO':
+            # YOLO weights are kept in the shared model store, whatever directory we were started from (see model_store.py)
+            name = model_alias if use_bdl_api else base_name
+            model_weights_path = self.store.fetch(
+                name,
+                lambda: self._get_url(model_alias, model_txt_path, use_bdl_api, self.BDL_MODEL_API),
+                legacy_paths=self._legacy_weight_paths(base_dir, base_name),
+                sha256=self.yolo_model_checksums.get(model_alias) or read_checksum(os.path.join(BACKEND_DIR, base_dir, base_name)),
+                session=self.session,
+                chunk_size=self.chunk_size
+            )
+            print(f"Model found at {model_weights_path}")
+            return model_weights_path
+        else:
+            model_weights_path = f"{base_dir}/{base_name}"
+            os.makedirs(model_weights_path, exist_ok=True)
+
+        if os.path.exists(model_weights_path):
+            print(f"Model found at {model_weights_path}")
+            return model_weights_path
+
+        url = self._get_url(model_alias, model_txt_path, use_bdl_api, self.BDL_MODEL_API)
+        self._download_files(url, model_weights_path, is_folder=(model_type=='FLORENCE2'))
+        
+        return model_weights_path
+
+    def prefetch(self, model_aliases: List[str], max_workers: int = 4) -> Dict[str, str]:
+        '''
+        Downloads several models in parallel (for provisioning a new machine). Models that are already there are skipped.
+
+        Returns:
+            A dictionary from alias to the path of the weights.
+        '''
+        # requests.Session isn't thread safe, so every download gets its own copy of this LoadTools (same store, URLs and checksums)
+        def load(alias: str) -> str:
+            tools = copy.copy(self)
+            tools.session = requests.Session()
+            return tools.load_model(model_alias=alias)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            paths = executor.map(load, model_aliases)
+            return dict(zip(model_aliases, paths))
+
+    def load_dataset(self, dataset_alias: str, use_bdl_api: Optional[bool] = True, file_txt_path: Optional[str] = None) -> str:
+        '''
+        Loads a zipped dataset and extracts it to a folder.
+
+        Args:
+            dataset_alias (str): Alias of the dataset to load that corresponds to a dataset folder to download
+            use_bdl_api (Optional[bool]): Whether to use the BallDataLab API. Defaults to True.
+            file_txt_path (Optional[str]): Path to .txt file containing download link to zip file containing dataset. 
+                                           Only used if use_bdl_api is specified as False.
+
+        Returns:
+            dir_name (str): Path to the folder containing the dataset.
+        '''
+        txt_path = self.dataset_aliases.get(dataset_alias) if use_bdl_api else file_txt_path
+        if not txt_path:
+            raise ValueError(f"Invalid alias or missing path: {dataset_alias}")
+
+        base = os.path.splitext(os.path.basename(txt_path))[0]
+        dir_name = "unlabeled_" + base if 'raw_photos' in base or 'frames' in base or 'frames' in dataset_alias else base
+
+        if os.path.exists(dir_name):
+            print(f"Dataset found at {dir_name}")
+            return dir_name
+
+        url = self._get_url(dataset_alias, txt_path, use_bdl_api, self.BDL_DATASET_API)
+        self._download_files(url, dir_name, is_folder=True)
+
+        return dir_name
@@ -0,0 +1,164 @@
+"""
+One on-disk store for the model weights, shared by every LoadTools user on the machine.
+
+The weights used to be saved next to cwd-relative .txt paths like ./baseball_detect/ball_tracking/ and ../big_weights/, so depending on the
+directory a process was started from the same weights were either downloaded again or not found at all. Now they all live in one store:
+
+    $DUXMLB_MODEL_STORE (default ~/.cache/duxmlb/models)
+        sha256/<digest>.pt      the weights, named by their content, so every copy of the same file is stored once
+        refs/<alias>            the file name of the blob the alias points to
+        downloads/              downloads in progress (see downloads.py)
+
+LoadTools.load_model resolves an alias through the store. The first time an alias is asked for, weights already sitting at one of the old paths
+(resolved against src/backend, not the working directory) are adopted (hard linked or copied, never moved) instead of being downloaded again.
+If the alias has a pinned SHA-256 (see LoadTools), the download is verified against it and legacy files that don't match it are not adopted.
+Without one, a legacy file is only adopted if it is a complete zip archive (see weights_look_complete), so a half copied .pt doesn't become a
+permanent entry of the store. Everything written to the store is written atomically,
+and a lock per alias makes sure that workers starting together download it only once.
+
+Exports made by runtime.py land next to the blob (sha256/<digest>.onnx and so on), so they are shared the same way.
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import Callable, Iterable, Optional
+
+import requests
+
+from baseball_detect.downloads import CHUNK_SIZE, checksum_path, download, download_lock, file_sha256
+
+DEFAULT_ROOT = os.environ.get('DUXMLB_MODEL_STORE') or os.path.join(os.path.expanduser('~'), '.cache', 'duxmlb', 'models')
+
+
+def weights_look_complete(path: str) -> bool:
+    '''
+    Cheap stand-in for loading the weights, without importing torch.
+
+    torch (and so ultralytics) saves .pt files as zip archives, which end with their table of contents and carry a CRC per member. A truncated
+    copy has no table of contents and a corrupted one fails a CRC, so both are caught by reading the archive once.
+    '''
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return archive.testzip() is None
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+
+class ModelStore:
+    """
+    Content addressed store of model weights, with named refs (the LoadTools aliases) pointing into it.
+
+    Attributes:
+        root (str): Absolute path of the store.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or DEFAULT_ROOT)
+
+    def _blob_path(self, digest: str, suffix: str) -> str:
+        return os.path.join(self.root, 'sha256', f"{digest}{suffix}")
+
+    def _ref_path(self, name: str) -> str:
+        return os.path.join(self.root, 'refs', name)
+
+    def _write_atomic(self, path: str, text: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(text)
+        os.replace(tmp, path)
+
+    def lookup(self, name: str) -> Optional[str]:
+        '''Path of the weights that name points to, None if the store doesn't have them.'''
+        try:
+            with open(self._ref_path(name)) as fp:
+                blob = os.path.join(self.root, 'sha256', fp.read().strip())
+        except FileNotFoundError:
+            return None
+        return blob if os.path.isfile(blob) else None
+
+    def add(self, name: str, path: str, move: bool = False) -> str:
+        '''
+        Puts the file at path into the store under name and returns its path in the store.
+
+        With move the file is moved in (used for finished downloads), otherwise it is hard linked, or copied if that's not possible.
+        '''
+        suffix = os.path.splitext(path)[1]
+        blob = self._blob_path(file_sha256(path), suffix)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+
+        if os.path.exists(blob):                    # Same content under another name, or added before
+            if move:
+                os.remove(path)
+        elif move:
+            os.replace(path, blob)
+        else:
+            tmp = f"{blob}.tmp{os.getpid()}"
+            try:
+                os.link(path, tmp)
+            except OSError:                         # Different filesystem, or no hard links
+                shutil.copyfile(path, tmp)
+            os.replace(tmp, blob)
+
+        self._write_atomic(self._ref_path(name), os.path.basename(blob))
+        return blob
+
+    def fetch(
+        self,
+        name: str,
+        get_url: Callable[[], str],
+        suffix: str = '.pt',
+        legacy_paths: Iterable[str] = (),
+        sha256: Optional[str] = None,
+        session: Optional[requests.Session] = None,
+        chunk_size: int = CHUNK_SIZE
+    ) -> str:
+        '''
+        Path of the weights for name, adopting them from a legacy path or downloading them if the store doesn't have them yet.
+
+        Args:
+            name (str): The alias.
+            get_url (Callable[[], str]): Returns the download URL, only called when the weights really have to be downloaded.
+            suffix (str): Extension of the weights (ultralytics picks the format from it).
+            legacy_paths (Iterable[str]): Where older versions of LoadTools saved these weights.
+            sha256 (str): Expected SHA-256 (hex) of the weights. Downloads are checked against it and legacy files that don't match are skipped.
+                          Without it, legacy .pt files that aren't complete (see weights_look_complete) are skipped.
+            session (requests.Session): Session for the download, passed on to download().
+            chunk_size (int): Bytes read from the response at a time.
+        '''
+        found = self.lookup(name)
+        if found:
+            return found
+
+        ref = self._ref_path(name)
+        os.makedirs(os.path.dirname(ref), exist_ok=True)
+        with download_lock(ref):
+            found = self.lookup(name)               # Another worker got it while we were waiting
+            if found:
+                return found
+
+            for legacy_path in legacy_paths:
+                if os.path.isfile(legacy_path):
+                    if sha256 and file_sha256(legacy_path) != sha256.lower():
+                        print(f"Not adopting {legacy_path}, it doesn't match the pinned checksum of {name}")
+                        continue
+                    if not sha256 and suffix == '.pt' and not weights_look_complete(legacy_path):
+                        print(f"Not adopting {legacy_path}, it is truncated or corrupt")
+                        continue
+                    print(f"Adding {legacy_path} to the model store at {self.root}")
+                    return self.add(name, legacy_path)
+
+            downloads_dir = os.path.join(self.root, 'downloads')
+            os.makedirs(downloads_dir, exist_ok=True)
+            downloaded = download(get_url(), os.path.join(downloads_dir, f"{name}{suffix}"), session=session, sha256=sha256, chunk_size=chunk_size)
+
+            blob = self.add(name, downloaded, move=True)
+            if os.path.exists(checksum_path(downloaded)):
+                os.remove(checksum_path(downloaded))       # The blob's name is its checksum now
+            return blob
+
+
+# The store every LoadTools uses, DUXMLB_MODEL_STORE moves it
+model_store = ModelStore()
@@ -0,0 +1,155 @@
+"""
+Cheap motion energy prefilter that runs before the ball model.
+
+Most frames of a highlight (or of the 5 second buffer) don't have a ball in flight, but the tracker was running YOLO on every one of them.
+This builds on the background subtractor experiment in test/subtractor/test_background_subtractor.py. That one was not good enough to find the
+ball by itself (the pitcher and the batter move too), but it is more than good enough to say "nothing is moving here, skip it".
+
+For every frame we compute the fraction of changed pixels on a small grayscale copy (inside the pitch corridor when it is known), either by
+differencing with the previous frame or with the MOG2 background subtractor. Frames above the threshold are "active", and only the active frames
+plus `padding` frames on each side are passed on to the tracker. All the other frames are skipped and counted.
+"""
+
+import cv2
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class MotionEnergy:
+    """
+    Computes the motion energy (fraction of moving pixels, 0 to 1) of consecutive frames.
+
+    Attributes:
+        method (str): 'diff' for frame differencing or 'mog2' for background subtraction.
+        width (int): Frames are downscaled to this width before anything else, the exact value barely matters.
+        diff_threshold (int): Gray level change that counts as motion for the 'diff' method.
+        warmup (int): Number of frames MOG2 needs to learn the background, these get an energy of 0.
+    """
+
+    def __init__(self, method: str = 'diff', width: int = 160, diff_threshold: int = 25, warmup: int = 5):
+        if method not in ('diff', 'mog2'):
+            raise ValueError(f"Invalid motion method: {method}")
+
+        self.method = method
+        self.width = width
+        self.diff_threshold = diff_threshold
+        self.warmup = warmup
+        self.reset()
+
+    def reset(self) -> None:
+        self.previous = None
+        self.seen = 0
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        # Same settings as the subtractor experiment
+        self.fgbg = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=50, detectShadows=False) if self.method == 'mog2' else None
+
+    def _prepare(self, frame: np.ndarray, roi: Optional[Tuple[int, int, int, int]]) -> np.ndarray:
+        if roi is not None:
+            x1, y1, x2, y2 = roi
+            frame = frame[y1:y2, x1:x2]
+
+        height, width = frame.shape[:2]
+        scale = self.width / float(width)
+        small = cv2.resize(frame, (self.width, max(1, int(round(height * scale)))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def __call__(self, frame: np.ndarray, roi: Optional[Tuple[int, int, int, int]] = None) -> float:
+        gray = self._prepare(frame, roi)
+        self.seen += 1
+
+        if self.method == 'mog2':
+            fgmask = self.fgbg.apply(gray)
+            if self.seen <= self.warmup:
+                return 0.0
+        else:
+            previous = self.previous
+            self.previous = gray
+            if previous is None or previous.shape != gray.shape:       # first frame, or the roi changed
+                return 0.0
+            _, fgmask = cv2.threshold(cv2.absdiff(gray, previous), self.diff_threshold, 255, cv2.THRESH_BINARY)
+
+        fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, self.kernel)
+        return float(np.count_nonzero(fgmask)) / fgmask.size
+
+
+class MotionPrefilter:
+    """
+    Frame consumer that only forwards the frames around motion to the next consumer (a BaseballTracker or a PitchCorridorGate).
+
+    Frames are delayed by up to `padding` frames so that the frames right before a burst of motion can still be forwarded.
+    The frame numbers are never changed, so the tracker's sequences and timestamps stay correct.
+
+    Attributes:
+        consumer: The consumer that gets the active frames, it must also have a finish(scale_factor) method.
+        threshold (float): Minimum fraction of moving pixels for a frame to be active.
+        padding (int): Frames forwarded before and after every active frame.
+        motion (MotionEnergy): The motion energy calculator.
+        roi_source: Optional object with a `roi` attribute (the tracker), when that is set the motion is only measured inside it.
+    """
+
+    def __init__(self, consumer, threshold: float = 0.002, padding: int = 8, method: str = 'diff', roi_source=None):
+        self.consumer = consumer
+        self.threshold = threshold
+        self.padding = padding
+        self.motion = MotionEnergy(method=method)
+        self.roi_source = roi_source
+
+    def start(self, fps: float, frame_count: int) -> None:
+        self.consumer.start(fps, frame_count)
+        self.motion.reset()
+        self.held_back = deque()
+        self.forward_remaining = 0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+        self.windows: List[List[int]] = []              # [start_frame, end_frame] of every forwarded window
+
+    def set_frame_count(self, frame_count: int) -> None:
+        if hasattr(self.consumer, 'set_frame_count'):
+            self.consumer.set_frame_count(frame_count)
+
+    def _forward(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
+        if self.windows and self.windows[-1][1] == frame_number - 1:
+            self.windows[-1][1] = frame_number
+        else:
+            self.windows.append([frame_number, frame_number])
+        self.consumer.process_frame(frame_number, timestamp, frame)
+
+    def process_frame(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
+        self.frames_seen += 1
+        roi = getattr(self.roi_source, 'roi', None) if self.roi_source is not None else None
+        energy = self.motion(frame, roi)
+
+        if energy >= self.threshold:
+            # Send the held back frames first (padding before the motion), then this one
+            while self.held_back:
+                self._forward(*self.held_back.popleft())
+            self._forward(frame_number, timestamp, frame)
+            self.forward_remaining = self.padding
+        elif self.forward_remaining > 0:
+            self._forward(frame_number, timestamp, frame)
+            self.forward_remaining -= 1
+        else:
+            self.held_back.append((frame_number, timestamp, frame))
+            if len(self.held_back) > self.padding:
+                self.held_back.popleft()
+                self.frames_skipped += 1
+
+    def stats(self) -> Dict:
+        return {
+            "frames_seen": self.frames_seen,
+            "frames_skipped": self.frames_skipped,
+            "windows": [tuple(window) for window in self.windows],
+        }
+
+    def finish(self, scale_factor: float) -> Dict:
+        # Whatever is still held back had no motion after it
+        self.frames_skipped += len(self.held_back)
+        self.held_back.clear()
+
+        print(f"Motion prefilter skipped {self.frames_skipped} of {self.frames_seen} frames")
+        results = self.consumer.finish(scale_factor)
+        results["prefilter"] = self.stats()
+        return results
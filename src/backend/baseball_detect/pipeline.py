@@ -0,0 +1,259 @@
+"""
+Small pipeline engine for the video paths.
+
+All of our video loops (BaseballTracker, BatTracker, the stylized detector in model0) used to do decode -> preprocess -> inference -> bookkeeping
+strictly one after the other in a single loop. So while the model was busy nothing was being decoded, and while a frame was being deblurred the model sat idle.
+
+Here every stage runs in its own thread(s) and the stages are connected by bounded queues:
+
+    source (decode) --> queue --> stage 1 (N workers) --> queue --> stage 2 (M workers) --> ... --> results (in order)
+
+- The queues are bounded, so a fast decoder can't run away and fill the memory with frames.
+- cv2 and torch release the GIL while they work, so threads are enough to get the overlap.
+- Stages with more than one worker can finish items out of order. A stage marked `ordered=True` (single worker) gets its items back in the
+  source order, which is what the bookkeeping (tracking) stage needs. The final results are also yielded in the source order.
+- Every stage records how long its workers were busy. `utilisation()` divides that by the wall time, the stage closest to 100% is the bottleneck.
+
+Note: a YOLO model instance is not thread safe, so a stage that calls the same model should have workers=1.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+_END = object()                 # Sentinel that tells a worker there are no more items
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Any], Any]    # Takes the output of the previous stage and returns the input for the next one
+    workers: int = 1
+    ordered: bool = False       # Process the items in source order (only possible with a single worker)
+
+
+class _StageStats:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.items = 0
+        self.busy_time = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, busy_time: float) -> None:
+        with self.lock:
+            self.items += 1
+            self.busy_time += busy_time
+
+
+class Pipeline:
+    """
+    Runs a source iterable through a list of stages concurrently.
+
+    Attributes:
+        source (Iterable): Produces the items, usually decoded frames. It is iterated in its own thread.
+        stages (List[Stage]): The processing stages in order.
+        queue_size (int): Maximum number of items waiting in between two stages.
+        source_name (str): Name used for the source in the utilisation report.
+    """
+
+    def __init__(self, source: Iterable, stages: List[Stage], queue_size: int = 8, source_name: str = 'decode'):
+        if queue_size < 1:
+            raise ValueError(f"queue_size must be at least 1, got {queue_size}")
+        for stage in stages:
+            if stage.workers < 1:
+                raise ValueError(f"Stage {stage.name} needs at least one worker")
+            if stage.ordered and stage.workers != 1:
+                raise ValueError(f"Stage {stage.name} is ordered, so it can only have one worker")
+
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self.source_name = source_name
+
+        self._stats: Dict[str, _StageStats] = {}
+        self._wall_time = 0.0
+
+    def _put(self, q: queue.Queue, item, stop: threading.Event) -> bool:
+        '''Blocking put that gives up when the pipeline is being torn down. Returns False in that case.'''
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, error: Exception, errors: List, stop: threading.Event) -> None:
+        '''Records the error and tears the pipeline down, so the source stops decoding and the other workers stop taking items.'''
+        errors.append(error)
+        stop.set()
+
+    def _run_source(self, out_q: queue.Queue, next_workers: int, stats: _StageStats, errors: List, stop: threading.Event) -> None:
+        iterator = None
+        try:
+            iterator = iter(self.source)
+            index = 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stats.add(time.perf_counter() - started)
+
+                if not self._put(out_q, (index, item), stop):
+                    return
+                index += 1
+        except Exception as e:
+            self._fail(e, errors, stop)
+        finally:
+            if hasattr(iterator, 'close'):          # Releases the VideoCapture if we stopped before the end of the video
+                iterator.close()
+            for _ in range(next_workers):
+                self._put(out_q, _END, stop)
+
+    def _run_worker(self, stage: Stage, in_q: queue.Queue, out_q: queue.Queue, next_workers: int, remaining: List[int],
+                    remaining_lock: threading.Lock, stats: _StageStats, errors: List, stop: threading.Event) -> None:
+        waiting = {}                        # Only used by ordered stages, items that arrived before their turn
+        next_index = 0
+
+        while not stop.is_set():
+            try:
+                entry = in_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if entry is _END:
+                break
+
+            if stage.ordered:
+                waiting[entry[0]] = entry[1]
+                ready = []
+                while next_index in waiting:
+                    ready.append((next_index, waiting.pop(next_index)))
+                    next_index += 1
+            else:
+                ready = [entry]
+
+            for index, item in ready:
+                started = time.perf_counter()
+                try:
+                    result = stage.fn(item)
+                except Exception as e:
+                    self._fail(e, errors, stop)
+                    break
+                stats.add(time.perf_counter() - started)
+
+                if not self._put(out_q, (index, result), stop):
+                    return
+
+        # The last worker of a stage to finish passes the end marker on to the next stage
+        with remaining_lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+        if last_worker:
+            for _ in range(next_workers):
+                self._put(out_q, _END, stop)
+
+    def run(self) -> Iterator[Any]:
+        '''
+        Start all the stages and yield the output of the last stage, in the same order as the source produced the items.
+
+        Any exception raised inside a stage (or the source) stops the whole pipeline, the source doesn't decode any further, and it is re-raised
+        here once the pipeline has shut down.
+        '''
+        stop = threading.Event()
+        errors: List[Exception] = []
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+
+        self._stats = {self.source_name: _StageStats(workers=1)}
+        first_workers = self.stages[0].workers if self.stages else 1
+        threads.append(threading.Thread(
+            target=self._run_source,
+            args=(queues[0], first_workers, self._stats[self.source_name], errors, stop),
+            daemon=True
+        ))
+
+        for i, stage in enumerate(self.stages):
+            self._stats[stage.name] = _StageStats(workers=stage.workers)
+            next_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            remaining = [stage.workers]
+            remaining_lock = threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_worker,
+                    args=(stage, queues[i], queues[i + 1], next_workers, remaining, remaining_lock, self._stats[stage.name], errors, stop),
+                    daemon=True
+                ))
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        # Put the results back in order before handing them to the caller
+        out_q = queues[-1]
+        waiting = {}
+        next_index = 0
+        try:
+            while True:
+                try:
+                    entry = out_q.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():           # A stage failed, its end marker won't come
+                        break
+                    continue
+                if entry is _END:
+                    break
+                index, result = entry
+                waiting[index] = result
+                while next_index in waiting:
+                    yield waiting.pop(next_index)
+                    next_index += 1
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self._wall_time = time.perf_counter() - started
+
+        if errors:
+            raise errors[0]
+
+    def utilisation(self) -> Dict[str, Dict[str, float]]:
+        '''
+        Per stage statistics of the last run.
+
+        Returns:
+            A dictionary keyed by stage name with the number of items, the busy time (summed over the workers), the number of workers and
+            the utilisation, that is busy time / (wall time * workers). A value close to 1 means that stage is the bottleneck.
+        '''
+        report = {}
+        for name, stats in self._stats.items():
+            capacity = self._wall_time * stats.workers
+            report[name] = {
+                "items": stats.items,
+                "workers": stats.workers,
+                "busy_time": stats.busy_time,
+                "utilisation": stats.busy_time / capacity if capacity > 0 else 0.0,
+            }
+        return report
+
+    def print_report(self) -> None:
+        print(f"Pipeline finished in {self._wall_time:.2f}s")
+        for name, stats in self.utilisation().items():
+            print(f"  {name:<12} workers={stats['workers']:<2} items={stats['items']:<6} busy={stats['busy_time']:.2f}s utilisation={stats['utilisation'] * 100:.1f}%")
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[List]:
+    '''Groups an iterable into lists of batch_size items (the last one can be shorter).'''
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
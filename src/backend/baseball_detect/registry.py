@@ -0,0 +1,250 @@
+"""
+Process-wide registry of warm YOLO models.
+
+Every request used to build a new LoadTools() and a new YOLO(weights), so every single request paid for reading and deserialising the weights
+(and /load-yolo-model/ loaded all three models just to throw them away). Now the models are loaded once per process and kept in memory:
+
+    with model_registry.borrow('ball_trackingv4') as model:
+        results = model.predict(frame)
+
+- Models are keyed by their LoadTools alias and loaded on first use (or ahead of time with load()).
+- A YOLO instance is not thread safe, so borrow() hands a model to one caller at a time. Two requests that need the same model take turns,
+  requests that need different models run in parallel. Always borrow several models in the same order (phc_detector before ball_trackingv4)
+  so that two requests can't end up waiting on each other.
+- The memory is capped (max_models and/or max_bytes). When a new model doesn't fit, the least recently used model that nobody is borrowing
+  is evicted.
+- on_load / on_evict hooks are called with (alias, model) whenever a model enters or leaves the registry.
+- Loading the weights isn't everything, the first predict call of a model also initialises its graph and kernels (and compiles the network
+  for the onnx / openvino backends). warm_up() runs dummy frames through a model so that a real request never pays for that, stats() has the
+  timings. The boot time warm-up and the /ready endpoint are in warmup.py.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from baseball_detect.load_tools import LoadTools
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+
+def load_yolo(alias: str) -> 'YOLO':
+    '''Default loader, downloads the weights through LoadTools if needed and runs them on the configured backend (see runtime.py).'''
+    # Imported here so that importing the registry (main.py does it for /load-yolo-model/) doesn't import ultralytics and torch
+    from baseball_detect.runtime import INT8_MODELS, load_detector
+
+    return load_detector(LoadTools().load_model(model_alias=alias), int8=alias in INT8_MODELS)
+
+
+def model_size(model) -> int:
+    '''Approximate memory used by a model in bytes (its parameters and buffers), 0 if that can't be found out.'''
+    module = getattr(model, 'model', model)
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+    except AttributeError:
+        # Exported models (see runtime.py) aren't torch modules, use the size of what they were loaded from
+        if isinstance(module, (str, os.PathLike)) and os.path.isfile(module):
+            return os.path.getsize(module)
+        if isinstance(module, (str, os.PathLike)) and os.path.isdir(module):
+            return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(module) for name in names)
+        return 0
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class _Entry:
+    def __init__(self, model, size: int):
+        self.model = model
+        self.size = size
+        self.lock = threading.Lock()        # Held by whoever is borrowing the model
+        self.borrowers = 0                  # Callers holding or waiting for the lock, an entry with borrowers is never evicted
+        self.load_seconds = 0.0
+        self.warm_up: Optional[Dict[str, float]] = None     # Timings of warm_up(), None until the model has been warmed up
+
+
+class ModelRegistry:
+    """
+    Thread safe LRU cache of loaded models.
+
+    Attributes:
+        loader (Callable[[str], object]): Builds the model for an alias, defaults to YOLO weights from LoadTools.
+        max_models (int): Maximum number of models kept warm, None for no limit.
+        max_bytes (int): Maximum memory used by the warm models, None for no limit.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], object] = load_yolo,
+        max_models: Optional[int] = 4,
+        max_bytes: Optional[int] = None,
+        on_load: Optional[Callable[[str, object], None]] = None,
+        on_evict: Optional[Callable[[str, object], None]] = None
+    ):
+        self.loader = loader
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.on_load: List[Callable[[str, object], None]] = [on_load] if on_load else []
+        self.on_evict: List[Callable[[str, object], None]] = [on_evict] if on_evict else []
+
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()      # Least recently used first
+        self._loading: Dict[str, threading.Lock] = {}                   # So that two requests don't load the same model at the same time
+        self._lock = threading.Lock()
+
+    def _acquire_entry(self, alias: str) -> _Entry:
+        '''Returns the entry for alias (loading it if needed) with its borrower count already increased.'''
+        with self._lock:
+            entry = self._entries.get(alias)
+            if entry is not None:
+                entry.borrowers += 1
+                self._entries.move_to_end(alias)
+                return entry
+            loading = self._loading.setdefault(alias, threading.Lock())
+
+        with loading:
+            with self._lock:
+                entry = self._entries.get(alias)            # Someone else loaded it while we were waiting
+                if entry is not None:
+                    entry.borrowers += 1
+                    self._entries.move_to_end(alias)
+                    return entry
+
+            # Loading takes a while, don't block the other models in the meantime
+            print(f"Loading model {alias}")
+            start = time.perf_counter()
+            model = self.loader(alias)
+            entry = _Entry(model, model_size(model))
+            entry.load_seconds = time.perf_counter() - start
+            entry.borrowers += 1
+
+            with self._lock:
+                self._entries[alias] = entry
+                self._loading.pop(alias, None)
+
+        for hook in self.on_load:
+            hook(alias, model)
+        self._evict_over_cap()
+        return entry
+
+    def _release_entry(self, entry: _Entry) -> None:
+        with self._lock:
+            entry.borrowers -= 1
+        self._evict_over_cap()
+
+    def _over_cap(self) -> bool:
+        if self.max_models is not None and len(self._entries) > self.max_models:
+            return True
+        if self.max_bytes is not None and sum(entry.size for entry in self._entries.values()) > self.max_bytes:
+            return True
+        return False
+
+    def _evict_over_cap(self) -> None:
+        evicted = []
+        with self._lock:
+            while self._over_cap():
+                idle = [alias for alias, entry in self._entries.items() if entry.borrowers == 0]
+                if not idle:
+                    break                   # Everything is in use, we go over the cap until something is given back
+                evicted.append((idle[0], self._entries.pop(idle[0]).model))
+
+        for alias, model in evicted:
+            self._evicted(alias, model)
+
+    def _evicted(self, alias: str, model) -> None:
+        print(f"Evicted model {alias}")
+        for hook in self.on_evict:
+            hook(alias, model)
+
+    @contextmanager
+    def borrow(self, alias: str) -> Iterator[object]:
+        '''Context manager that hands out the warm model for alias, for as long as the with block runs. Loads the model if needed.'''
+        entry = self._acquire_entry(alias)
+        try:
+            with entry.lock:
+                yield entry.model
+        finally:
+            self._release_entry(entry)
+
+    def load(self, alias: str) -> None:
+        '''Loads the model for alias now (if it isn't loaded already), so that the first request doesn't have to wait for it.'''
+        self._release_entry(self._acquire_entry(alias))
+
+    def warm_up(
+        self,
+        alias: str,
+        frame_shape: Tuple[int, int, int] = (720, 1280, 3),
+        batch_sizes: Sequence[int] = (1,),
+        runs: int = 2
+    ) -> Dict[str, float]:
+        '''
+        Loads the model for alias if needed and runs dummy frames through it, so that the lazy initialisation of the first predict calls
+        is done before a real request comes in. Returns the timings (in seconds), they are also kept for stats().
+
+        Args:
+            alias (str): The model.
+            frame_shape (Tuple[int, int, int]): Shape of the dummy frames, a broadcast video frame by default.
+            batch_sizes (Sequence[int]): Batch sizes to run, exported models with dynamic shapes initialise each new shape separately.
+            runs (int): predict calls per batch size, the later ones show the steady state latency.
+        '''
+        frame = np.full(frame_shape, 114, dtype=np.uint8)          # The grey ultralytics pads with
+        timings = {}
+
+        entry = self._acquire_entry(alias)
+        try:
+            with entry.lock:
+                start = time.perf_counter()
+                for batch_size in batch_sizes:
+                    for _ in range(runs):
+                        predict_start = time.perf_counter()
+                        entry.model.predict([frame] * batch_size, verbose=False)
+                        timings.setdefault('first_predict_seconds', time.perf_counter() - predict_start)
+                        timings['predict_seconds'] = time.perf_counter() - predict_start        # The last one, once everything is warm
+                timings['warm_up_seconds'] = time.perf_counter() - start
+                timings['load_seconds'] = entry.load_seconds
+                entry.warm_up = timings
+        finally:
+            self._release_entry(entry)
+
+        print(f"Warmed up model {alias} in {timings['warm_up_seconds']:.2f}s")
+        return timings
+
+    def evict(self, alias: str) -> bool:
+        '''
+        Drops the model for alias from the registry. Returns False if it wasn't loaded.
+
+        A model that is currently borrowed stays usable by its borrower, it is just not handed out anymore.
+        '''
+        with self._lock:
+            entry = self._entries.pop(alias, None)
+        if entry is None:
+            return False
+        self._evicted(alias, entry.model)
+        return True
+
+    def loaded(self) -> List[str]:
+        '''Aliases of the warm models, least recently used first.'''
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                alias: {"bytes": entry.size, "borrowers": entry.borrowers, "load_seconds": entry.load_seconds, "warm_up": entry.warm_up}
+                for alias, entry in self._entries.items()
+            }
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+# The one registry the request handlers share. DUXMLB_MAX_WARM_MODELS / DUXMLB_MAX_MODEL_MB override the memory cap.
+model_registry = ModelRegistry(
+    max_models=_env_int('DUXMLB_MAX_WARM_MODELS') or 4,
+    max_bytes=(_env_int('DUXMLB_MAX_MODEL_MB') or 0) * 1024 * 1024 or None
+)
@@ -0,0 +1,177 @@
+"""
+Inference runtimes for the YOLO models.
+
+On CPU only servers the PyTorch models are slow, ONNX Runtime and OpenVINO run the same networks a lot faster. The runtime is picked with the
+DUXMLB_INFERENCE_BACKEND environment variable:
+
+    torch       the .pt weights through PyTorch (default, same as before)
+    onnx        <weights>.onnx through ONNX Runtime                 (needs `pip install onnx onnxruntime`)
+    openvino    <weights>_openvino_model/ through OpenVINO          (needs `pip install openvino`)
+
+The exported artifacts are cached next to the .pt file that LoadTools.load_model returns, and they are exported again when the .pt is newer.
+ultralytics loads all of these formats behind the same YOLO object, so the trackers and the registry don't need to know which one they got.
+
+The exports have dynamic input shapes, so batched predict calls, ROI crops and other imgsz values (the coarse scan uses 320) keep working.
+Use test/benchmarks/check_backend_parity.py to check that an exported model finds the same boxes as the PyTorch one.
+
+INT8
+    The models listed in DUXMLB_INT8_MODELS (comma separated aliases, e.g. `ball_trackingv4,bat_tracking`) are post-training quantized to INT8
+    with the onnx or openvino backend. The quantization is calibrated on frames sampled from baseball_detect/input/*.mp4, and the export is
+    cached as <weights>_int8.onnx / <weights>_int8_openvino_model/. It trades a little recall for speed, test/benchmarks/benchmark_int8.py
+    measures both (latency, and the sequences and mph that BaseballTracker finds).
+"""
+
+import glob
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+import cv2
+import yaml
+from ultralytics import YOLO
+from ultralytics.cfg import DEFAULT_CFG_DICT
+
+from baseball_detect.frame_source import FrameSource
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+INFERENCE_BACKEND = os.environ.get('DUXMLB_INFERENCE_BACKEND', 'torch').lower()
+INT8_MODELS = [alias.strip() for alias in os.environ.get('DUXMLB_INT8_MODELS', '').split(',') if alias.strip()]
+
+CALIBRATION_CLIPS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input', '*.mp4')
+
+# What ultralytics names the export of <stem>.pt, and the packages it needs for it
+_EXPORT_SUFFIXES: Dict[str, str] = {
+    'onnx': '.onnx',
+    'openvino': '_openvino_model',
+}
+_EXPORT_REQUIREMENTS: Dict[str, tuple] = {
+    'onnx': ('onnx', 'onnxruntime'),
+    'openvino': ('openvino',),
+}
+
+_export_lock = threading.Lock()
+
+
+def _check_backend(backend: str) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+    missing = [package for package in _EXPORT_REQUIREMENTS.get(backend, ()) if importlib.util.find_spec(package) is None]
+    if missing:
+        raise ImportError(f"The {backend} backend needs {', '.join(missing)}, install it with `pip install {' '.join(missing)}`")
+
+
+def artifact_path(weights_path: str, backend: str, variant: str = '') -> str:
+    '''
+    Where the export of weights_path for backend is cached (a file for onnx, a folder for openvino).
+
+    variant is added to the name, for exports with different settings of the same weights.
+    '''
+    if backend == 'torch':
+        return weights_path
+
+    base, _ = os.path.splitext(weights_path)
+    return f"{base}{variant}{_EXPORT_SUFFIXES[backend]}"
+
+
+def _is_fresh(artifact: str, weights_path: str) -> bool:
+    return os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(weights_path)
+
+
+def export_weights(weights_path: str, backend: str, imgsz: int = 640, variant: str = '', **export_args) -> str:
+    '''
+    Exports the .pt weights for backend, unless an up to date export is already cached. Returns the path of the export.
+
+    The export is done in a temporary folder next to the weights and then moved into place, so a process that loads the model at the same time
+    never sees a half written file. Extra keyword arguments go to YOLO.export.
+    '''
+    _check_backend(backend)
+    if backend == 'torch':
+        return weights_path
+
+    artifact = artifact_path(weights_path, backend, variant)
+    with _export_lock:
+        if _is_fresh(artifact, weights_path):
+            return artifact
+
+        print(f"Exporting {weights_path} to {backend}")
+        work_dir = tempfile.mkdtemp(prefix='.export_', dir=os.path.dirname(os.path.abspath(weights_path)))
+        try:
+            work_weights = os.path.join(work_dir, os.path.basename(weights_path))
+            shutil.copy2(weights_path, work_weights)
+
+            exported = YOLO(work_weights).export(format=backend, imgsz=imgsz, dynamic=True, **export_args)
+
+            if os.path.isdir(artifact):                     # Stale export from older weights
+                shutil.rmtree(artifact)
+            os.replace(str(exported).rstrip(os.sep), artifact)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Exported model saved to {artifact}")
+    return artifact
+
+
+def build_calibration_data(weights_path: str, clips: Optional[List[str]] = None, every: int = 10, max_frames: int = 300) -> str:
+    '''
+    Samples every `every`-th frame of the clips (the bundled input clips by default) into a folder next to the weights, in the dataset layout
+    that ultralytics' INT8 calibration reads. Returns the path to the dataset yaml. The calibration only needs images, so there are no labels.
+    '''
+    clips = clips if clips is not None else sorted(glob.glob(CALIBRATION_CLIPS))
+    if not clips:
+        raise ValueError(f"No calibration clips found at {CALIBRATION_CLIPS}")
+
+    base, _ = os.path.splitext(weights_path)
+    data_dir = os.path.abspath(f"{base}_calibration")
+    images_dir = os.path.join(data_dir, 'images')
+    data_yaml = os.path.join(data_dir, 'data.yaml')
+    if os.path.exists(data_yaml):
+        return data_yaml
+
+    os.makedirs(images_dir, exist_ok=True)
+    per_clip = max(1, max_frames // len(clips))
+    for clip in clips:
+        name = os.path.splitext(os.path.basename(clip))[0]
+        for i, (frame_number, _, frame) in enumerate(FrameSource(clip, stride=every).frames()):
+            if i == per_clip:
+                break
+            cv2.imwrite(os.path.join(images_dir, f"{name}_{frame_number:05d}.jpg"), frame)
+
+    names = YOLO(weights_path).names
+    with open(data_yaml, 'w') as fp:
+        yaml.safe_dump({'path': data_dir, 'train': 'images', 'val': 'images', 'names': dict(names)}, fp)
+
+    return data_yaml
+
+
+def export_int8(weights_path: str, backend: str, imgsz: int = 640, clips: Optional[List[str]] = None) -> str:
+    '''INT8 export of weights_path for backend (onnx or openvino), calibrated on frames of the clips. Returns the path of the export.'''
+    if backend == 'torch':
+        raise ValueError("INT8 models need the onnx or openvino backend, set DUXMLB_INFERENCE_BACKEND")
+    _check_backend(backend)
+
+    artifact = artifact_path(weights_path, backend, '_int8')
+    if _is_fresh(artifact, weights_path):
+        return artifact
+
+    # Newer ultralytics versions replaced int8=True with quantize=8
+    int8_args = {'quantize': 8} if 'quantize' in DEFAULT_CFG_DICT else {'int8': True}
+    data = build_calibration_data(weights_path, clips)
+    return export_weights(weights_path, backend, imgsz, variant='_int8', data=data, **int8_args)
+
+
+def resolve_weights(weights_path: str, backend: Optional[str] = None, int8: bool = False) -> str:
+    '''Path to hand to YOLO() for the given backend (INFERENCE_BACKEND by default), exporting the weights first if needed.'''
+    backend = backend or INFERENCE_BACKEND
+    if int8:
+        return export_int8(weights_path, backend)
+    return export_weights(weights_path, backend)
+
+
+def load_detector(weights_path: str, backend: Optional[str] = None, int8: bool = False) -> YOLO:
+    '''YOLO detector for weights_path running on the given backend (INFERENCE_BACKEND by default), quantized to INT8 if int8 is set.'''
+    # Exported models don't carry the task with them in every ultralytics version, so always say it
+    return YOLO(resolve_weights(weights_path, backend, int8), task='detect')
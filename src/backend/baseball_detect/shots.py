@@ -0,0 +1,199 @@
+"""
+Shot boundaries and camera views for broadcast videos.
+
+Highlight reels keep cutting between the center field pitching view, the dugout, replays, close ups and the crowd. The scale factor and beta in
+calculate_speed_ball only make sense for the center field view (see test/camera_angle/README.md), and the ball model finds nothing useful in the
+other shots anyway. So the video is first split into shots and only the shots with the pitching view go to the locator and the ball tracker.
+
+Shot boundaries
+    Every frame is downscaled and a hue-saturation histogram is computed. A cut is when the Bhattacharyya distance between the histograms of two
+    consecutive frames goes above cut_threshold (same shot -> small distance even with motion, new camera -> large distance).
+
+View classifier
+    1. Shots shorter than min_shot_frames can't contain a pitch, they are labelled 'short'.
+    2. The center field view is mostly grass, so the fraction of green pixels has to be inside green_range. Crowd, dugout and close up shots
+       fail here. These shots are labelled 'other'.
+    3. If a phc_detector is given, a few probe frames of the shot are run through it (one inference each, at a low resolution). The shot is
+       'pitching' as soon as the pitcher and the catcher are both found in a probe, and 'field' if they never are (outfield, infield plays).
+       Without a phc_detector every shot that passed 2 is 'pitching'.
+
+ShotSegmenter is a frame consumer (see frame_source.py), find_pitching_segments() runs it over a video on its own. For long videos it should
+only run inside the windows of the coarse scan (coarse_scan.py), a histogram for every frame of a 20 minute video is what the coarse scan is
+there to avoid.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from baseball_detect.frame_source import FrameSource
+
+# Same class IDs as PitcherCatcherLocator, 1-pitcher and 2-catcher
+PITCHER_CLASS_ID = 1
+CATCHER_CLASS_ID = 2
+
+
+@dataclass
+class Segment:
+    start: int                  # First frame of the shot
+    end: int                    # Last frame of the shot (inclusive)
+    label: str                  # 'pitching', 'field', 'other' or 'short'
+    green_fraction: float       # Average fraction of grass pixels over the shot
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+
+class ShotSegmenter:
+    """
+    Frame consumer that splits a video into shots and labels each one with its camera view.
+
+    Attributes:
+        phc_model: Optional phc_detector YOLO model that confirms the pitching view.
+        cut_threshold (float): Bhattacharyya distance between consecutive frames above which there is a cut.
+        min_shot_frames (int): Shots shorter than this are labelled 'short' (15 frames is half a second at 30 FPS).
+        green_range (Tuple[float, float]): Allowed fraction of grass pixels for the pitching view.
+        probe_offsets (Tuple[int, ...]): Frames (counted from the start of the shot) that are run through the phc_model.
+        imgsz (int): Inference size for the probes.
+        width (int): Frames are downscaled to this width before computing anything.
+    """
+
+    def __init__(
+        self,
+        phc_model=None,
+        cut_threshold: float = 0.5,
+        min_shot_frames: int = 15,
+        green_range: Tuple[float, float] = (0.15, 0.9),
+        probe_offsets: Tuple[int, ...] = (5, 20, 45),
+        imgsz: int = 320,
+        min_confidence: float = 0.25,
+        width: int = 160
+    ):
+        self.phc_model = phc_model
+        self.cut_threshold = cut_threshold
+        self.min_shot_frames = min_shot_frames
+        self.green_range = green_range
+        self.probe_offsets = probe_offsets
+        self.imgsz = imgsz
+        self.min_confidence = min_confidence
+        self.width = width
+
+    def start(self, fps: float, frame_count: int) -> None:
+        self.segments: List[Segment] = []
+        self.previous_hist: Optional[np.ndarray] = None
+        self.last_frame = -1
+        self.probes = 0
+        self._open_shot(0)
+
+    def _open_shot(self, frame_number: int) -> None:
+        self.shot_start = frame_number
+        self.shot_green: List[float] = []
+        self.shot_confirmed = False
+
+    def _close_shot(self, end: int) -> None:
+        if end < self.shot_start:
+            return
+
+        green = float(np.mean(self.shot_green)) if self.shot_green else 0.0
+        if end - self.shot_start + 1 < self.min_shot_frames:
+            label = 'short'
+        elif not self.green_range[0] <= green <= self.green_range[1]:
+            label = 'other'
+        elif self.phc_model is None or self.shot_confirmed:
+            label = 'pitching'
+        else:
+            label = 'field'
+
+        self.segments.append(Segment(self.shot_start, end, label, green))
+
+    def _features(self, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(round(height * self.width / float(width))))), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+        cv2.normalize(hist, hist, 1.0, 0.0, cv2.NORM_L1)
+
+        # Grass: green hue that is saturated and bright enough (OpenCV hues go from 0 to 180)
+        grass = cv2.inRange(hsv, (35, 50, 40), (85, 255, 255))
+        return hist, float(np.count_nonzero(grass)) / grass.size
+
+    def _probe(self, frame: np.ndarray) -> bool:
+        self.probes += 1
+        r = self.phc_model.predict(frame, imgsz=self.imgsz, conf=self.min_confidence, verbose=False)[0]
+        class_ids = set(int(c) for c in r.boxes.cls.cpu().numpy())
+        return PITCHER_CLASS_ID in class_ids and CATCHER_CLASS_ID in class_ids
+
+    def process_frame(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
+        hist, green = self._features(frame)
+
+        # With windows the first frame isn't frame 0
+        if self.previous_hist is None:
+            self._open_shot(frame_number)
+
+        # A jump in frame numbers (the video was read with windows) is treated like a cut
+        is_cut = self.previous_hist is not None and (
+            frame_number != self.last_frame + 1 or
+            cv2.compareHist(self.previous_hist, hist, cv2.HISTCMP_BHATTACHARYYA) > self.cut_threshold
+        )
+        if is_cut:
+            self._close_shot(self.last_frame)
+            self._open_shot(frame_number)
+
+        self.previous_hist = hist
+        self.last_frame = frame_number
+        self.shot_green.append(green)
+
+        # Only spend an inference on shots that look like the field so far
+        offset = frame_number - self.shot_start
+        if (self.phc_model is not None and not self.shot_confirmed and offset in self.probe_offsets
+                and self.green_range[0] <= np.mean(self.shot_green) <= self.green_range[1]):
+            self.shot_confirmed = self._probe(frame)
+
+    def finish(self) -> List[Segment]:
+        self._close_shot(self.last_frame)
+        return self.segments
+
+
+def pitching_windows(segments: List[Segment]) -> List[Tuple[int, int]]:
+    '''(start, end) frame windows of the shots with the pitching view, in the format FrameSource(windows=...) takes.'''
+    return [(segment.start, segment.end) for segment in segments if segment.label == 'pitching']
+
+
+def intersect_windows(a: List[Tuple[int, int]], b: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    '''Frames that are inside a window of both lists, as (start, end) windows (both inclusive).'''
+    result = []
+    i = j = 0
+    a, b = sorted(a), sorted(b)
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start <= end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def find_pitching_segments(video_path, phc_model=None, windows: Optional[List[Tuple[int, int]]] = None, **kwargs) -> List[Segment]:
+    '''
+    Splits the video into labelled shots. The keyword arguments are passed on to ShotSegmenter.
+
+    With windows (the result of find_pitch_windows()) only the frames inside them are read, every window starts a new shot and the frames
+    outside of them aren't part of any segment. Use pitching_windows() on the result to get the windows for the dense pass.
+    '''
+    segmenter = ShotSegmenter(phc_model, **kwargs)
+    FrameSource(video_path, windows=windows).broadcast([segmenter])
+    segments = segmenter.finish()
+
+    pitching_frames = sum(segment.length for segment in segments if segment.label == 'pitching')
+    total_frames = sum(segment.length for segment in segments)
+    print(f"Found {len(segments)} shots, {sum(segment.label == 'pitching' for segment in segments)} with the pitching view "
+          f"({pitching_frames} of {total_frames} frames, {segmenter.probes} phc probes)")
+
+    return segments
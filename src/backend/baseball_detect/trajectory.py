@@ -0,0 +1,104 @@
+"""
+Trajectory fit for the ball sequences, a speed estimate that uses where the ball actually was.
+
+The min / max speeds of a sequence are (60 to 61 ft) / its duration, which assumes that the sequence covers exactly the whole pitch, and the
+displacements it computes were never used. Here the positions of the ball themselves are used. They are calibrated to feet with the scale factor from the pitcher and
+catcher (pixels per foot), and a curve is fitted to each sequence:
+
+    p(t) = p0 + v0 * (1 - exp(-k t)) / k + a * t^2 / 2          (for x and y, t from the first detection of the sequence)
+
+- v0 is the velocity at the first detection, its length is reported as the release speed.
+- k is the drag. Air drag slows a baseball by dv/dt = -c v^2 (c = rho * Cd * A / 2m = DRAG_COEFFICIENT per foot), around the speed of the
+  sequence that is the exponential decay above with k = c * |v|. k is fixed from a first fit without drag and the fit is done again.
+- a is a constant acceleration, gravity in y (about 32 ft/s^2 if the camera is level) plus what the perspective adds.
+
+For a given k the curve is linear in (p0, v0, a), so every sequence is an ordinary least squares problem with a 3x3 normal matrix. All the
+sequences are solved together: the normal equations are accumulated for all detections at once (np.add.reduceat over the sequences) and
+solved as one stack of 3x3 systems, which takes milliseconds for hundreds of sequences. The RMS residual of each fit (in feet and pixels) is
+reported next to the speed, a large residual means the sequence isn't a clean ball flight.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# rho * Cd * A / (2 m) for a baseball (air at sea level, Cd 0.35, 2.9 in diameter, 5.125 oz), per foot
+DRAG_COEFFICIENT = 0.5 * 0.0023769 * 0.35 * np.pi * (2.9 / 24)**2 / (0.3203 / 32.174)
+
+FT_PER_SEC_TO_MPH = 0.681818
+
+
+def _basis(t: np.ndarray, k: np.ndarray) -> np.ndarray:
+    '''(N, 3) values of 1, (1 - exp(-k t)) / k and t^2 / 2, k per row (k = 0 is the no drag limit t).'''
+    small = k < 1e-9
+    safe_k = np.where(small, 1.0, k)
+    drag = np.where(small, t, -np.expm1(-safe_k * t) / safe_k)
+    return np.stack([np.ones_like(t), drag, t * t / 2], axis=1)
+
+
+def _solve(basis: np.ndarray, positions: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    '''Least squares coefficients (S, 3, 2) of every sequence, from the normal equations summed per sequence.'''
+    normal = np.add.reduceat(basis[:, :, None] * basis[:, None, :], starts, axis=0)            # (S, 3, 3)
+    moments = np.add.reduceat(basis[:, :, None] * positions[:, None, :], starts, axis=0)      # (S, 3, 2)
+    # pinv instead of solve, a sequence that is too short or doesn't move would make its matrix singular
+    return np.linalg.pinv(normal) @ moments
+
+
+def fit_trajectories(
+    timestamps: np.ndarray,
+    centers: np.ndarray,
+    ranges: List[Tuple[int, int]],
+    scale_factor: float,
+    drag: bool = True
+) -> Dict[str, np.ndarray]:
+    '''
+    Fits the trajectory of every sequence at once.
+
+    Args:
+        timestamps (np.ndarray): (N,) seconds, of all the detections.
+        centers (np.ndarray): (N, 2) ball centers in pixels.
+        ranges (List[Tuple[int, int]]): (start, end) rows of each sequence, end exclusive and not overlapping (split_sequences()).
+        scale_factor (float): Pixels per foot.
+        drag (bool): Fit with air drag (two passes) or without it.
+
+    Returns:
+        One array per value, one entry per sequence: release speed (ft/s and mph), release velocity and acceleration (ft/s, ft/s^2), the
+        drag constant k (1/s) and the RMS residual in feet and pixels.
+    '''
+    if not ranges:
+        return {}
+
+    bounds = np.asarray(ranges)
+    lengths = bounds[:, 1] - bounds[:, 0]
+    sequence = np.repeat(np.arange(len(ranges)), lengths)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    rows = bounds[sequence, 0] + np.arange(len(sequence)) - starts[sequence]
+
+    t = timestamps[rows] - timestamps[bounds[sequence, 0]]
+    positions = centers[rows] / scale_factor                       # feet
+
+    k = np.zeros(len(ranges))
+    coefficients = _solve(_basis(t, k[sequence]), positions, starts)
+    if drag:
+        k = DRAG_COEFFICIENT * np.hypot(coefficients[:, 1, 0], coefficients[:, 1, 1])
+        coefficients = _solve(_basis(t, k[sequence]), positions, starts)
+
+    fitted = np.einsum('nb,nbc->nc', _basis(t, k[sequence]), coefficients[sequence])
+    squared = np.sum((fitted - positions)**2, axis=1)
+    rms_ft = np.sqrt(np.add.reduceat(squared, starts) / lengths)
+
+    velocity = coefficients[:, 1]
+    acceleration = coefficients[:, 2]
+    speed = np.hypot(velocity[:, 0], velocity[:, 1])
+
+    return {
+        "release_speed_ft_per_sec": speed,
+        "release_speed_mph": speed * FT_PER_SEC_TO_MPH,
+        "release_velocity_x_ft_per_sec": velocity[:, 0],
+        "release_velocity_y_ft_per_sec": velocity[:, 1],
+        "acceleration_x_ft_per_sec2": acceleration[:, 0],
+        "acceleration_y_ft_per_sec2": acceleration[:, 1],
+        "drag_per_sec": k,
+        "fit_rms_residual_ft": rms_ft,
+        "fit_rms_residual_px": rms_ft * scale_factor,
+    }
@@ -0,0 +1,334 @@
+"""
+Richardson-Lucy deconvolution engine for DeblurProcessor (tracking_bats.py).
+
+DeblurProcessor.deblur_frame used to build the PSF again with a python double loop for every frame, split the frame into its channels and run
+the iterations on each of them with two cv2.filter2D calls on a float64 estimate. Deblurring is what makes bat tracking the slowest endpoint,
+so this does the same iterations
+
+    estimate <- estimate * correlate(image / correlate(estimate, psf), flip(psf))       (filter2D is a correlation, not a convolution)
+
+with:
+
+- the PSF and its spectrum computed once per frame size and reused (with the 1 / N of the inverse DFT in it). The second correlation
+  multiplies with the complex conjugate of the same spectrum (conjB of cv2.mulSpectrums), which is the spectrum of the flipped PSF,
+- all the channels of a frame as one (C, H, W) float32 stack. For the DFT the channels are stacked on top of each other in one tall padded
+  array, so every correlation is a single cv2.dft / cv2.mulSpectrums / cv2.idft for the whole frame,
+- the correlations done in the frequency domain instead of filter2D's spatial 15x15 kernel,
+- the padded DFT input, the spectrum, the DFT output and the ratio preallocated once per frame size (per thread, the deblur stage of the
+  pipeline runs several) and passed to OpenCV as dst.
+
+filter2D extends the image with BORDER_REFLECT_101. Every correlation here copies its input into the padded array with the same reflected
+border (as wide as the PSF radius) around each channel, and crops the result back. A pixel of the frame only sees the border of its own
+channel, and whatever wraps around the DFT ends up in the borders that are cropped. So the output matches the filter2D implementation up to
+float32 rounding, see test/benchmarks/benchmark_deblur.py.
+
+RichardsonLucyTorch is the torch version (backend 'torch'), promoted from test/bat_tracking_and_exit_velocity/richardson_lucy.py. It
+deblurs a whole batch of frames as one (N, C, H, W) tensor on the CPU, so torch's intra-op threads work on all of them at once. Its
+correlations use torch.fft against a cached PSF spectrum as well, because a 15x15 depthwise conv2d like the test script's is several times
+slower on the CPU. Unlike the test script every channel is deblurred on its own (psf.repeat(1, 3, 1, 1) without groups sums the channels)
+and the border and the eps are the ones of filter2D, so it gives the same frames as the other backends.
+
+It is not a speedup though. On the CPU benchmark_deblur.py measures it at 0.56x to 0.66x the speed of the filter2D implementation (30
+iterations, batches of 4, one core), the float32 FFT engine is at least as fast as OpenCV and stays the default. It is kept for machines with
+many cores and for a later move to the GPU, measure it there before switching to it.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+if TYPE_CHECKING:                   # torch is only imported when the 'torch' backend is used
+    import torch
+
+EPS = np.finfo(float).eps           # What the filter2D implementation replaces zeros of the blurred estimate with
+
+# torch.set_num_threads is process wide, so the torch engines share one count of the deconvolutions that run with their own threads
+_torch_threads_lock = threading.Lock()
+_torch_threads_users = 0
+_torch_threads_previous = 0
+
+
+def reflect_101_into(buffer: np.ndarray, array: np.ndarray, pad_y: int, pad_x: int) -> None:
+    '''Writes (C, H, W) array into (C, H + 2 pad_y, W + 2 pad_x) buffer with a BORDER_REFLECT_101 border.'''
+    _, height, width = array.shape
+    buffer[:, pad_y:pad_y + height, pad_x:pad_x + width] = array
+    if pad_y:
+        buffer[:, :pad_y, pad_x:pad_x + width] = array[:, pad_y:0:-1]
+        buffer[:, pad_y + height:, pad_x:pad_x + width] = array[:, height - 2:height - 2 - pad_y:-1]
+    if pad_x:
+        # Rows are done already, so copying columns of the buffer fills the corners too
+        buffer[:, :, :pad_x] = buffer[:, :, 2 * pad_x:pad_x:-1]
+        buffer[:, :, pad_x + width:] = buffer[:, :, pad_x + width - 2:width - 2:-1]
+
+
+class _Buffers:
+    '''Everything one thread needs to deblur (C, H, W) frames, allocated once.'''
+
+    def __init__(self, shape: Tuple[int, int, int], radius: Tuple[int, int]):
+        channels, height, width = shape
+        self.shape = shape
+        self.block = (height + 2 * radius[0], width + 2 * radius[1])
+        self.rows = channels * self.block[0]
+        dft_shape = (cv2.getOptimalDFTSize(self.rows), cv2.getOptimalDFTSize(self.block[1]))
+
+        # Zeros past the padded channels, the DFT is bigger than them
+        self.padded = np.zeros(dft_shape, dtype=np.float32)
+        self.spectrum = np.empty(dft_shape, dtype=np.float32)          # CCS packed, like cv2.dft gives it
+        self.product = np.empty(dft_shape, dtype=np.float32)
+        self.output = np.empty(dft_shape, dtype=np.float32)
+        self.ratio = np.empty(shape, dtype=np.float32)
+
+        # The channels as (C, H + 2 ry, W + 2 rx) views of the padded input and of the output
+        self.padded_channels = self.padded[:self.rows, :self.block[1]].reshape(channels, *self.block)
+        self.output_channels = self.output[:self.rows, :self.block[1]].reshape(channels, *self.block)
+
+
+class RichardsonLucyFFT:
+    """
+    Richardson-Lucy deconvolution of whole (H, W, C) frames with FFT correlations (cv2.dft) in float32.
+
+    Attributes:
+        psf (np.ndarray): Point spread function, odd sized.
+        num_iterations (int): Richardson-Lucy iterations.
+    """
+
+    def __init__(self, psf: np.ndarray, num_iterations: int = 30):
+        if psf.shape[0] % 2 == 0 or psf.shape[1] % 2 == 0:
+            raise ValueError(f"The PSF needs an odd size, got {psf.shape}")
+        self.psf = np.asarray(psf, dtype=np.float32)
+        self.num_iterations = num_iterations
+        self.radius = (self.psf.shape[0] // 2, self.psf.shape[1] // 2)
+
+        self._spectra: Dict[Tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _psf_spectrum(self, dft_shape: Tuple[int, int]) -> np.ndarray:
+        '''Spectrum that makes a product of spectra the same as filter2D(x, -1, psf), cached per DFT size.'''
+        spectrum = self._spectra.get(dft_shape)
+        if spectrum is None:
+            # A correlation with the psf is a convolution with the flipped psf, centered on (0, 0) of the periodic DFT grid
+            embedded = np.zeros(dft_shape, dtype=np.float32)
+            embedded[:self.psf.shape[0], :self.psf.shape[1]] = self.psf[::-1, ::-1]
+            embedded = np.roll(embedded, (-self.radius[0], -self.radius[1]), axis=(0, 1))
+            # The 1 / N of the inverse DFT is folded in, so cv2.idft doesn't need DFT_SCALE (one pass less over the frame)
+            spectrum = cv2.dft(embedded) / np.float32(embedded.size)
+            with self._lock:
+                self._spectra[dft_shape] = spectrum
+        return spectrum
+
+    def _buffers(self, shape: Tuple[int, int, int]) -> _Buffers:
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None or buffers.shape != shape:
+            buffers = self._local.buffers = _Buffers(shape, self.radius)
+        return buffers
+
+    def _correlate(self, array: np.ndarray, buffers: _Buffers, spectrum: np.ndarray, flipped: bool) -> np.ndarray:
+        '''filter2D(array, -1, psf) of every channel (with the flipped psf if flipped), as a view of the output buffer.'''
+        _, height, width = array.shape
+        reflect_101_into(buffers.padded_channels, array, *self.radius)
+
+        cv2.dft(buffers.padded, buffers.spectrum, nonzeroRows=buffers.rows)
+        cv2.mulSpectrums(buffers.spectrum, spectrum, 0, buffers.product, conjB=flipped)
+        cv2.idft(buffers.product, buffers.output, flags=cv2.DFT_REAL_OUTPUT)
+
+        return buffers.output_channels[:, self.radius[0]:self.radius[0] + height, self.radius[1]:self.radius[1] + width]
+
+    def deconvolve(self, image: np.ndarray, iterations: Optional[int] = None) -> np.ndarray:
+        '''
+        Runs the iterations (num_iterations unless given) on a (C, H, W) float32 image (0 to 1) and returns the (C, H, W) float32 estimate,
+        not normalized.
+        '''
+        image = np.ascontiguousarray(image, dtype=np.float32)
+        buffers = self._buffers(image.shape)
+        spectrum = self._psf_spectrum(buffers.padded.shape)
+        ratio = buffers.ratio
+
+        estimate = np.full(image.shape, 0.5, dtype=np.float32)
+        for _ in range(self.num_iterations if iterations is None else iterations):
+            blurred = self._correlate(estimate, buffers, spectrum, flipped=False)
+            # filter2D gives exact zeros where the DFT leaves rounding noise (maybe negative), so everything under eps is clamped
+            np.maximum(blurred, EPS, out=ratio)
+            np.divide(image, ratio, out=ratio)
+            estimate *= self._correlate(ratio, buffers, spectrum, flipped=True)
+        return estimate
+
+    def deblur_frame(self, frame: np.ndarray, iterations: Optional[int] = None) -> np.ndarray:
+        '''Deblurs a (H, W, C) uint8 frame, every channel stretched to 0 to 255 like cv2.normalize(NORM_MINMAX) did.'''
+        image = np.ascontiguousarray(np.moveaxis(frame, -1, 0), dtype=np.float32)
+        image /= 255.0
+        estimate = self.deconvolve(image, iterations)
+
+        low = estimate.min(axis=(1, 2), keepdims=True)
+        span = estimate.max(axis=(1, 2), keepdims=True) - low
+        estimate -= low
+        np.divide(estimate, span, out=estimate, where=span > 0)
+        estimate[np.broadcast_to(span == 0, estimate.shape)] = 0
+
+        return np.moveaxis((estimate * 255).clip(0, 255).astype(np.uint8), 0, -1).copy()
+
+    def deblur_frames(self, frames: List[np.ndarray], iterations: Optional[int] = None) -> List[np.ndarray]:
+        return [self.deblur_frame(frame, iterations) for frame in frames]
+
+
+class RichardsonLucyTorch:
+    """
+    Richardson-Lucy deconvolution of batches of (H, W, C) frames as one (N, C, H, W) float32 tensor, with torch.fft correlations.
+
+    Attributes:
+        psf (np.ndarray): Point spread function, odd sized.
+        num_iterations (int): Richardson-Lucy iterations.
+        threads (Optional[int]): torch intra-op threads while deconvolve runs, None leaves the process' setting alone. torch.set_num_threads
+                                 is process wide, so other torch work (the YOLO models) running at the same time uses them too. The previous
+                                 value is restored when the last deconvolution that set it is done.
+    """
+
+    def __init__(self, psf: np.ndarray, num_iterations: int = 30, threads: Optional[int] = None):
+        import torch
+
+        if psf.shape[0] % 2 == 0 or psf.shape[1] % 2 == 0:
+            raise ValueError(f"The PSF needs an odd size, got {psf.shape}")
+        self.psf = np.asarray(psf, dtype=np.float32)
+        self.num_iterations = num_iterations
+        self.radius = (self.psf.shape[0] // 2, self.psf.shape[1] // 2)
+        self.threads = threads
+
+        self._spectra: Dict[Tuple[int, int], 'torch.Tensor'] = {}
+        self._lock = threading.Lock()
+
+    def _psf_spectrum(self, padded_shape: Tuple[int, int]) -> 'torch.Tensor':
+        '''Spectrum that makes a product of spectra the same as filter2D(x, -1, psf), cached per padded frame size.'''
+        import torch
+
+        spectrum = self._spectra.get(padded_shape)
+        if spectrum is None:
+            embedded = torch.zeros(padded_shape)
+            embedded[:self.psf.shape[0], :self.psf.shape[1]] = torch.from_numpy(self.psf[::-1, ::-1].copy())
+            spectrum = torch.fft.rfft2(torch.roll(embedded, (-self.radius[0], -self.radius[1]), dims=(0, 1)))
+            with self._lock:
+                self._spectra[padded_shape] = spectrum
+        return spectrum
+
+    def _correlate(self, batch: 'torch.Tensor', spectrum: 'torch.Tensor') -> 'torch.Tensor':
+        '''filter2D of every frame and channel of the (N, C, H, W) batch, with the flipped psf if spectrum is the conjugate.'''
+        import torch
+        import torch.nn.functional as F
+
+        height, width = batch.shape[-2:]
+        radius_y, radius_x = self.radius
+        # The padded frame is exactly one period of the FFT, what wraps around only lands in the border that is cropped
+        padded = F.pad(batch, (radius_x, radius_x, radius_y, radius_y), mode='reflect')
+        result = torch.fft.irfft2(torch.fft.rfft2(padded) * spectrum, s=padded.shape[-2:])
+        return result[..., radius_y:radius_y + height, radius_x:radius_x + width]
+
+    @contextmanager
+    def _intra_op_threads(self) -> Iterator[None]:
+        '''Sets torch's intra-op threads to self.threads for the duration, and back once no deconvolution needs them anymore.'''
+        global _torch_threads_users, _torch_threads_previous
+        import torch
+
+        if self.threads is None:
+            yield
+            return
+
+        with _torch_threads_lock:
+            if _torch_threads_users == 0:
+                _torch_threads_previous = torch.get_num_threads()
+            _torch_threads_users += 1
+            torch.set_num_threads(self.threads)
+        try:
+            yield
+        finally:
+            with _torch_threads_lock:
+                _torch_threads_users -= 1
+                if _torch_threads_users == 0:
+                    torch.set_num_threads(_torch_threads_previous)
+
+    def deconvolve(self, images: 'torch.Tensor', iterations: Optional[int] = None) -> 'torch.Tensor':
+        '''Runs the iterations (num_iterations unless given) on a (N, C, H, W) float32 tensor (0 to 1) and returns the estimate, not normalized.'''
+        import torch
+
+        with torch.inference_mode(), self._intra_op_threads():
+            spectrum = self._psf_spectrum((images.shape[-2] + 2 * self.radius[0], images.shape[-1] + 2 * self.radius[1]))
+            spectrum_flipped = spectrum.conj()
+
+            estimate = torch.full_like(images, 0.5)
+            for _ in range(self.num_iterations if iterations is None else iterations):
+                ratio = images / self._correlate(estimate, spectrum).clamp_min_(EPS)
+                estimate *= self._correlate(ratio, spectrum_flipped)
+            return estimate
+
+    def deblur_frames(self, frames: List[np.ndarray], iterations: Optional[int] = None) -> List[np.ndarray]:
+        '''Deblurs a list of (H, W, C) uint8 frames of the same size as one batch, every channel stretched to 0 to 255.'''
+        import torch
+
+        if len({frame.shape for frame in frames}) > 1:
+            raise ValueError(f"The frames of a batch need the same shape, got {sorted({frame.shape for frame in frames})}")
+
+        with torch.inference_mode():
+            images = torch.from_numpy(np.stack(frames)).permute(0, 3, 1, 2).float().div_(255.0)
+            estimate = self.deconvolve(images, iterations)
+
+            low = estimate.amin(dim=(2, 3), keepdim=True)
+            span = estimate.amax(dim=(2, 3), keepdim=True) - low
+            estimate = torch.where(span > 0, (estimate - low) / span.clamp_min(EPS), torch.zeros_like(estimate))
+
+            deblurred = (estimate * 255).clamp_(0, 255).to(torch.uint8).permute(0, 2, 3, 1).contiguous().numpy()
+        return list(deblurred)
+
+    def deblur_frame(self, frame: np.ndarray, iterations: Optional[int] = None) -> np.ndarray:
+        return self.deblur_frames([frame], iterations)[0]
+
+
+def laplacian_variance(frame: np.ndarray) -> float:
+    '''Variance of the Laplacian of the grayscale frame. Edges make it large, motion blur smears them out and makes it small.'''
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+class BlurGate:
+    """
+    Decides per frame how many Richardson-Lucy iterations it needs, from how blurred it is.
+
+    Only the frames around the swing are motion blurred, the others are sharp and deblurring them is wasted time. The sharpness is the
+    laplacian_variance() of the frame (of the hitter region when BatTracker has one):
+
+        sharpness >= sharp_threshold                        no deblurring, the frame goes to the bat model as it is
+        sharpness <= blurry_threshold                       max_iterations
+        in between                                          from min_iterations up to max_iterations, the blurrier the more
+
+    The thresholds depend on the camera and the resolution and the defaults haven't been calibrated yet, BatTracker logs every decision
+    (deblur_log) so they can be tuned on real clips. Keep in mind that with the gate the bat model sees raw frames next to deblurred (and
+    min-max stretched) ones. max_iterations should be the deblur_iterations of the tracker.
+
+    Attributes:
+        sharp_threshold (float): Sharpness at and above which a frame is not deblurred.
+        blurry_threshold (float): Sharpness at and below which a frame gets all max_iterations.
+        max_iterations (int): Iterations of the blurriest frames.
+        min_iterations (int): Iterations of a frame that is just below sharp_threshold.
+    """
+
+    def __init__(self, sharp_threshold: float = 300.0, blurry_threshold: float = 100.0, max_iterations: int = 30, min_iterations: int = 5):
+        if blurry_threshold >= sharp_threshold:
+            raise ValueError(f"blurry_threshold ({blurry_threshold}) must be below sharp_threshold ({sharp_threshold})")
+        if not 0 < min_iterations <= max_iterations:
+            raise ValueError(f"Need 0 < min_iterations <= max_iterations, got {min_iterations} and {max_iterations}")
+        self.sharp_threshold = sharp_threshold
+        self.blurry_threshold = blurry_threshold
+        self.max_iterations = max_iterations
+        self.min_iterations = min_iterations
+
+    def iterations(self, sharpness: float) -> int:
+        '''Richardson-Lucy iterations for a frame of this sharpness, 0 means it shouldn't be deblurred at all.'''
+        if sharpness >= self.sharp_threshold:
+            return 0
+        blur = min(1.0, (self.sharp_threshold - sharpness) / (self.sharp_threshold - self.blurry_threshold))
+        return int(round(self.min_iterations + blur * (self.max_iterations - self.min_iterations)))
+
+    def decide(self, frame: np.ndarray) -> Tuple[float, int]:
+        '''(sharpness, iterations) of a frame.'''
+        sharpness = laplacian_variance(frame)
+        return sharpness, self.iterations(sharpness)
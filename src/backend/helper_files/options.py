@@ -9,10 +9,6 @@ Step 5 --> Wrap it around Gemini's response and push it to the user as a statist
 """
 
 import numpy as np
-import pandas as pd
-
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import google.generativeai as genai
 
 import os
 import sys
@@ -26,13 +22,8 @@ from pathlib import Path
 
 load_dotenv(dotenv_path=Path(__file__).parent.parent.parent.parent / '.env')
 
-API_KEY = str(os.getenv("API_KEY")).strip()
-pinecone_api_key = str(os.getenv("pinecone_api_key")).strip()
-
-genai.configure(api_key=API_KEY)
-
-model = genai.GenerativeModel('gemini-pro')
-chat = model.start_chat(history=[])
+# The Gemini chat, the Pinecone client and the encoder are only created when they are first needed, see services.py
+from services import services, gemini_chat, gemini_safety_settings
 
 # ---------------------------------------------------------------------------
 # Extraction model calling and implementation
@@ -43,19 +34,18 @@ from models.extraction import extractor
 # This is the code for loading the trained models, and querying the vectorDB
 # ---------------------------------------------------------------------------
 
-from tensorflow.keras.models import load_model, Model
-import joblib
-from pinecone.grpc import PineconeGRPC as Pinecone
-from pinecone import ServerlessSpec
-
 def load_models():
     '''
         The encoder and the scaler have been trained through the notebook present in the prediction directory
         The datasets used to train these are present inside the datasets directory. These are exactly what were provided by the organisers.
+
+        Don't call this directly, services.get('hit_encoder') loads them once per process (TensorFlow takes seconds to import).
     
         input: None
         return: instances of the encoder and the scaler model.
     '''
+    from tensorflow.keras.models import load_model
+    import joblib
 
     encoder = load_model('../prediction/models/encoder_model.h5')
     scaler = joblib.load('../prediction/models/scaler.joblib')
@@ -63,10 +53,6 @@ def load_models():
     return encoder, scaler
 
 
-global encoder, scaler
-encoder, scaler = load_models()             # Load the encoder and the scaler using the above defined function
-
-
 def process_new_hit(new_hit_data, encoder, scaler):
     """
         This function takes in the players stats and generates embeddings using the trained models
@@ -85,7 +71,7 @@ def process_new_hit(new_hit_data, encoder, scaler):
 def find_similar_hits(embedding, index_name="baseball-hits", top_k=5):
     """Find similar hits in the database"""
 
-    pinecone = Pinecone(api_key=pinecone_api_key)
+    pinecone = services.get('pinecone')
     
     index = pinecone.Index(index_name)
     results = index.query(
@@ -125,12 +111,7 @@ def GPT_response(top_similar_hits, additional_params, user_input):
     
     try:
         output = ''
-        response = chat.send_message(prompt, stream=False, safety_settings={
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE, 
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE
-        })
+        response = gemini_chat('stats').send_message(prompt, stream=False, safety_settings=gemini_safety_settings())
 
         # Sometimes the model acts up...
         if not response:
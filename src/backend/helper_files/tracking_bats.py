@@ -1,12 +1,6 @@
 from ultralytics import YOLO
 
-import requests
-import os
-from tqdm import tqdm
-import zipfile
-import io
 from typing import Optional, Union, List, Tuple, Dict
-import shutil
 import cv2
 
 import numpy as np
@@ -18,37 +12,58 @@ from scipy.interpolate import UnivariateSpline
 import os
 os.environ['QT_QPA_PLATFORM'] = 'xcb'
 
+from baseball_detect.frame_source import FrameSource
+from baseball_detect.pipeline import Pipeline, Stage, batched
+from helper_files.deblur import BlurGate, RichardsonLucyFFT, RichardsonLucyTorch
+
 import matplotlib
 matplotlib.use('Agg')  # Use non-GUI backend
 
 import matplotlib.pyplot as plt
 
 class DeblurProcessor:
-    def __init__(self, num_iterations=30):
+    """
+    Richardson-Lucy deblurring of the frames before the bat detection.
+
+    backend 'fft' runs all the channels at once in float32 with FFT correlations against a cached PSF spectrum (see helper_files/deblur.py),
+    'torch' does the same with torch on whole batches of frames (deblur_frames) using torch's intra-op threads (threads). It is slower than
+    'opencv' on the CPU (about 0.6x in test/benchmarks/benchmark_deblur.py), so it isn't a speedup there,
+    'opencv' is the original cv2.filter2D implementation, channel by channel in float64, kept as the reference.
+    """
+
+    BACKENDS = ('fft', 'torch', 'opencv')
+
+    def __init__(self, num_iterations=30, backend='fft', psf_size=15, threads=None):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown deblur backend {backend!r}, expected one of {self.BACKENDS}")
         self.num_iterations = num_iterations
+        self.backend = backend
+        self.psf = self.estimate_psf(psf_size)           # The same for every frame, so it is built once
+        self.engine = None
+        if backend == 'fft':
+            self.engine = RichardsonLucyFFT(self.psf, num_iterations)
+        elif backend == 'torch':
+            self.engine = RichardsonLucyTorch(self.psf, num_iterations, threads=threads)
         
     def estimate_psf(self, image_size=15):
         """Generate estimated Point Spread Function for deblurring"""
         center = (image_size - 1) / 2
-        psf = np.zeros((image_size, image_size))
+        i, j = np.ogrid[:image_size, :image_size]
         
         # Create a motion blur kernel
-        for i in range(image_size):
-            for j in range(image_size):
-                dist = np.sqrt((i - center) ** 2 + (j - center) ** 2)
-                if dist <= center:
-                    psf[i, j] = 1
+        psf = (np.sqrt((i - center) ** 2 + (j - center) ** 2) <= center).astype(np.float64)
         
         psf /= psf.sum()  # Normalize
         return psf
     
-    def richardson_lucy(self, image: np.ndarray, psf: np.ndarray) -> np.ndarray:
+    def richardson_lucy(self, image: np.ndarray, psf: np.ndarray, iterations: Optional[int] = None) -> np.ndarray:
         """
         Apply Richardson-Lucy deconvolution algorithm
         
         Args:
             image: Input image channel (2D array)
             psf: Point spread function kernel
+            iterations: Number of iterations, num_iterations if not given
             
         Returns:
             Deblurred image channel
@@ -58,7 +73,7 @@ class DeblurProcessor:
         psf_flip = np.flip(np.flip(psf, 0), 1)  # Flipped PSF for convolution
         
         # Richardson-Lucy iterations
-        for _ in range(self.num_iterations):
+        for _ in range(self.num_iterations if iterations is None else iterations):
             # Compute the ratio between the input image and the estimate convolved with the PSF
             conv = cv2.filter2D(estimate, -1, psf)
             conv[conv == 0] = np.finfo(float).eps  # Avoid division by zero
@@ -69,17 +84,19 @@ class DeblurProcessor:
             
         return estimate
     
-    def deblur_frame(self, frame):
-        """Apply Richardson-Lucy deconvolution to a frame"""
+    def deblur_frame(self, frame, iterations=None):
+        """Apply Richardson-Lucy deconvolution to a frame (with num_iterations unless iterations is given)"""
+        if self.engine is not None:
+            return self.engine.deblur_frame(frame, iterations)
+
         # Convert to float32 for processing
         frame_float = frame.astype(np.float32) / 255.0
         
         # Process each channel separately
         deblurred_channels = []
-        psf = self.estimate_psf()
         
         for channel in cv2.split(frame_float):
-            deblurred = self.richardson_lucy(channel, psf)
+            deblurred = self.richardson_lucy(channel, self.psf, iterations)
             deblurred = cv2.normalize(deblurred, None, 0, 1, cv2.NORM_MINMAX)
             deblurred_channels.append(deblurred)
         
@@ -89,59 +106,213 @@ class DeblurProcessor:
         
         return deblurred_frame
 
+    def deblur_frames(self, frames, iterations=None):
+        """Deblurs a list of frames of the same size, the torch backend does all of them as one batch"""
+        if self.engine is not None:
+            return self.engine.deblur_frames(frames, iterations)
+        return [self.deblur_frame(frame, iterations) for frame in frames]
+
+
+# What the hitter class of the phc_detector can be called, its id is looked up in the model's names (see hitter_class_id())
+HITTER_CLASS_NAMES = ('hitter', 'batter')
+
+
+def hitter_class_id(phc_model) -> int:
+    '''Class ID of the hitter in phc_model.names. Raises ValueError if the model has no class with one of the HITTER_CLASS_NAMES.'''
+    names = getattr(phc_model, 'names', None) or {}
+    if isinstance(names, (list, tuple)):
+        names = dict(enumerate(names))
+    for class_id, name in names.items():
+        if str(name).lower() in HITTER_CLASS_NAMES:
+            return int(class_id)
+    raise ValueError(f"The phc_detector has no hitter class (one of {HITTER_CLASS_NAMES}), its classes are {names}")
+
+
+def hitter_crop(
+    box: Tuple[float, float, float, float],
+    frame_shape: Tuple[int, ...],
+    margin: float = 0.5,
+    min_margin: int = 48
+) -> Tuple[int, int, int, int]:
+    """
+    Region of the frame that the bat can be in while the hitter swings.
+
+    Args:
+        box: (x1, y1, x2, y2) box of the hitter.
+        frame_shape: Shape of the frames (height, width, ...).
+        margin: Extra space on every side as a fraction of the longer side of the hitter box. A bat is a bit less than half as long as the
+                hitter is tall and it sweeps around the hands, so this shouldn't be much tighter than 0.5.
+        min_margin: Margin in pixels that is always added, for very small hitters.
+
+    Returns:
+        (x1, y1, x2, y2) integer crop clipped to the frame.
+    """
+    x1, y1, x2, y2 = box
+    frame_height, frame_width = frame_shape[:2]
+    pad = max(min_margin, margin * max(x2 - x1, y2 - y1))
+
+    return (
+        int(max(0, np.floor(x1 - pad))),
+        int(max(0, np.floor(y1 - pad))),
+        int(min(frame_width, np.ceil(x2 + pad))),
+        int(min(frame_height, np.ceil(y2 + pad)))
+    )
+
+
+class HitterLocator:
+    """
+    Frame consumer (see baseball_detect/frame_source.py) that runs the phc_detector on a few keyframes, the first `keyframes` of every
+    keyframe_stride-th frame, and ignores the other frames. finish() returns the hitter_crop() around all the hitter boxes it found, or None
+    if it didn't find the hitter. The hitter hardly moves before the swing, so a few frames from the start of the clip are enough for the
+    whole clip.
+    """
+
+    def __init__(self, phc_model, keyframes: int = 3, keyframe_stride: int = 15, margin: float = 0.5, min_confidence: float = 0.25):
+        self.phc_model = phc_model
+        self.class_id = hitter_class_id(phc_model)
+        self.keyframes = keyframes
+        self.keyframe_stride = keyframe_stride
+        self.margin = margin
+        self.min_confidence = min_confidence
 
-class LoadTools:
-    def __init__(self):
-        self.session = requests.Session()
-        self.chunk_size = 1024
-        self.BDL_MODEL_API = "https://balldatalab.com/api/models/"
-        self.BDL_DATASET_API = "https://balldatalab.com/api/datasets/"
-        self.yolo_model_aliases = {
-            'bat_tracking': '../big_weights/bat_tracking.txt',
-            }
-
-    def _download_files(self, url: str, dest: Union[str, os.PathLike], is_folder: bool = False, is_labeled: bool = False) -> None:
-        response = self.session.get(url, stream=True)
-        if response.status_code == 200:
-            total_size = int(response.headers.get('content-length', 0))
-            progress_bar = tqdm(total=total_size, unit='iB', unit_scale=True, desc=f"Downloading {os.path.basename(dest)}")
-            
-            with open(dest, 'wb') as file:
-                for data in response.iter_content(chunk_size=self.chunk_size):
-                    size = file.write(data)
-                    progress_bar.update(size)
-            
-            progress_bar.close()
-            print(f"Model downloaded to {dest}")
-        else:
-            print(f"Download failed. STATUS: {response.status_code}")
-
-    def _get_url(self, alias: str, txt_path: str, use_bdl_api: bool, api_endpoint: str) -> str:
-        if use_bdl_api:
-            return f"{api_endpoint}{alias}"
-        else:
-            with open(txt_path, 'r') as file:
-                return file.read().strip()
-
-    def load_model(self, model_alias: str, model_type: str = 'YOLO', use_bdl_api: Optional[bool] = True, model_txt_path: Optional[str] = None) -> str:
-        model_txt_path = self.yolo_model_aliases.get(model_alias) if use_bdl_api else model_txt_path
-        
-        if not model_txt_path:
-            raise ValueError(f"Invalid alias: {model_alias}")
-
-        base_dir = os.path.dirname(model_txt_path)
-        base_name = os.path.splitext(os.path.basename(model_txt_path))[0]
-
-        model_weights_path = f"{base_dir}/{base_name}.pt"
-
-        if os.path.exists(model_weights_path):
-            print(f"Model found at {model_weights_path}")
-            return model_weights_path
-
-        url = self._get_url(model_alias, model_txt_path, use_bdl_api, self.BDL_MODEL_API)
-        self._download_files(url, model_weights_path, is_folder=False)
-        
-        return model_weights_path
+    def start(self, fps: float, frame_count: int) -> None:
+        self.boxes: List[np.ndarray] = []
+        self.frame_shape = None
+        self.seen = 0
+
+    @property
+    def done(self) -> bool:
+        return self.seen == self.keyframes
+
+    def process_frame(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
+        if self.done or frame_number % self.keyframe_stride:
+            return
+        self.seen += 1
+        self.frame_shape = frame.shape
+        for r in self.phc_model.predict(frame, verbose=False):
+            result = r.boxes.cpu().numpy()
+            keep = (result.cls.astype(int) == self.class_id) & (result.conf >= self.min_confidence)
+            self.boxes += list(result.xyxy[keep])
+
+    def finish(self) -> Optional[Tuple[int, int, int, int]]:
+        if not self.boxes:
+            return None
+        boxes = np.array(self.boxes)
+        union = (boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+        return hitter_crop(union, self.frame_shape, self.margin)
+
+
+def find_hitter_roi(
+    video_path,
+    phc_model,
+    keyframes: int = 3,
+    keyframe_stride: int = 15,
+    margin: float = 0.5,
+    min_confidence: float = 0.25
+) -> Optional[Tuple[int, int, int, int]]:
+    """HitterLocator on its own, it stops decoding after the last keyframe."""
+    locator = HitterLocator(phc_model, keyframes, keyframe_stride, margin, min_confidence)
+    locator.start(0.0, 0)
+    for frame_number, timestamp, frame in FrameSource(video_path, stride=keyframe_stride).frames():
+        if locator.done:
+            break
+        locator.process_frame(frame_number, timestamp, frame)
+    return locator.finish()
+
+
+class SwingMotion:
+    """
+    Frame consumer that measures how much every frame differs from the one before it in the hitter region, for swing_window().
+
+    Not to be confused with baseball_detect.motion.MotionEnergy, which is the fraction of moving pixels of a whole frame. This is the mean
+    absolute difference in gray levels inside the hitter region, on frames downscaled by `scale`.
+
+    The hitter region comes from `locator` (a HitterLocator in the same broadcast, listed before this one), which only knows it after its
+    last keyframe. Until then the downscaled differences are kept (keyframes * keyframe_stride of them, 31 frames at 57 KB each for 1280x720
+    with the defaults) and reduced once the region is known, after that every difference is reduced as soon as it's taken. Without a
+    locator the whole frame is measured. Only the previous downscaled frame is kept, not the clip.
+    """
+
+    def __init__(self, locator: Optional[HitterLocator] = None, scale: float = 0.25):
+        self.locator = locator
+        self.scale = scale
+
+    def start(self, fps: float, frame_count: int) -> None:
+        self.energy: List[float] = [0.0]           # energy[0] is 0, there is no frame before it
+        self.pending: List[np.ndarray] = []
+        self.previous = None
+        self.located = self.locator is None
+        self.roi = None
+
+    def _measure(self, diff: np.ndarray) -> float:
+        if self.roi is None:
+            return float(diff.mean())
+        x1, y1, x2, y2 = self.roi
+        top, left = int(y1 * self.scale), int(x1 * self.scale)
+        bottom, right = max(top + 1, int(np.ceil(y2 * self.scale))), max(left + 1, int(np.ceil(x2 * self.scale)))
+        return float(diff[top:bottom, left:right].mean())
+
+    def _locate(self) -> None:
+        self.located = True
+        self.roi = self.locator.finish()
+        self.energy += [self._measure(diff) for diff in self.pending]
+        self.pending = []
+
+    def process_frame(self, frame_number: int, timestamp: float, frame: np.ndarray) -> None:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if self.previous is not None:
+            diff = cv2.absdiff(small, self.previous)
+            if self.located:
+                self.energy.append(self._measure(diff))
+            else:
+                self.pending.append(diff)
+        self.previous = small
+
+        if not self.located and self.locator.done:
+            self._locate()
+
+    def finish(self) -> np.ndarray:
+        '''energy[i] is the motion between frame i - 1 and frame i (energy[0] is 0).'''
+        if not self.located:                        # Clip shorter than the keyframes
+            self._locate()
+        return np.array(self.energy if self.previous is not None else [])
+
+
+def swing_window(
+    energy: np.ndarray,
+    fps: float,
+    padding: float = 0.25,
+    threshold: float = 0.2,
+    min_contrast: float = 3.0
+) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) frames of the swing, from the motion energy of the hitter region.
+
+    The swing is the strongest motion of the clip. The window is the run of frames around the peak whose energy is above
+    median + threshold * (peak - median), with `padding` seconds added on both sides (the bat is already moving before the motion gets
+    large, and the splines need a few points on each side). Returns None if the peak isn't at least min_contrast times the median, that
+    is when nothing stands out from the compression noise and the camera shake, the whole clip should be used then.
+    """
+    if len(energy) < 2:
+        return None
+
+    peak = int(np.argmax(energy))
+    baseline = float(np.median(energy))
+    if energy[peak] < min_contrast * max(baseline, 1e-6):
+        return None
+
+    active = energy >= baseline + threshold * (energy[peak] - baseline)
+    start = peak
+    while start > 0 and active[start - 1]:
+        start -= 1
+    end = peak
+    while end < len(energy) - 1 and active[end + 1]:
+        end += 1
+
+    # energy[start] is the motion between start - 1 and start, so the swing starts at start - 1
+    pad = int(np.ceil(padding * fps))
+    return max(0, start - 1 - pad), min(len(energy) - 1, end + pad)
 
 
 @dataclass
@@ -157,11 +328,32 @@ class BatTracker:
         self, 
         model=YOLO, 
         min_confidence = 0.1,                   # To get more detections, we can lower this (cause its unlikely that the model will find something BAT like)
-        deblur_iterations=30
+        deblur_iterations=30,
+        deblur_backend='fft',                   # 'torch' deblurs deblur_batch_size frames at once (slower on the CPU), 'opencv' for the original filter2D implementation
+        phc_model=None,                         # With the phc_detector only the region around the hitter is deblurred, see find_hitter_roi()
+        hitter_margin=0.5,
+        deblur_batch_size=1,
+        deblur_threads=None,                    # torch intra-op threads for the 'torch' backend
+        blur_gate: Optional[BlurGate] = None,   # Deblurs only the blurred frames, with fewer iterations the sharper they are (see deblur.py)
+        find_swing=False,                       # Locate the swing by the motion around the hitter first and only process that part of the clip
+        swing_padding=0.25                      # Seconds kept on both sides of the swing
         ):                                       # Since, we're using splines
+        if deblur_batch_size < 1:
+            raise ValueError(f"deblur_batch_size must be at least 1, got {deblur_batch_size}")
         self.model = model
         self.min_confidence = min_confidence
-        self.deblur_processor = DeblurProcessor(num_iterations=deblur_iterations)
+        self.deblur_processor = DeblurProcessor(num_iterations=deblur_iterations, backend=deblur_backend, threads=deblur_threads)
+        self.deblur_batch_size = deblur_batch_size
+        self.phc_model = phc_model
+        self.hitter_margin = hitter_margin
+        self.roi = None                         # (x1, y1, x2, y2) region that is deblurred and searched, None for the whole frame
+        self.blur_gate = blur_gate
+        if blur_gate is not None and blur_gate.max_iterations != deblur_iterations:
+            print(f"The blur gate deblurs with up to {blur_gate.max_iterations} iterations, not deblur_iterations ({deblur_iterations})")
+        self.deblur_log: List[Dict] = []        # frame_number, sharpness and iterations of every frame, to tune the blur gate on
+        self.find_swing = find_swing
+        self.swing_padding = swing_padding
+        self.swing = None                       # Inclusive (start, end) frames that were processed, None for the whole clip
 
     def _get_box_center(self, box_coords: np.ndarray) -> Tuple[float, float]:
         '''Calculates the center of the bounding box'''
@@ -290,50 +482,159 @@ class BatTracker:
         return np.max(speed)
 
 
-    def process_video(self, video_path: str) -> Dict:
-        cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    def _crop(self, frame: np.ndarray) -> np.ndarray:
+        if self.roi is None:
+            return frame
+        # Deblurring costs the same for every pixel, so only the hitter region is worth it
+        x1, y1, x2, y2 = self.roi
+        return frame[y1:y2, x1:x2]
 
-        all_detections: List[BatDetection] = []
-        frame_number = 0
+    def _deblur_batch(self, batch: List[Tuple[int, float, np.ndarray]]) -> List[Tuple[int, float, np.ndarray, np.ndarray]]:
+        frames = [self._crop(frame) for _, _, frame in batch]
+        if self.blur_gate is None:
+            # Apply deblurring before detection, all the frames of the batch at once
+            deblurred_frames = self.deblur_processor.deblur_frames(frames)
+        else:
+            deblurred_frames = self._deblur_gated([frame_number for frame_number, _, _ in batch], frames)
+        return [(frame_number, timestamp, frame, deblurred) for (frame_number, timestamp, _), frame, deblurred in zip(batch, frames, deblurred_frames)]
 
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:
-                break
-                
-            timestamp = frame_number / fps
-            print(f"This is the timestamp: {timestamp}")
+    def _deblur_gated(self, frame_numbers: List[int], frames: List[np.ndarray]) -> List[np.ndarray]:
+        '''
+        Deblurs every frame with the iterations the blur gate picks for it. Sharp frames are passed on as they are, the others are deblurred
+        together with the frames of the batch that need the same number of iterations.
+        '''
+        decisions = [self.blur_gate.decide(frame) for frame in frames]
+        for frame_number, (sharpness, iterations) in zip(frame_numbers, decisions):
+            print(f"frame {frame_number}: sharpness {sharpness:.1f}, {iterations} deblur iterations")
+            self.deblur_log.append({'frame_number': frame_number, 'sharpness': sharpness, 'iterations': iterations})
+
+        deblurred_frames = list(frames)
+        for iterations in set(iterations for _, iterations in decisions) - {0}:
+            indices = [i for i, (_, n) in enumerate(decisions) if n == iterations]
+            for i, deblurred in zip(indices, self.deblur_processor.deblur_frames([frames[i] for i in indices], iterations)):
+                deblurred_frames[i] = deblurred
+        return deblurred_frames
+
+    def _detect_batch(self, batch: List[Tuple[int, float, np.ndarray, np.ndarray]]) -> List[Tuple]:
+        return [self._detect_item(item) for item in batch]
+
+    def _track_batch(self, batch: List[Tuple]) -> None:
+        for item in batch:
+            self._track_item(item)
+
+    def _detect_item(self, item: Tuple[int, float, np.ndarray, np.ndarray]) -> Tuple:
+        frame_number, timestamp, frame, deblurred_frame = item
+        # Get detections for current frame using deblurred image
+        results = self.model.predict(deblurred_frame, verbose=False)
+        return frame_number, timestamp, frame, deblurred_frame, results
+
+    def _track_item(self, item: Tuple) -> None:
+        '''Bookkeeping for a single frame, this has to be called in frame order'''
+        frame_number, timestamp, frame, deblurred_frame, results = item
+        print(f"This is the timestamp: {timestamp}")
+
+        # Save original and deblurred frames for comparison (optional)
+        if frame_number == (self.swing[0] if self.swing is not None else 0):  # Save first frame as example
+            cv2.imwrite('original_frame.jpg', frame)
+            cv2.imwrite('deblurred_frame.jpg', deblurred_frame)
+
+        print(f"detecting for frame {frame_number}")
+
+        # Boxes found in the hitter region are moved back to full frame coordinates
+        x1, y1 = self.roi[:2] if self.roi is not None else (0, 0)
+        offset = np.array([x1, y1, x1, y1], dtype=np.float32)
+
+        for r in results:
+            for box in r.boxes.cpu().numpy():
+                confidence = float(box.conf)
+                if confidence >= self.min_confidence:
+                    detection = BatDetection(
+                        frame_number=frame_number,
+                        timestamp=timestamp,
+                        box_coords=box.xyxy + offset,
+                        confidence=confidence,
+                        track_id=int(box.id) if box.id is not None else None
+                    )
+                    self.all_detections.append(detection)
+
+    def process_video(self, video_path: str, pipelined: bool = False, deblur_workers: int = 2, queue_size: int = 8) -> Dict:
+        '''
+        Detects the bat in every (deblurred) frame and returns the maximum swing speed in ft/s.
 
-            # Apply deblurring before detection
-            deblurred_frame = self.deblur_processor.deblur_frame(frame)
-            
-            # Save original and deblurred frames for comparison (optional)
-            if frame_number == 0:  # Save first frame as example
-                cv2.imwrite('original_frame.jpg', frame)
-                cv2.imwrite('deblurred_frame.jpg', deblurred_frame)
-            
-            # Get detections for current frame using deblurred image
-            results = self.model.predict(deblurred_frame, verbose=False)
-            print(f"detecting for frame {frame_number}")
-
-            for r in results:
-                for box in r.boxes.cpu().numpy():
-                    confidence = float(box.conf)
-                    if confidence >= self.min_confidence:
-                        detection = BatDetection(
-                            frame_number=frame_number,
-                            timestamp=timestamp,
-                            box_coords=box.xyxy,
-                            confidence=confidence,
-                            track_id=int(box.id) if box.id is not None else None
-                        )
-                        all_detections.append(detection)
-
-            frame_number += 1
-
-        cap.release()
+        With pipelined=True the decode, deblur, detect and track steps run as concurrent stages (see baseball_detect/pipeline.py).
+        Deblurring is by far the slowest step, so it gets deblur_workers threads (cv2 releases the GIL while it convolves). With the 'torch'
+        backend every batch of deblur_batch_size frames is a single tensor that torch's intra-op threads already share, so one worker is
+        usually enough there.
+
+        If the tracker has a phc_model, the hitter is located on a few keyframes first and only the region around the hitter is deblurred and
+        searched for the bat in every frame. Without a hitter on the keyframes the whole frames are used like before.
+
+        With find_swing=True a first pass decodes the clip once for both the hitter keyframes and the motion of every frame (HitterLocator
+        and SwingMotion, downscaled grayscale, no deblurring and no bat model), and only the frames of the swing plus swing_padding seconds
+        are decoded again to be deblurred and searched. The buffers are a few seconds long and the swing takes less than half a second of
+        them. If no swing stands out the whole clip is processed.
+        '''
+        self.all_detections: List[BatDetection] = []
+        self.deblur_log = []
+
+        self.roi = None
+        self.swing = None
+        if self.find_swing:
+            # One decode for the hitter keyframes and the motion, the hitter region is only known at the end of it
+            locator = HitterLocator(self.phc_model, margin=self.hitter_margin) if self.phc_model is not None else None
+            motion = SwingMotion(locator)
+            scan = FrameSource(video_path)
+            scan.broadcast([consumer for consumer in (locator, motion) if consumer is not None])
+            energy = motion.finish()
+            self.roi = motion.roi
+            self.swing = swing_window(energy, scan.fps, padding=self.swing_padding)
+        elif self.phc_model is not None:
+            self.roi = find_hitter_roi(video_path, self.phc_model, margin=self.hitter_margin)
+
+        if self.phc_model is not None:
+            if self.roi is None:
+                print("No hitter found on the keyframes, deblurring the whole frames")
+            else:
+                print(f"Deblurring only the hitter region {self.roi}")
+        if self.find_swing:
+            if self.swing is None:
+                print("No swing stands out from the motion, processing the whole clip")
+            else:
+                print(f"Swing in frames {self.swing[0]} to {self.swing[1]} of {len(energy)}")
+
+        source = FrameSource(video_path, windows=[self.swing] if self.swing is not None else None)
+
+        # The frames go through the stages in batches of deblur_batch_size (one tensor each with the torch backend)
+        batches = batched(source.frames(), self.deblur_batch_size)
+
+        if pipelined:
+            pipeline = Pipeline(
+                source=batches,
+                stages=[
+                    Stage('deblur', self._deblur_batch, workers=deblur_workers),
+                    Stage('detect', self._detect_batch),
+                    Stage('track', self._track_batch, ordered=True)
+                ],
+                queue_size=queue_size
+            )
+            for _ in pipeline.run():
+                pass
+            pipeline.print_report()
+            self.pipeline_stats = pipeline.utilisation()
+        else:
+            for batch in batches:
+                self._track_batch(self._detect_batch(self._deblur_batch(batch)))
+
+        if self.blur_gate is not None:
+            # The deblur workers can finish out of order
+            self.deblur_log.sort(key=lambda entry: entry['frame_number'])
+            deblurred = sum(1 for entry in self.deblur_log if entry['iterations'])
+            iterations = sum(entry['iterations'] for entry in self.deblur_log)
+            print(f"Blur gate: deblurred {deblurred} of {len(self.deblur_log)} frames, {iterations} iterations in total "
+                  f"(instead of {len(self.deblur_log) * self.deblur_processor.num_iterations})")
+
+        fps = source.fps
+        all_detections = self.all_detections
 
         average_correction_factor = self._get_average_correction_factor(all_detections)
         x_spline, y_spline, time_x, time_y = self._calculate_splines(all_detections, fps, average_correction_factor)
@@ -351,6 +652,7 @@ The basic idea is as follows:
 '''
 
 # if __name__ == "__main__":
+#     from baseball_detect.load_tools import LoadTools
 #     SOURCE_VIDEO_PATH = "./input/baseball_2.mp4"
 
 #     load_tools = LoadTools()
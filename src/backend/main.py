@@ -13,16 +13,7 @@ from flask_cors import CORS
 import os
 import sys
 
-# For converting to mp4
-from moviepy.editor import VideoFileClip
-
-# imports for scraping and downloading youtube videos for old classical matches
-from yt_dlp import YoutubeDL
-
-# Selenium imports
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
+# yt_dlp (for downloading the classical matches from youtube) and selenium (for finding them) are imported in the endpoint that uses them
 import time
 
 # Making post requests to the getBuffer method
@@ -33,26 +24,24 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__))) # adding the root di
 
 # Imports for API querying 
 from API_querying.query import call_API, pretty_print, figure_out_code
-from API_querying.query import team_code_mapping, player_code_mapping
+from API_querying.query import team_code_mapping
+
+# The heavy dependencies (Keras encoder, Pinecone, Gemini chats, razzball.csv) are loaded on first use, see services.py
+from services import services
+from warmup import warm_up                  # Warms the models up at boot, behind /ready
 
 # Imports for helpers
 from models.helper_models import check_buffer_needed, is_it_gen_stuff
 from models.helper_models import gen_talk, check_statcast
 
 import numpy as np
-import pandas as pd
-
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import google.generativeai as genai
 
 # --------------------------------------------------------------------------
 # Code for generating baseball speed
 # --------------------------------------------------------------------------
 
-from ultralytics import YOLO
-
-from baseball_detect.flow import LoadTools, BallDetection, BaseballTracker          # This will handle everything
-from baseball_detect.flow import calculate_pitcher_and_catcher
+# The trackers (and with them ultralytics / torch) are imported by the functions below the first time a video comes in
+from baseball_detect.ingest import VideoInput
 # ---------------------------------------------------------------------------
 # Extraction model calling and implementation
 # ---------------------------------------------------------------------------
@@ -62,31 +51,26 @@ from models.extraction import extractor
 # This is the code for loading the trained models, and querying the vectorDB
 # ---------------------------------------------------------------------------
 
-from helper_files.options import GPT_response, load_models, process_new_hit, find_similar_hits, store_similar_hits
+from helper_files.options import GPT_response, process_new_hit, find_similar_hits, store_similar_hits
 
-global encoder, scaler
-encoder, scaler = load_models()             # Load the encoder and the scaler using the above defined function
+# The encoder and the scaler are loaded by the first /user-stat/ request, services.get('hit_encoder')
 
 # ---------------------------------------------------------------------------
-# Import for bat detection and velocity calculation
+# Bat detection and velocity calculation (helper_files/tracking_bats.py) is imported by calculate_speed_bat
 # ---------------------------------------------------------------------------
-from helper_files.tracking_bats import DeblurProcessor, BatTracker
-from helper_files.tracking_bats import BatDetection
 
 # ---------------------------------------------------------------------------
 # Some helping functions
 # ---------------------------------------------------------------------------
 
-def convert_webm_to_mp4(input_path, output_path):
-    clip = VideoFileClip(input_path)
-    clip.write_videofile(output_path, codec="libx264")
-    clip.close()
-
 # For getting the video's link using selenium
 # Note that in the future, this is the most likely part that will get fucked
 
 # MAKE SURE THAT YOU CHECK THESE VALUES BEFORE SUBMISSION, that is, the values of the CSS selectors
 def get_url(user_query):
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.options import Options
 
     chrome_options = Options()
     chrome_options.add_argument("--headless")  # Run in headless mode
@@ -116,39 +100,66 @@ def get_url(user_query):
 #                                           This is the function that can calculate the ball speed for us
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------
 
-def calculate_speed_ball(video_path, min_confidence=0.5, max_displacement=100, min_sequence_length=7, pitch_distance_range=(55,65)):
-    # First load the phc detector and find coordinates for the pitcher and the catcher
-    SOURCE_VIDEO_PATH = video_path
-    
-    # print('here')
-    # print(SOURCE_VIDEO_PATH)
+def calculate_speed_ball(video_path, min_confidence=0.5, max_displacement=100, min_sequence_length=7, pitch_distance_range=(55,65), batch_size=8, use_roi=True, skip_static_frames=True, coarse_to_fine=False, pitching_view_only=False, track_ball=False):
+    # The phc detector (for the pitcher and catcher coordinates) and the ball tracking model are kept warm by the registry
+    from baseball_detect.flow import BaseballTracker, PitcherCatcherLocator, PitchCorridorGate
+    from baseball_detect.coarse_scan import find_pitch_windows
+    from baseball_detect.frame_source import FrameSource
+    from baseball_detect.motion import MotionPrefilter
+    from baseball_detect.registry import model_registry
+    from baseball_detect.shots import find_pitching_segments, intersect_windows, pitching_windows
 
-    coordinates = calculate_pitcher_and_catcher(SOURCE_VIDEO_PATH)                     # Returns coordinates as (x1, y1, x2, y2)
-    # x2, y2 is the pitcher and x1, y1 is the catcher
-    
-    x1, y1, x2, y2 = coordinates
+    SOURCE_VIDEO_PATH = video_path
 
-    scale_factor = float(np.sqrt((x2-x1)**2 + (y2-y1)**2)/(60.5))              # scale factor is pixel distance between those niggas divided by actual distance between the niggas
-    print(f"scale_factor: {scale_factor}")
+    # Both models are borrowed for the whole video, in this order (see baseball_detect/registry.py)
+    with model_registry.borrow('phc_detector') as phc_model, model_registry.borrow('ball_trackingv4') as model:
+        locator = PitcherCatcherLocator(phc_model)
+        tracker = BaseballTracker(
+        model=model,
+        min_confidence=0.3,         # 0.3 confidence works good enough, gives realistic predictions
+        max_displacement=100,       # adjust based on your video resolution
+        min_sequence_length=7,
+        pitch_distance_range=(60, 61),  # feet
+        batch_size=batch_size,      # frames per predict call, see test/benchmarks/benchmark_batched_inference.py
+        # Off until a parity benchmark shows the crop tracking gives the same speeds as searching every full frame. With it, once the ball
+        # is found only a small crop around its predicted position is searched (see baseball_detect/kalman.py)
+        tracking=track_ball
+        )
 
-    beta = float(np.arctan(2*(x1-x2)/(y2-y1)))                              # The math is explained in the readme docs
-    print(f"sin(beta) = {np.sin(beta)}")
+        print('processing video')
+        # Decode the video only once and feed each frame to both the phc detector and the ball tracker.
+        # With use_roi the ball model only sees the pitcher-catcher corridor once the locator has found both of them,
+        # and with skip_static_frames the frames without any motion (in the corridor) never reach the ball model.
+        ball_consumer = PitchCorridorGate(tracker, locator) if use_roi else tracker
+        if skip_static_frames:
+            ball_consumer = MotionPrefilter(ball_consumer, roi_source=tracker)
+        # For long videos (classics) only the parts where the pitcher and the catcher are on screen are decoded densely, see coarse_scan.py
+        # For highlight reels only the shots from the center field camera are used, the calibration is meaningless for the other views (see shots.py)
+        windows = None
+        if coarse_to_fine:
+            windows, _ = find_pitch_windows(SOURCE_VIDEO_PATH, phc_model)
+        if pitching_view_only:
+            # Inside the coarse windows only, so that long videos still aren't read frame by frame outside of the pitches
+            view_windows = pitching_windows(find_pitching_segments(SOURCE_VIDEO_PATH, phc_model, windows=windows))
+            windows = view_windows if windows is None else intersect_windows(windows, view_windows)
+        if windows is not None and not windows:
+            print('No pitching view found, processing every frame')
+            windows = None
+        FrameSource(SOURCE_VIDEO_PATH, windows=windows).broadcast([locator, ball_consumer])
+
+        coordinates = locator.coordinates()                                                # Returns coordinates as (x1, y1, x2, y2)
+        # x2, y2 is the pitcher and x1, y1 is the catcher
+    
+        x1, y1, x2, y2 = coordinates
 
-    load_tools = LoadTools()
-    model_weights = load_tools.load_model(model_alias='ball_trackingv4')
-    model = YOLO(model_weights)
+        scale_factor = float(np.sqrt((x2-x1)**2 + (y2-y1)**2)/(60.5))              # scale factor is pixel distance between those niggas divided by actual distance between the niggas
+        print(f"scale_factor: {scale_factor}")
 
-    tracker = BaseballTracker(
-    model=model,
-    min_confidence=0.3,         # 0.3 confidence works good enough, gives realistic predictions
-    max_displacement=100,       # adjust based on your video resolution
-    min_sequence_length=7,
-    pitch_distance_range=(60, 61)  # feet
-    )
+        beta = float(np.arctan(2*(x1-x2)/(y2-y1)))                              # The math is explained in the readme docs
+        print(f"sin(beta) = {np.sin(beta)}")
 
-    print('processing video')
-    # Process video
-    results = tracker.process_video(video_path, scale_factor) 
+        # Speeds need the scale factor, so they are only calculated once the calibration is done
+        results = ball_consumer.finish(scale_factor)
 
     output = """"""
 
@@ -165,16 +176,20 @@ def calculate_speed_ball(video_path, min_confidence=0.5, max_displacement=100, m
 
         estimated_speed_min = float(speed_est['min_speed_mph'])
         estimated_speed_max = float(speed_est['max_speed_mph'])
+        release_speed = float(speed_est['release_speed_mph'])                   # from the trajectory fit, see baseball_detect/trajectory.py
 
         if beta*180/3.1415926 > 10:                               # if the angle is less than 10 degree, then the calculations become absurd!
             v_real_max = estimated_speed_max * 1/np.sin(beta)                    # This necessarily implies that v_real is more than v_app which is true.
             v_real_min = estimated_speed_min * 1/np.sin(beta)
+            release_speed = release_speed * 1/np.sin(beta)
             output += f"\nEsttimated speed: {v_real_max:.1f}" + f" to {v_real_min:.1f} mph"
 
         else:
             output += f"\nEstimated speed: {estimated_speed_min:.1f}" + f" to {estimated_speed_max:.1f} mph \n"
             print(f'Estimated speed range: {estimated_speed_max, estimated_speed_min}')
 
+        output += f"\nRelease speed from the trajectory fit: {release_speed:.1f} mph (fit residual {speed_est['fit_rms_residual_ft']:.2f} ft)\n"
+
         output += f"This was within the time frame: {speed_est['start_frame'] * 1/results['fps']} to {speed_est['end_frame'] * 1/results['fps']}"
 
     return output
@@ -183,21 +198,29 @@ def calculate_speed_ball(video_path, min_confidence=0.5, max_displacement=100, m
 #                                           This is the function that can calculate the ball speed for us
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------
 
-def calculate_speed_bat(video_path, min_confidence = 0.5, deblur_iterations = 30):
+def calculate_speed_bat(video_path, min_confidence = 0.5, deblur_iterations = 30, hitter_roi = True, blur_gating = False, find_swing = False):
+    from helper_files.tracking_bats import BatTracker
+    from helper_files.deblur import BlurGate
+    from baseball_detect.registry import model_registry
 
     SOURCE_VIDEO_PATH = video_path
 
-    load_tools = LoadTools()
-    model_weights = load_tools.load_model(model_alias='bat_tracking')
-    model = YOLO(model_weights)
-
-    tracker = BatTracker(
-        model = model,
-        min_confidence = 0.2,                       # 0.2 also works good enough
-        deblur_iterations=30
-    )
+    # phc_detector first, the same order as calculate_speed_ball borrows its models in
+    with model_registry.borrow('phc_detector') as phc_model, model_registry.borrow('bat_tracking') as model:
+        tracker = BatTracker(
+            model = model,
+            min_confidence = 0.2,                       # 0.2 also works good enough
+            deblur_iterations=deblur_iterations,
+            phc_model = phc_model if hitter_roi else None,  # only the region around the hitter gets deblurred, see find_hitter_roi()
+            # Off until the thresholds are calibrated on real clips (tracker.deblur_log has every decision). With the gate the bat model gets
+            # a mix of raw and deblurred frames, which it hasn't been checked on yet.
+            blur_gate = BlurGate(max_iterations=deblur_iterations, min_iterations=min(5, deblur_iterations)) if blur_gating else None,
+            # Off until it is checked that the speeds from the swing window match the ones from the whole clip. With it only the frames
+            # around the swing are deblurred and searched, see swing_window()
+            find_swing = find_swing
+        )
 
-    results = tracker.process_video(SOURCE_VIDEO_PATH)
+        results = tracker.process_video(SOURCE_VIDEO_PATH)
 
     return results                  # This will be in ft/s according to the internal definitions of the functions
 
@@ -210,7 +233,7 @@ CORS(app)  # Enable CORS for all routes
 
 
 # Upload configs for classics-video
-UPLOAD_FOLDER = 'uploads/videos'                                    # To save the uploaded videos
+UPLOAD_FOLDER = 'uploads/videos'                                    # Not used for classics-video anymore, uploads are decoded in memory
 ALLOWED_EXTENSIONS = {'mp4', 'mov', 'avi', 'mkv'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
@@ -246,7 +269,7 @@ def process_input():
         '''
         if is_it_gen_stuff(user_input):
             print('Requires APIs')
-            name_code_tuple = figure_out_code(team_code_mapping, player_code_mapping, user_input)
+            name_code_tuple = figure_out_code(team_code_mapping, services.get('player_codes'), user_input)
             output = call_API(name_code_tuple)
             # processed_output = output
             # print(output)
@@ -265,28 +288,24 @@ def process_input():
             json={'action': "getBuffer"}
         )
         if response.status_code == 200:
-            video_data = response.content
-            with open("./input_files/received_video.webm", "wb") as fp:               # Saving this in the input files directory (hopefully this works)
-                fp.write(video_data)
-            # Convert webm to mp4 and save it, cause we need to work with this format only.
-            convert_webm_to_mp4("./input_files/received_video.webm", "./input_files/converted_input.mp4")
-
-            video_path = "./input_files/converted_input.mp4"
-            # -------------------------------------------------------------------------------------------
-            #               Now we need a logic to see if they're asking for speed or what
-            # -------------------------------------------------------------------------------------------
-            what_is_needed = check_statcast(user_input)
-            if 'baseballspeed' in what_is_needed.strip().lower():            # Hopefully it will output exactly as this is...
-
-                # All other parameters are default
-                output = calculate_speed_ball(video_path)
-                return jsonify({"response": output}), 200
-
-            elif 'batswingspeed' in what_is_needed.strip().lower():
-                output = calculate_speed_bat(video_path)
-                return jsonify({"response": output}), 200
-            else:
-                return jsonify({"error": "Failed to get buffer"}), 500
+            # The buffer is decoded straight from memory (see baseball_detect/ingest.py), no more ./input_files that concurrent requests would overwrite.
+            # No more converting to mp4 either, the trackers read the webm directly (see baseball_detect/frame_source.py)
+            with VideoInput(response.content, suffix='.webm') as video:
+                # -------------------------------------------------------------------------------------------
+                #               Now we need a logic to see if they're asking for speed or what
+                # -------------------------------------------------------------------------------------------
+                what_is_needed = check_statcast(user_input)
+                if 'baseballspeed' in what_is_needed.strip().lower():            # Hopefully it will output exactly as this is...
+
+                    # All other parameters are default
+                    output = calculate_speed_ball(video)
+                    return jsonify({"response": output}), 200
+
+                elif 'batswingspeed' in what_is_needed.strip().lower():
+                    output = calculate_speed_bat(video)
+                    return jsonify({"response": output}), 200
+                else:
+                    return jsonify({"error": "Failed to get buffer"}), 500
 
 
 @app.route('/user-stat/', methods=['POST'])
@@ -314,6 +333,7 @@ def user_stat():
 
         '''
 
+        encoder, scaler = services.get('hit_encoder')
         embedding = process_new_hit(extractor_dictionary, encoder, scaler)                           
         
         print("embeddings generated")
@@ -374,18 +394,14 @@ def classics_video_processing():
         if not allowed_file(video_file.filename):
             return jsonify({'error': 'Invalid file type'}), 400
             
-        # Secure the filename and save the file
+        # Secure the filename, it is only echoed back now
         filename = secure_filename(video_file.filename)
         
         print(filename)
 
-        # Ensure upload directory exists and saving it. We'll keep the name as above so that its easy to process
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        video_file.save(file_path)
-        
-        SOURCE_VIDEO_PATH = f'/home/purge/Desktop/MLBxG-extension/src/backend/uploads/videos/{filename}'
-        output = calculate_speed_ball(SOURCE_VIDEO_PATH)
+        # Decode the upload straight from the request instead of saving it into the upload folder and opening it again
+        with VideoInput.from_upload(video_file) as video:
+            output = calculate_speed_ball(video, pitching_view_only=True)                # Highlights, skip the replays, dugout and crowd shots
 
         return jsonify({                                                            # Also need to return uploaded message
             'message': 'Video analysed successfully, now running plan',
@@ -427,6 +443,8 @@ def classics_text_processing():
     custom_url = get_url(user_input)                                                    # based on user's input search youtube and select the first link
     path = '/home/purge/Desktop/MLBxG-extension/src/backend/downloads_classical'                # note that we can later change all these to match the path of the user
 
+    from yt_dlp import YoutubeDL
+
     ydl_opts = {
         'outtmpl': os.path.join(path, '%(title)s.%(ext)s'),
     }
@@ -441,7 +459,7 @@ def classics_text_processing():
     
     SOURCE_VIDEO_PATH = filename
 
-    output = calculate_speed_ball(SOURCE_VIDEO_PATH)
+    output = calculate_speed_ball(SOURCE_VIDEO_PATH, coarse_to_fine=True, pitching_view_only=True)         # These can be hours long, only look closely at the pitches
 
     return jsonify({
         'message': f"This is what we found: \n{output}"
@@ -450,23 +468,35 @@ def classics_text_processing():
 
 @app.route('/load-yolo-model/', methods=['POST'])
 def loading_yolo_models():
-    load_tools = LoadTools()
-    model_weights1 = load_tools.load_model(model_alias='ball_trackingv4')
-    model1 = YOLO(model_weights1)
+    # Loads the weights into the process wide registry and runs a dummy frame through them, so that the next requests find them warm
+    from baseball_detect.registry import model_registry
 
-    model_weights2 = load_tools.load_model(model_alias='phc_detector')
-    model2 = YOLO(model_weights2)
-
-    model_weights3 = load_tools.load_model(model_alias='bat_tracking')
-    model3 = YOLO(model_weights3)
+    for alias in ('ball_trackingv4', 'phc_detector', 'bat_tracking'):
+        model_registry.warm_up(alias)
 
     return jsonify({
-        'message': "loaded deeplearning model"
+        'message': "loaded deeplearning model",
+        'loaded': model_registry.loaded()
         })
 
+
+@app.route('/ready', methods=['GET'])
+def readiness():
+    '''
+    For the load balancer: 503 until the models of this worker are warmed up (see warmup.py), 200 afterwards. Either way the body has the
+    warm-up state and timings of every model.
+    '''
+    warm_up.start()                     # Already running if the worker was started through __main__, this is for the WSGI servers
+
+    status = warm_up.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 if __name__ == "__main__":
     app.waiting_for_buffer = False
     app.buffer_received = False
+    # With debug the reloader runs this twice, only the process that serves the requests (WERKZEUG_RUN_MAIN is set there) warms up
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up.start()
     app.run(host="127.0.0.1", port=5000, debug=True)
 
 # if __name__ == "__main__":
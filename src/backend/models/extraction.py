@@ -1,6 +1,3 @@
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import google.generativeai as genai
-
 import re
 import os
 import sys
@@ -13,11 +10,8 @@ from pathlib import Path
 
 load_dotenv(dotenv_path=Path(__file__).parent.parent.parent.parent / '.env')
 
-API_KEY = str(os.getenv("API_KEY")).strip()
-genai.configure(api_key=API_KEY)
-
-model = genai.GenerativeModel('gemini-pro')
-chat = model.start_chat(history=[])
+# The Gemini chat is started on first use instead of at import, see services.py
+from services import gemini_chat, gemini_safety_settings
 
 def parse_extractor_dict(data):
     pattern = r'(\w+),\s([\d\.]+)'
@@ -45,12 +39,7 @@ def extractor(user_prompt):
 
         print('In the try block of the extractor')
         output = ''
-        response = chat.send_message(prompt, stream=False, safety_settings={
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE, 
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE
-        })
+        response = gemini_chat('extraction').send_message(prompt, stream=False, safety_settings=gemini_safety_settings())
 
         # Sometimes the model acts up...
         if not response:
@@ -1,6 +1,3 @@
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import google.generativeai as genai
-
 import os
 import sys
 
@@ -12,18 +9,8 @@ from pathlib import Path
 
 load_dotenv(dotenv_path=Path(__file__).parent.parent.parent / '.env')
 
-API_KEY = str(os.getenv("API_KEY")).strip()
-
-genai.configure(api_key=API_KEY)
-
-model_ = genai.GenerativeModel('gemini-pro')
-chat_ = model_.start_chat(history=[])
-
-model__ = genai.GenerativeModel('gemini-pro')
-chat__ = model__.start_chat(history=[])
-
-model___ = genai.GenerativeModel('gemini-pro')
-chat___ = model___.start_chat(history=[])
+# The Gemini chats are started on first use instead of at import, see services.py
+from services import gemini_chat, gemini_safety_settings
 
 def check_buffer_needed(user_prompt):
     prompt = str(buffer_needed_prompt[0]) + f"""
@@ -32,12 +19,7 @@ def check_buffer_needed(user_prompt):
 
     try:
         output = ''
-        response = chat_.send_message(prompt, stream=False, safety_settings={
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE, 
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE
-        })
+        response = gemini_chat('buffer_needed').send_message(prompt, stream=False, safety_settings=gemini_safety_settings())
 
         # Sometimes the model acts up...
         if not response:
@@ -65,12 +47,7 @@ def is_it_gen_stuff(user_prompt):
     
     try:
         output = ''
-        response = chat__.send_message(prompt, stream=False, safety_settings={
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE, 
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE
-        })
+        response = gemini_chat('gen_stuff').send_message(prompt, stream=False, safety_settings=gemini_safety_settings())
 
         # Sometimes the model acts up...
         if not response:
@@ -98,12 +75,7 @@ def gen_talk(user_prompt):
 
     try:
         output = ''
-        response = chat___.send_message(prompt, stream=False, safety_settings={
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE, 
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE
-        })
+        response = gemini_chat('talk').send_message(prompt, stream=False, safety_settings=gemini_safety_settings())
 
         # Sometimes the model acts up...
         if not response:
@@ -126,12 +98,7 @@ def check_statcast(user_prompt):
 
     try:
         output = ''
-        response = chat___.send_message(prompt, stream=False, safety_settings={
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE, 
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE
-        })
+        response = gemini_chat('talk').send_message(prompt, stream=False, safety_settings=gemini_safety_settings())
 
         # Sometimes the model acts up...
         if not response:
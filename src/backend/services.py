@@ -0,0 +1,160 @@
+"""
+Lazily built services of the backend.
+
+Importing main.py used to import TensorFlow, ultralytics / torch, selenium, yt_dlp and google.generativeai, load the Keras encoder twice
+(options.py and main.py both called load_models() at import), read razzball.csv and start five Gemini chats before the first request came in,
+even though most requests only need one or two of these. Now each of them is registered here under a name and only built the first time an
+endpoint asks for it:
+
+    services.get('hit_encoder')         (encoder, scaler) for /user-stat/, see helper_files/options.py
+    services.get('pinecone')            Pinecone client for the similar hits query
+    services.get('player_codes')        player name -> MLBAM id, read from API_querying/razzball.csv
+    services.get('genai')               google.generativeai, configured with the API key
+    gemini_chat('buffer_needed')        the Gemini chats, started on first use (see CHATS)
+
+A service is built once per process. If two requests ask for it at the same time, the second one waits for the first one instead of building
+it again. How long each one took to build is kept in services.timings.
+
+Services that are models (the Keras encoder) can also be registered with a warm up function, services.warm_up(name) builds the service and
+runs it once on dummy input, so that its first real call doesn't pay for the graph initialisation. warmup.py does that at boot.
+
+The YOLO models are not in here, they have their own registry (baseball_detect/registry.py). Importing main.py doesn't import it, it is
+imported by the first video endpoint or by the warm-up thread (warmup.py) when it gets to the YOLO models, whichever comes first.
+test/benchmarks/benchmark_import_time.py measures how long importing main.py takes.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Services:
+    """
+    Named services that are built on first use.
+
+    Attributes:
+        timings (Dict[str, float]): Seconds it took to build each service that has been built so far.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self._warm_ups: Dict[str, Callable[[Any], None]] = {}
+        self.timings: Dict[str, float] = {}
+        self.warm_up_timings: Dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], warm_up: Optional[Callable[[Any], None]] = None) -> None:
+        '''
+        Registers factory as the builder of name. It is called (once) by the first get(name).
+
+        warm_up, if given, is called with the built service by warm_up(name) to initialise it with dummy input.
+        '''
+        with self._guard:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            if warm_up is not None:
+                self._warm_ups[name] = warm_up
+
+    def get(self, name: str) -> Any:
+        '''The service called name, built now if this is the first time it is asked for.'''
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+
+        with self._guard:
+            if name not in self._factories:
+                raise KeyError(f"Unknown service: {name}")
+            factory, lock = self._factories[name], self._locks[name]
+
+        with lock:
+            if name not in self._instances:                 # Another request may have built it while we waited
+                start = time.perf_counter()
+                self._instances[name] = factory()
+                self.timings[name] = time.perf_counter() - start
+                print(f"Loaded {name} in {self.timings[name]:.2f}s")
+
+        return self._instances[name]
+
+    def warm_up(self, name: str) -> Dict[str, float]:
+        '''Builds the service called name if needed and runs its warm up function. Returns the timings (in seconds).'''
+        service = self.get(name)
+        warm_up = self._warm_ups.get(name)
+
+        start = time.perf_counter()
+        if warm_up is not None:
+            with self._locks[name]:
+                warm_up(service)
+        self.warm_up_timings[name] = time.perf_counter() - start
+
+        return {'load_seconds': self.timings.get(name, 0.0), 'warm_up_seconds': self.warm_up_timings[name]}
+
+    def loaded(self) -> List[str]:
+        '''Names of the services that have been built.'''
+        return list(self._instances)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
+
+
+def _hit_encoder():
+    from helper_files.options import load_models            # TensorFlow is only imported here
+    return load_models()
+
+
+def _warm_hit_encoder(hit_encoder):
+    import numpy as np
+
+    encoder, scaler = hit_encoder
+    encoder.predict(scaler.transform(np.zeros((1, 3))), verbose=0)         # ExitVelocity, HitDistance, LaunchAngle, like process_new_hit
+
+
+def _pinecone():
+    from pinecone.grpc import PineconeGRPC as Pinecone
+    return Pinecone(api_key=str(os.getenv("pinecone_api_key")).strip())
+
+
+def _player_codes():
+    from API_querying.query import load_player_code_mapping
+    return load_player_code_mapping()
+
+
+def _genai():
+    import google.generativeai as genai
+    genai.configure(api_key=str(os.getenv("API_KEY")).strip())
+    return genai
+
+
+def _chat():
+    return services.get('genai').GenerativeModel('gemini-pro').start_chat(history=[])
+
+
+# The chats keep their history, these are the ones the helpers used to start at import (gen_talk and check_statcast share one)
+CHATS = ('buffer_needed', 'gen_stuff', 'talk', 'extraction', 'stats')
+
+services = Services()
+services.register('hit_encoder', _hit_encoder, warm_up=_warm_hit_encoder)
+services.register('pinecone', _pinecone)
+services.register('player_codes', _player_codes)
+services.register('genai', _genai)
+for _name in CHATS:
+    services.register(f"chat:{_name}", _chat)
+
+
+def gemini_chat(name: str):
+    '''The Gemini chat called name (one of CHATS), started on first use.'''
+    return services.get(f"chat:{name}")
+
+
+def gemini_safety_settings() -> dict:
+    '''The safety settings every Gemini call of the backend uses (everything let through).'''
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+    return {
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE
+    }
@@ -0,0 +1,107 @@
+"""
+Model warm-up at boot, and the state behind the /ready endpoint.
+
+Even with the weights on disk, the first inference of every YOLO model and of the Keras encoder is slow: the graph and the kernels are
+initialised lazily (and the onnx / openvino backends compile the network) on the first predict call. So the first requests a new worker gets
+are the slow ones. Now a worker warms its models up in a background thread when it starts:
+
+    the YOLO models         loaded into the registry and run on dummy frames (ModelRegistry.warm_up in baseball_detect/registry.py)
+    hit_encoder             the Keras encoder and the scaler, run on a dummy hit (services.warm_up in services.py)
+
+GET /ready answers 503 until every model is warm and 200 afterwards, with the state and the timings of each model, so that the load balancer
+can hold traffic back until the worker can meet its latency target. A model that fails to warm up is reported with its error and the
+worker never becomes ready.
+
+DUXMLB_WARMUP picks the models (comma separated, the registry aliases and the service names above), `none` turns the warm-up off and /ready
+is then ready right away.
+"""
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from services import Services, services
+
+if TYPE_CHECKING:
+    from baseball_detect.registry import ModelRegistry
+
+YOLO_MODELS = ('phc_detector', 'ball_trackingv4', 'bat_tracking')
+SERVICE_MODELS = ('hit_encoder',)
+
+
+def _env_models() -> List[str]:
+    value = os.environ.get('DUXMLB_WARMUP')
+    if value is None:
+        return list(YOLO_MODELS + SERVICE_MODELS)
+    if value.strip().lower() == 'none':
+        return []
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class WarmUp:
+    """
+    Warms up a list of models once, in a background thread, and keeps track of how far it got.
+
+    Attributes:
+        models (List[str]): Registry aliases and service names to warm up, in this order.
+        registry (ModelRegistry): Where the YOLO models are warmed up, the shared model_registry unless another one is given.
+    """
+
+    def __init__(self, models: List[str], registry: Optional['ModelRegistry'] = None, services: Services = services):
+        self.models = list(models)
+        self._registry = registry
+        self.services = services
+
+        self._state: Dict[str, Dict] = {name: {'state': 'pending'} for name in self.models}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def registry(self) -> 'ModelRegistry':
+        # Imported on first use, importing main.py shouldn't import the registry (and requests / tqdm through LoadTools)
+        if self._registry is None:
+            from baseball_detect.registry import model_registry
+            self._registry = model_registry
+        return self._registry
+
+    def start(self) -> bool:
+        '''Starts the warm-up in a background thread. Returns False if it was started before.'''
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self.run, name='warm-up', daemon=True)
+        self._thread.start()
+        return True
+
+    def run(self) -> None:
+        '''Warms up every model, one after the other. A model that fails is marked failed and the others still get warmed up.'''
+        for name in self.models:
+            self._state[name] = {'state': 'warming'}
+            start = time.perf_counter()
+            try:
+                if name in self.services:
+                    timings = self.services.warm_up(name)
+                else:
+                    timings = self.registry.warm_up(name)
+            except Exception as e:
+                print(f"Warm-up of {name} failed: {e}")
+                self._state[name] = {'state': 'failed', 'error': str(e), 'seconds': time.perf_counter() - start}
+                continue
+            self._state[name] = {'state': 'warm', 'seconds': time.perf_counter() - start, **timings}
+
+    def ready(self) -> bool:
+        return all(state['state'] == 'warm' for state in self._state.values())
+
+    def status(self) -> Dict:
+        '''
+        What /ready reports: whether the worker is ready, and the state and timings of every model.
+
+        Only this object's own state is reported, so /ready never imports or touches the registry (with the warm-up off it has no models).
+        '''
+        models = {name: {**state, 'loaded': state['state'] == 'warm'} for name, state in self._state.items()}
+        return {'ready': self.ready(), 'started': self._thread is not None, 'models': models}
+
+
+# The warm-up of this worker, main.py starts it at boot
+warm_up = WarmUp(_env_models())
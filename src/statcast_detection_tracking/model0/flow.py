@@ -6,10 +6,16 @@ Working:
 - Stitch them together
 '''
 
+import os
+import sys
+
 import torch
 import cv2
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))    # for the shared pipeline engine
+from baseball_detect.pipeline import Pipeline, Stage
+
 class BaseballDetector:
     def __init__(self, weights_path, ball_class=0, conf_threshold=0.5):
         """
@@ -62,25 +68,22 @@ class BaseballDetector:
         
         return result
 
-    def detect_baseball_in_frame(self, frame):
+    def _detect_stylized(self, stylized_frame):
         """
-        Detect baseball in a single frame.
-        frame: A single frame from the video.
-        Returns the annotated frame and detections.
+        Run detection on an already stylized frame and return the baseball detections.
         """
-        # First, stylize the frame
-        stylized_frame = self.stylize_frame(frame)
-        
-        # Run detection on stylized frame
         results = self.model(stylized_frame)
         detections = results.xyxy[0].cpu().numpy()
         
         # Filter detections for the baseball class
-        baseball_detections = [
+        return [
             det for det in detections if int(det[5]) == self.ball_class
         ]
-        
-        # Draw bounding boxes around detected baseballs on the original frame
+
+    def _annotate(self, frame, baseball_detections):
+        """
+        Draw bounding boxes around detected baseballs on the original frame.
+        """
         for det in baseball_detections:
             x1, y1, x2, y2, conf, cls = det
             cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
@@ -94,13 +97,39 @@ class BaseballDetector:
                 2,
             )
         
-        return frame, baseball_detections
+        return frame
+
+    def detect_baseball_in_frame(self, frame):
+        """
+        Detect baseball in a single frame.
+        frame: A single frame from the video.
+        Returns the annotated frame and detections.
+        """
+        # First, stylize the frame
+        stylized_frame = self.stylize_frame(frame)
+        
+        # Run detection on stylized frame
+        baseball_detections = self._detect_stylized(stylized_frame)
+        
+        return self._annotate(frame, baseball_detections), baseball_detections
 
-    def process_video(self, video_path, output_path):
+    def _read_frames(self, cap):
+        frame_count = 0
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            
+            frame_count += 1
+            yield frame_count, frame
+
+    def process_video(self, video_path, output_path, pipelined=False, stylize_workers=2, queue_size=8):
         """
         Process a video to detect baseballs in each frame.
         video_path: Path to the input video.
         output_path: Path to save the output video.
+        pipelined: Run decode, stylize, detect and annotate+write as concurrent stages (see src/backend/baseball_detect/pipeline.py).
+        stylize_workers: Number of threads for the stylize stage when pipelined.
         """
         # Open video file
         cap = cv2.VideoCapture(video_path)
@@ -111,26 +140,43 @@ class BaseballDetector:
         # Initialize video writer
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         out = cv2.VideoWriter(output_path, fourcc, frame_rate, (width, height))
-        
-        # Process each frame
-        frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
+
+        def stylize(item):
+            frame_count, frame = item
+            return frame_count, frame, self.stylize_frame(frame)
+
+        def detect(item):
+            frame_count, frame, stylized_frame = item
+            return frame_count, frame, self._detect_stylized(stylized_frame)
+
+        def write(item):
+            frame_count, frame, detections = item
             print(f"Processing frame {frame_count}...")
-            
-            # Detect baseballs in the current frame
-            annotated_frame, detections = self.detect_baseball_in_frame(frame)
-            
+
             # Write the annotated frame to the output video
-            out.write(annotated_frame)
+            out.write(self._annotate(frame, detections))
             
             # Print detection results for this frame
             for i, det in enumerate(detections, 1):
                 print(f"Frame {frame_count} - Detection {i}: Confidence: {det[4]:.2f}")
+
+        if pipelined:
+            pipeline = Pipeline(
+                source=self._read_frames(cap),
+                stages=[
+                    Stage('stylize', stylize, workers=stylize_workers),
+                    Stage('detect', detect),
+                    Stage('write', write, ordered=True)
+                ],
+                queue_size=queue_size
+            )
+            for _ in pipeline.run():
+                pass
+            pipeline.print_report()
+        else:
+            # Process each frame
+            for item in self._read_frames(cap):
+                write(detect(stylize(item)))
         
         # Release resources
         cap.release()
@@ -0,0 +1,93 @@
+"""
+Frames-per-second benchmark for the batched inference mode of BaseballTracker (batch_size argument).
+
+The clips are decoded up front so that only the inference + bookkeeping is timed. For every batch size we also check that the
+BallDetections are the same as the ones from batch_size=1 (the old frame by frame behaviour).
+
+Run it from src/backend, because LoadTools resolves the weights relative to that directory:
+
+    cd src/backend
+    python ../../test/benchmarks/benchmark_batched_inference.py --batch-sizes 1 4 8 16
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'backend')
+sys.path.append(BACKEND_DIR)
+
+from ultralytics import YOLO
+
+from baseball_detect.flow import LoadTools, BaseballTracker
+from baseball_detect.frame_source import FrameSource
+
+
+def decode(video_path):
+    source = FrameSource(video_path)
+    frames = list(source.frames())
+    return frames, source.fps, source.frame_count
+
+
+def run_tracker(tracker, frames, fps, frame_count):
+    tracker.start(fps, frame_count)
+    with contextlib.redirect_stdout(io.StringIO()):             # process_frame prints a line per frame
+        for frame_number, timestamp, frame in frames:
+            tracker.process_frame(frame_number, timestamp, frame)
+        tracker._flush_pending_frames()
+    return tracker.all_detections
+
+
+def compare(reference, detections):
+    '''Returns (identical, max pixel difference) between two lists of BallDetections'''
+    if [d.frame_number for d in reference] != [d.frame_number for d in detections]:
+        return False, float('inf')
+
+    if not reference:
+        return True, 0.0
+
+    max_diff = max(float(np.max(np.abs(a.box_coords - b.box_coords))) for a, b in zip(reference, detections))
+    identical = max_diff == 0.0 and all(a.confidence == b.confidence for a, b in zip(reference, detections))
+    return identical, max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--clips', nargs='+', default=sorted(glob.glob(os.path.join(BACKEND_DIR, 'baseball_detect', 'input', '*.mp4'))))
+    parser.add_argument('--min-confidence', type=float, default=0.3)
+    args = parser.parse_args()
+
+    model = YOLO(LoadTools().load_model(model_alias='ball_trackingv4'))
+
+    for clip in args.clips:
+        frames, fps, frame_count = decode(clip)
+        print(f"\n{os.path.basename(clip)}: {len(frames)} frames")
+
+        # One untimed pass so that the first batch size doesn't pay for the model warm up
+        run_tracker(BaseballTracker(model=model, min_confidence=args.min_confidence), frames[:8], fps, frame_count)
+
+        reference = None
+        for batch_size in args.batch_sizes:
+            tracker = BaseballTracker(model=model, min_confidence=args.min_confidence, batch_size=batch_size)
+
+            start = time.perf_counter()
+            detections = run_tracker(tracker, frames, fps, frame_count)
+            elapsed = time.perf_counter() - start
+
+            if reference is None:
+                reference = detections
+            identical, max_diff = compare(reference, detections)
+
+            print(f"  batch_size={batch_size:>3}: {len(frames) / elapsed:7.2f} fps, {len(detections)} detections, "
+                  f"identical={identical} (max box diff {max_diff:.4f}px)")
+
+
+if __name__ == "__main__":
+    main()
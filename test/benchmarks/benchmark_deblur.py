@@ -0,0 +1,94 @@
+"""
+Equivalence and speed of the deblur backends of DeblurProcessor (see src/backend/helper_files/deblur.py).
+
+Frames are sampled from the bundled clips and deblurred with the same number of iterations by the original cv2.filter2D implementation
+('opencv', float64, channel by channel), the FFT engine ('fft', float32, all channels at once) and the torch engine ('torch', batches of
+--batch-size frames as one tensor, --threads intra-op threads). The check fails (exit code 1) when a backend's frames differ from the opencv
+ones by more than --tolerance gray levels anywhere. The time per frame of every backend is printed as well. No model is needed.
+
+    cd src/backend
+    python ../../test/benchmarks/benchmark_deblur.py --frames 8 --iterations 30 --batch-size 4 --threads 8
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'backend')
+sys.path.append(BACKEND_DIR)
+
+from baseball_detect.frame_source import FrameSource
+from helper_files.tracking_bats import DeblurProcessor
+
+
+def sample_frames(clips, every, limit):
+    frames = []
+    for clip in clips:
+        frames += [frame for _, _, frame in FrameSource(clip, stride=every).frames()][:limit]
+    return frames[:limit]
+
+
+def batches_of(frames, size):
+    '''Consecutive frames in batches of up to size frames, a new batch starts when the frame size changes (a new clip).'''
+    batches = []
+    for frame in frames:
+        if batches and len(batches[-1]) < size and batches[-1][0].shape == frame.shape:
+            batches[-1].append(frame)
+        else:
+            batches.append([frame])
+    return batches
+
+
+def time_backend(processor, frames, batch_size):
+    batches = batches_of(frames, batch_size)
+    processor.deblur_frames(batches[0])                 # The first call builds the PSF spectrum and the buffers
+    outputs, start = [], time.perf_counter()
+    for batch in batches:
+        outputs += processor.deblur_frames(batch)
+    return outputs, (time.perf_counter() - start) / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clips', nargs='+', default=sorted(glob.glob(os.path.join(BACKEND_DIR, 'baseball_detect', 'input', '*.mp4'))))
+    parser.add_argument('--frames', type=int, default=8)
+    parser.add_argument('--every', type=int, default=30, help='Sample every n-th frame of the clips')
+    parser.add_argument('--iterations', type=int, default=30, help='The same for every backend')
+    parser.add_argument('--backends', nargs='+', default=['fft', 'torch'], choices=['fft', 'torch'])
+    parser.add_argument('--batch-size', type=int, default=4, help='Frames per deblur_frames call (only the torch backend batches them)')
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads, torch picks them by default')
+    parser.add_argument('--tolerance', type=int, default=2, help='Largest difference allowed, in gray levels')
+    args = parser.parse_args()
+
+    frames = sample_frames(args.clips, args.every, args.frames)
+    if not frames:
+        sys.exit("No frames, check --clips")
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, {args.iterations} iterations, batches of {args.batch_size}")
+
+    reference, opencv_time = time_backend(DeblurProcessor(args.iterations, backend='opencv'), frames, 1)
+
+    print(f"{'backend':>8} {'ms / frame':>11} {'speedup':>8} {'max diff':>9} {'% differ':>9}")
+    print(f"{'opencv':>8} {opencv_time * 1000:11.1f} {1.0:8.2f} {0:9d} {0.0:9.3f}")
+
+    failed = []
+    for backend in args.backends:
+        processor = DeblurProcessor(args.iterations, backend=backend, threads=args.threads)
+        candidate, backend_time = time_backend(processor, frames, args.batch_size)
+
+        difference = np.concatenate([np.abs(a.astype(np.int16) - b.astype(np.int16)).ravel() for a, b in zip(reference, candidate)])
+        max_difference = int(difference.max())
+        print(f"{backend:>8} {backend_time * 1000:11.1f} {opencv_time / backend_time:8.2f} {max_difference:9d} {np.mean(difference > 0) * 100:9.3f}")
+        if max_difference > args.tolerance:
+            failed.append(backend)
+
+    if failed:
+        print(f"FAILED: {', '.join(failed)} more than {args.tolerance} gray levels off the opencv backend")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Cold start time of the backend: how long `import main` takes (see src/backend/services.py).
+
+Every run imports main.py in a fresh interpreter with `python -X importtime`, so nothing is cached between runs. The report has the wall
+time of each run, the modules that took longest to import (cumulative, including what they import themselves), and a list of the heavy
+dependencies that got imported. None of those should be imported by `import main` anymore, they are loaded by the first request that needs
+them, so the script exits with 1 if one of them shows up.
+
+Run it from src/backend, like the backend itself:
+
+    cd src/backend
+    python ../../test/benchmarks/benchmark_import_time.py --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'backend')
+
+# Top level packages that main.py used to import eagerly
+HEAVY_MODULES = ('tensorflow', 'keras', 'torch', 'ultralytics', 'selenium', 'moviepy', 'yt_dlp', 'google.generativeai', 'pinecone', 'pandas')
+
+
+def import_once(module):
+    '''Imports module in a new interpreter. Returns (wall seconds, {module: cumulative seconds}).'''
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=BACKEND_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+
+    if process.returncode != 0:
+        sys.exit(f"import {module} failed:\n{process.stderr.splitlines()[-1] if process.stderr else ''}")
+
+    # Lines look like "import time:       651 |      90985 |       urllib3", times in microseconds
+    cumulative = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        cumulative[name.strip()] = int(cumulative_us) / 1e6
+    return elapsed, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='main', help='module to import, relative to src/backend')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15, help='how many of the slowest imports to list')
+    args = parser.parse_args()
+
+    runs = [import_once(args.module) for _ in range(args.runs)]
+    times = [elapsed for elapsed, _ in runs]
+    cumulative = runs[-1][1]
+
+    print(f"import {args.module}: median {statistics.median(times):.2f}s over {args.runs} runs "
+          f"({', '.join(f'{t:.2f}' for t in times)})")
+
+    print(f"\nslowest imports (cumulative, last run):")
+    for name, seconds in sorted(cumulative.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds:7.3f}s  {name}")
+
+    heavy = sorted(name for name in cumulative if name in HEAVY_MODULES)
+    if heavy:
+        print(f"\nimported at startup, should be lazy: {', '.join(heavy)}")
+        sys.exit(1)
+    print(f"\nnone of {', '.join(HEAVY_MODULES)} imported at startup")
+
+
+if __name__ == "__main__":
+    main()
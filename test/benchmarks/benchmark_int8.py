@@ -0,0 +1,127 @@
+"""
+Accuracy / latency report for the INT8 quantized detectors (see src/backend/baseball_detect/runtime.py).
+
+For every bundled clip the ball model runs through BaseballTracker three times: PyTorch, the FP32 export and the INT8 export. The report has the
+frames per second of each variant next to the number of ball sequences and the mph estimates from BaseballTracker._calculate_speeds, so the
+speedup can be weighed against what it costs in recall. The scale factor comes from the PyTorch phc_detector and is the same for all three.
+
+The bat model only gets a latency / detection count comparison on the sampled frames, its speeds need the whole deblurring pass.
+
+Run it from src/backend, because LoadTools resolves the weights relative to that directory:
+
+    cd src/backend
+    python ../../test/benchmarks/benchmark_int8.py --backend openvino
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'backend')
+sys.path.append(BACKEND_DIR)
+
+from baseball_detect.flow import LoadTools, BaseballTracker, PitcherCatcherLocator
+from baseball_detect.frame_source import FrameSource
+from baseball_detect.runtime import load_detector
+
+
+def decode(video_path):
+    source = FrameSource(video_path)
+    frames = list(source.frames())
+    return frames, source.fps, source.frame_count
+
+
+def scale_factor_of(phc_model, frames, fps, frame_count):
+    locator = PitcherCatcherLocator(phc_model)
+    locator.start(fps, frame_count)
+    for frame_number, timestamp, frame in frames:
+        locator.process_frame(frame_number, timestamp, frame)
+    with contextlib.redirect_stdout(io.StringIO()):
+        x1, y1, x2, y2 = locator.coordinates()
+    return float(np.sqrt((x2 - x1)**2 + (y2 - y1)**2) / 60.5)
+
+
+def run_ball(model, frames, fps, frame_count, scale_factor, batch_size):
+    # Same settings as calculate_speed_ball
+    tracker = BaseballTracker(model=model, min_confidence=0.3, max_displacement=100, min_sequence_length=7, pitch_distance_range=(60, 61),
+                              batch_size=batch_size)
+    tracker.start(fps, frame_count)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):             # process_frame prints a line per frame
+        for frame_number, timestamp, frame in frames:
+            tracker.process_frame(frame_number, timestamp, frame)
+        results = tracker.finish(scale_factor)
+    return results, time.perf_counter() - start
+
+
+def mph_summary(results):
+    speeds = [(s['min_speed_mph'] + s['max_speed_mph']) / 2 for s in results['speed_estimates']]
+    return f"{np.mean(speeds):6.1f}" if speeds else "     -"
+
+
+def run_bat(model, frames):
+    model.predict(frames[0], verbose=False)                     # warm up
+    start = time.perf_counter()
+    detections = sum(len(model.predict(frame, conf=0.2, verbose=False)[0].boxes) for frame in frames)
+    return detections, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['onnx', 'openvino'], default='openvino')
+    parser.add_argument('--clips', nargs='+', default=sorted(glob.glob(os.path.join(BACKEND_DIR, 'baseball_detect', 'input', '*.mp4'))))
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--bat-frames', type=int, default=100, help='frames per clip for the bat model comparison')
+    args = parser.parse_args()
+
+    load_tools = LoadTools()
+    ball_weights = load_tools.load_model(model_alias='ball_trackingv4')
+    bat_weights = load_tools.load_model(model_alias='bat_tracking')
+    phc_model = load_detector(load_tools.load_model(model_alias='phc_detector'), 'torch')
+
+    variants = [
+        ('torch', lambda weights: load_detector(weights, 'torch')),
+        (f'{args.backend} fp32', lambda weights: load_detector(weights, args.backend)),
+        (f'{args.backend} int8', lambda weights: load_detector(weights, args.backend, int8=True)),
+    ]
+    ball_models = [(name, build(ball_weights)) for name, build in variants]
+    bat_models = [(name, build(bat_weights)) for name, build in variants]
+
+    for clip in args.clips:
+        frames, fps, frame_count = decode(clip)
+        scale_factor = scale_factor_of(phc_model, frames, fps, frame_count)
+        print(f"\n{os.path.basename(clip)}: {len(frames)} frames, scale factor {scale_factor:.2f} px/ft")
+        print(f"  {'ball model':<16} {'fps':>7} {'speedup':>8} {'sequences':>10} {'mean mph':>9} {'delta mph':>10}")
+
+        baseline = None
+        for name, model in ball_models:
+            run_ball(model, frames[:8], fps, frame_count, scale_factor, args.batch_size)       # warm up
+            results, elapsed = run_ball(model, frames, fps, frame_count, scale_factor, args.batch_size)
+            if baseline is None:
+                baseline = (results, elapsed)
+
+            speeds = [(s['min_speed_mph'] + s['max_speed_mph']) / 2 for s in results['speed_estimates']]
+            base_speeds = [(s['min_speed_mph'] + s['max_speed_mph']) / 2 for s in baseline[0]['speed_estimates']]
+            delta = f"{np.mean(speeds) - np.mean(base_speeds):+10.1f}" if speeds and base_speeds else f"{'-':>10}"
+
+            print(f"  {name:<16} {len(frames) / elapsed:7.2f} {baseline[1] / elapsed:7.2f}x {len(results['sequences']):>10} "
+                  f"{mph_summary(results):>9} {delta}")
+
+        bat_frames = frames[:args.bat_frames]
+        print(f"  {'bat model':<16} {'fps':>7} {'speedup':>8} {'boxes':>10}")
+        bat_baseline = None
+        for name, model in bat_models:
+            detections, elapsed = run_bat(model, bat_frames)
+            bat_baseline = bat_baseline or elapsed
+            print(f"  {name:<16} {len(bat_frames) / elapsed:7.2f} {bat_baseline / elapsed:7.2f}x {detections:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Time of BaseballTracker's post-processing (gap interpolation, sequences, speeds) on the detections of long videos.
+
+No model is needed: the detections are synthetic ball tracks (pitches with missed frames, plus random false positives), as many as an hour
+of video at --fps would give. The script feeds them to the tracker the way the model results would come in and times finish(), which works
+on the columnar detection table (see src/backend/baseball_detect/detections.py).
+
+    cd src/backend
+    python ../../test/benchmarks/benchmark_postprocessing.py --minutes 10 30 60
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'backend')
+sys.path.append(BACKEND_DIR)
+
+from baseball_detect.flow import BaseballTracker
+
+
+class Boxes:
+    '''Just what _store_detections reads from ultralytics' Boxes, already on the cpu.'''
+
+    def __init__(self, rows):
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+        self.xyxy, self.conf, self.cls, self.id = rows[:, :4], rows[:, 4], rows[:, 5], None
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+
+class Result:
+    def __init__(self, rows):
+        self.boxes = Boxes(rows)
+
+
+def synthetic_results(frame_count, rng):
+    '''A pitch (15 frames, a few of them missed) every 20 seconds at 30 fps, and a false positive in 20% of the frames.'''
+    results = []
+    for frame_number in range(frame_count):
+        rows = []
+        phase = frame_number % 600
+        if phase < 15 and rng.random() > 0.1:
+            x, y = 300 + 40 * phase, 200 + 3 * phase + 0.2 * phase**2
+            rows.append([x - 4, y - 4, x + 4, y + 4, rng.uniform(0.5, 0.9), 0])
+        if rng.random() < 0.2:
+            x, y = rng.uniform(0, 1280), rng.uniform(0, 720)
+            rows.append([x - 4, y - 4, x + 4, y + 4, rng.uniform(0.3, 0.6), 0])
+        results.append(Result(rows))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=float, nargs='+', default=[10, 60])
+    parser.add_argument('--fps', type=float, default=30.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'minutes':>8} {'detections':>11} {'sequences':>10} {'finish ms':>10}")
+    for minutes in args.minutes:
+        frame_count = int(minutes * 60 * args.fps)
+        results = synthetic_results(frame_count, rng)
+
+        tracker = BaseballTracker(model=None, min_confidence=0.3, max_displacement=100, min_sequence_length=7, pitch_distance_range=(60, 61))
+        tracker.start(args.fps, frame_count)
+        for frame_number, result in enumerate(results):
+            tracker._store_detections(result, frame_number, frame_number / args.fps)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = tracker.finish(scale_factor=2.0)
+        elapsed = time.perf_counter() - start
+
+        print(f"{minutes:8.0f} {len(output['all_detections']):11d} {len(output['sequences']):10d} {elapsed * 1000:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
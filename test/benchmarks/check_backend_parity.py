@@ -0,0 +1,128 @@
+"""
+Parity check between the PyTorch models and their ONNX / OpenVINO exports (see src/backend/baseball_detect/runtime.py).
+
+Frames are sampled from the bundled clips and run through both versions of every model. Boxes are matched by class and IoU, and the check
+fails (exit code 1) if any model misses too many of the PyTorch boxes or if the matched boxes / confidences are too far apart.
+The time per frame of both backends is printed as well.
+
+Run it from src/backend, because LoadTools resolves the weights relative to that directory:
+
+    cd src/backend
+    python ../../test/benchmarks/check_backend_parity.py --backend onnx
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'backend')
+sys.path.append(BACKEND_DIR)
+
+from baseball_detect.flow import LoadTools
+from baseball_detect.frame_source import FrameSource
+from baseball_detect.runtime import load_detector
+
+
+def sample_frames(clips, every, limit):
+    frames = []
+    for clip in clips:
+        frames += [frame for _, _, frame in FrameSource(clip, stride=every).frames()][:limit]
+    return frames
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def boxes_of(result):
+    boxes = result.boxes
+    return boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int)
+
+
+def match(reference, candidate, min_iou):
+    '''Greedily matches the candidate boxes to the reference boxes of the same class. Returns (matched, total, ious, confidence diffs).'''
+    ref_xyxy, ref_conf, ref_cls = reference
+    cand_xyxy, cand_conf, cand_cls = candidate
+    used = set()
+    ious, conf_diffs = [], []
+
+    for i in np.argsort(-ref_conf):
+        best, best_iou = None, min_iou
+        for j in range(len(cand_xyxy)):
+            if j in used or cand_cls[j] != ref_cls[i]:
+                continue
+            overlap = iou(ref_xyxy[i], cand_xyxy[j])
+            if overlap >= best_iou:
+                best, best_iou = j, overlap
+        if best is not None:
+            used.add(best)
+            ious.append(best_iou)
+            conf_diffs.append(abs(float(ref_conf[i]) - float(cand_conf[best])))
+
+    return len(ious), len(ref_xyxy), ious, conf_diffs
+
+
+def timed_predict(model, frames, conf):
+    model.predict(frames[0], conf=conf, verbose=False)          # warm up
+    start = time.perf_counter()
+    results = [model.predict(frame, conf=conf, verbose=False)[0] for frame in frames]
+    return results, (time.perf_counter() - start) / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['onnx', 'openvino'], default='onnx')
+    parser.add_argument('--models', nargs='+', default=['ball_trackingv4', 'phc_detector', 'bat_tracking'])
+    parser.add_argument('--clips', nargs='+', default=sorted(glob.glob(os.path.join(BACKEND_DIR, 'baseball_detect', 'input', '*.mp4'))))
+    parser.add_argument('--every', type=int, default=5, help='use every n-th frame of the clips')
+    parser.add_argument('--frames-per-clip', type=int, default=40)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--min-iou', type=float, default=0.5, help='boxes overlapping less than this are not a match')
+    parser.add_argument('--min-recall', type=float, default=0.95, help='fraction of the PyTorch boxes the export has to find')
+    parser.add_argument('--max-conf-diff', type=float, default=0.05)
+    args = parser.parse_args()
+
+    frames = sample_frames(args.clips, args.every, args.frames_per_clip)
+    print(f"{len(frames)} frames sampled from {len(args.clips)} clips")
+
+    load_tools = LoadTools()
+    failed = False
+
+    for alias in args.models:
+        weights = load_tools.load_model(model_alias=alias)
+        reference_results, reference_time = timed_predict(load_detector(weights, 'torch'), frames, args.conf)
+        exported_results, exported_time = timed_predict(load_detector(weights, args.backend), frames, args.conf)
+
+        matched = total = 0
+        ious, conf_diffs = [], []
+        for reference, exported in zip(reference_results, exported_results):
+            m, t, i, c = match(boxes_of(reference), boxes_of(exported), args.min_iou)
+            matched += m
+            total += t
+            ious += i
+            conf_diffs += c
+
+        recall = matched / total if total else 1.0
+        max_conf_diff = max(conf_diffs) if conf_diffs else 0.0
+        ok = recall >= args.min_recall and max_conf_diff <= args.max_conf_diff
+        failed |= not ok
+
+        print(f"\n{alias} ({args.backend}): {'OK' if ok else 'FAILED'}")
+        print(f"  matched {matched} of {total} PyTorch boxes (recall {recall:.3f}), mean IoU {np.mean(ious) if ious else 0.0:.4f}, "
+              f"max confidence diff {max_conf_diff:.4f}")
+        print(f"  {reference_time * 1000:.1f} ms/frame with torch, {exported_time * 1000:.1f} ms/frame with {args.backend} "
+              f"({reference_time / exported_time:.2f}x)")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
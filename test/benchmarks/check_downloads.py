@@ -0,0 +1,249 @@
+"""
+Checks the downloads of LoadTools (src/backend/baseball_detect/downloads.py and model_store.py) against a local HTTP stand-in.
+
+The stand-in is a ThreadingHTTPServer on 127.0.0.1 that serves random files with Range requests, the X-Checksum-Sha256 header and a few
+ways of misbehaving. Everything is written to a temporary directory, no network and no model is needed. The scenarios:
+
+- resume:       the first response is cut off half way, the download has to resume it with a Range request and end up complete.
+- checksum:     a wrong expected SHA-256 and a server that advertises a wrong one, both have to fail without leaving dest or a .part behind.
+- concurrent:   --processes processes with --threads threads each download the same file, the server has to see a single request.
+- prefetch:     LoadTools.prefetch into an empty model store (one alias with a pinned checksum), then again without any request, and an
+                alias pinned to the wrong checksum that must not end up in the store.
+- legacy:       ModelStore.fetch with weights at a legacy path, a complete .pt is adopted without a request, a truncated one is skipped
+                and downloaded instead.
+
+After every scenario no .part or .lock files may be left. Exits with 1 when a check fails.
+
+    cd src/backend
+    python ../../test/benchmarks/check_downloads.py
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'backend')
+sys.path.append(BACKEND_DIR)
+
+from baseball_detect.downloads import DownloadError, download, read_checksum
+from baseball_detect.load_tools import LoadTools
+from baseball_detect.model_store import ModelStore, weights_look_complete
+
+SERVE_CHUNK = 64 * 1024
+
+
+class StandIn(BaseHTTPRequestHandler):
+    '''Serves server.files with Range support. server.cut_once paths are cut off half way the first time, server.lying ones advertise a wrong checksum.'''
+
+    def do_GET(self):
+        server = self.server
+        data = server.files.get(self.path)
+        with server.guard:
+            server.log.append((self.path, self.headers.get('Range')))
+        if data is None:
+            self.send_error(404)
+            return
+
+        start = 0
+        if self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].split('-')[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{len(data)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+
+        digest = '0' * 64 if self.path in server.lying else hashlib.sha256(data).hexdigest()
+        self.send_header('Content-Length', str(len(data) - start))
+        self.send_header('X-Checksum-Sha256', digest)
+        self.end_headers()
+
+        end = len(data)
+        with server.guard:
+            if self.path in server.cut_once:
+                server.cut_once.discard(self.path)
+                end = start + (len(data) - start) // 2
+        for offset in range(start, end, SERVE_CHUNK):
+            self.wfile.write(data[offset:min(offset + SERVE_CHUNK, end)])
+            time.sleep(server.delay)
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class Checks:
+    def __init__(self):
+        self.failed = []
+
+    def __call__(self, scenario, condition, message):
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            self.failed.append(f"{scenario}: {message}")
+
+
+def leftovers(directory):
+    return [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names if name.endswith(('.part', '.lock'))]
+
+
+def requests_for(server, path):
+    return [entry for entry in server.log if entry[0] == path]
+
+
+def check_resume(server, base, directory, check):
+    dest = os.path.join(directory, 'resume.pt')
+    server.cut_once.add('/resume.pt')
+    download(f"{base}/resume.pt", dest)
+
+    with open(dest, 'rb') as fp:
+        check('resume', fp.read() == server.files['/resume.pt'], "the resumed file is complete")
+    check('resume', any(header for _, header in requests_for(server, '/resume.pt')), "the second attempt used a Range request")
+    check('resume', read_checksum(dest) == hashlib.sha256(server.files['/resume.pt']).hexdigest(), "the digest is recorded in <dest>.sha256")
+    check('resume', not leftovers(directory), "no .part or .lock files are left")
+
+
+def check_checksum(server, base, directory, check):
+    for name, kwargs, reason in (('wrong.pt', {'sha256': 'f' * 64}, "a wrong expected checksum"),
+                                 ('lying.pt', {}, "a wrong checksum advertised by the server")):
+        dest = os.path.join(directory, name)
+        try:
+            download(f"{base}/{name}", dest, **kwargs)
+            raised = False
+        except DownloadError:
+            raised = True
+        check('checksum', raised and not os.path.exists(dest), f"{reason} raises DownloadError and leaves no file")
+    check('checksum', not leftovers(directory), "no .part or .lock files are left")
+
+
+def _download_in_threads(url, dest, threads):
+    workers = [threading.Thread(target=download, args=(url, dest)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def check_concurrent(server, base, directory, check, processes, threads):
+    dest = os.path.join(directory, 'shared.pt')
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_download_in_threads, args=(f"{base}/shared.pt", dest, threads)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    with open(dest, 'rb') as fp:
+        check('concurrent', fp.read() == server.files['/shared.pt'], "the file is complete")
+    count = len(requests_for(server, '/shared.pt'))
+    check('concurrent', count == 1, f"{processes * threads} callers made {count} request(s)")
+    check('concurrent', not leftovers(directory), "no .part or .lock files are left")
+
+
+def check_prefetch(server, base, directory, check):
+    store = ModelStore(os.path.join(directory, 'store'))
+    tools = LoadTools(store)
+    tools.BDL_MODEL_API = f"{base}/models/"
+    tools.yolo_model_checksums['phc_detector'] = hashlib.sha256(server.files['/models/phc_detector']).hexdigest()
+    aliases = ['phc_detector', 'bat_tracking', 'ball_trackingv4']
+
+    paths = tools.prefetch(aliases)
+    for alias in aliases:
+        with open(paths[alias], 'rb') as fp:
+            digest = hashlib.sha256(fp.read()).hexdigest()
+        check('prefetch', digest == hashlib.sha256(server.files[f"/models/{alias}"]).hexdigest() and digest in paths[alias],
+              f"{alias} is in the store under its digest")
+
+    before = len(server.log)
+    tools.prefetch(aliases)
+    check('prefetch', len(server.log) == before, "a second prefetch makes no requests")
+
+    tools.yolo_model_checksums['glove_tracking'] = 'f' * 64
+    try:
+        tools.load_model('glove_tracking')
+        raised = False
+    except DownloadError:
+        raised = True
+    check('prefetch', raised and store.lookup('glove_tracking') is None, "weights that don't match the pinned checksum aren't stored")
+    check('prefetch', not leftovers(directory), "no .part or .lock files are left")
+
+
+def write_weights(path, data):
+    '''A stand-in .pt, torch saves its weights as a zip archive as well.'''
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('model/data.pkl', data)
+
+
+def check_legacy(server, base, directory, check):
+    store = ModelStore(os.path.join(directory, 'store'))
+    complete, truncated = os.path.join(directory, 'complete.pt'), os.path.join(directory, 'truncated.pt')
+    write_weights(complete, os.urandom(64 * 1024))
+    write_weights(truncated, os.urandom(64 * 1024))
+    with open(truncated, 'r+b') as fp:
+        fp.truncate(os.path.getsize(truncated) // 2)
+    check('legacy', weights_look_complete(complete) and not weights_look_complete(truncated), "only the complete .pt looks complete")
+
+    before = len(server.log)
+    path = store.fetch('legacy_complete', lambda: f"{base}/models/bat_tracking", legacy_paths=[complete])
+    with open(path, 'rb') as stored, open(complete, 'rb') as legacy:
+        check('legacy', stored.read() == legacy.read() and len(server.log) == before, "the complete .pt is adopted without a request")
+
+    path = store.fetch('legacy_truncated', lambda: f"{base}/models/bat_tracking", legacy_paths=[truncated])
+    with open(path, 'rb') as stored:
+        check('legacy', stored.read() == server.files['/models/bat_tracking'], "the truncated .pt is skipped and downloaded instead")
+    check('legacy', not leftovers(directory), "no .part or .lock files are left")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=2, help='Size of the served files in MiB')
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=3, help='Threads per process in the concurrent scenario')
+    parser.add_argument('--delay', type=float, default=0.005, help='Seconds the stand-in waits after every 64 KiB, so the callers overlap')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    server.files = {f"/{name}": os.urandom(args.size * 1024 * 1024) for name in ('resume.pt', 'wrong.pt', 'lying.pt', 'shared.pt')}
+    server.files.update({f"/models/{alias}": os.urandom(args.size * 1024 * 1024)
+                         for alias in ('phc_detector', 'bat_tracking', 'ball_trackingv4', 'glove_tracking')})
+    server.lying = {'/lying.pt'}
+    server.cut_once = set()
+    server.delay = args.delay
+    server.log = []
+    server.guard = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    check = Checks()
+    with tempfile.TemporaryDirectory() as directory:
+        # LoadTools resolves its legacy weights and pinned checksums against src/backend, so the working directory shouldn't matter
+        os.chdir(directory)
+        for name, run in (('resume', lambda: check_resume(server, base, directory, check)),
+                          ('checksum', lambda: check_checksum(server, base, directory, check)),
+                          ('concurrent', lambda: check_concurrent(server, base, directory, check, args.processes, args.threads)),
+                          ('prefetch', lambda: check_prefetch(server, base, directory, check)),
+                          ('legacy', lambda: check_legacy(server, base, directory, check))):
+            print(name)
+            with contextlib.redirect_stderr(io.StringIO()):         # tqdm's progress bars
+                run()
+    server.shutdown()
+
+    if check.failed:
+        print(f"FAILED: {'; '.join(check.failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()